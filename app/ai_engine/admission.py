@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from app import config
+
+class Overloaded(Exception):
+    """
+    Raised when a request is rejected up front; retry_after is a hint in seconds.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__("Model is overloaded.")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request's deadline passes before its model call finishes.
+    """
+
+    def __init__(self):
+        super().__init__("Request deadline exceeded.")
+
+
+def deadline_from_ms(deadline_ms):
+    """
+    Turn a relative deadline in milliseconds into an absolute monotonic time.
+    """
+    if deadline_ms is None:
+        return None
+    return time.monotonic() + deadline_ms / 1000
+
+
+async def within_deadline(awaitable, deadline):
+    """
+    Await awaitable, raising DeadlineExceeded if the deadline passes first.
+    """
+    if deadline is None:
+        return await awaitable
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded()
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded() from None
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with priority lanes in front of the model.
+
+    At most max_concurrent model calls run at once. Waiting requests are
+    admitted by lane priority (lower first), then arrival order. A request is
+    rejected with Overloaded when its lane queue is full or when its deadline
+    cannot be met at the current service rate, and fails with
+    DeadlineExceeded if the deadline passes while it waits or runs.
+
+    Calls run() in a preemptible lane give their slot up (are cancelled)
+    when a request from any other lane would otherwise have to wait.
+    """
+
+    def __init__(self, max_concurrent=32, lanes=None, preemptible=()):
+        # lane name -> (priority, max queued requests)
+        self.lanes = lanes or {"suggestion": (0, 64), "generate": (1, 32)}
+        self.max_concurrent = max_concurrent
+        self.preemptible = set(preemptible)
+        self.active = 0
+        self._preemptible_tasks = set()
+        self._waiters = []
+        self._queued = {lane: 0 for lane in self.lanes}
+        self._order = itertools.count()
+        # Exponentially weighted service time per lane, for retry hints
+        self._service_time = {lane: 0.5 for lane in self.lanes}
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.preempted = 0
+
+    def queued(self, lane=None):
+        if lane is None:
+            return sum(self._queued.values())
+        return self._queued[lane]
+
+    def _estimated_wait(self, lane):
+        priority = self.lanes[lane][0]
+        ahead = sum(n for other, n in self._queued.items() if self.lanes[other][0] <= priority)
+        return (ahead + 1) / self.max_concurrent * self._service_time[lane]
+
+    async def acquire(self, lane, deadline=None):
+        """
+        Wait for a model slot in lane; pair every successful acquire with release().
+        """
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            self.expired += 1
+            raise DeadlineExceeded()
+        # Drop waiters that gave up, so they do not block the fast path
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        priority, max_queue = self.lanes[lane]
+        estimated_wait = self._estimated_wait(lane)
+        if self._queued[lane] >= max_queue or (deadline is not None and now + estimated_wait > deadline):
+            self.rejected += 1
+            raise Overloaded(retry_after=estimated_wait)
+
+        if lane not in self.preemptible and self._preemptible_tasks:
+            # The cancelled call releases its slot, which goes to the highest priority waiter
+            self._preemptible_tasks.pop().cancel()
+            self.preempted += 1
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future, lane))
+        self._queued[lane] += 1
+        try:
+            await within_deadline(asyncio.shield(future), deadline)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, DeadlineExceeded):
+                self.expired += 1
+            raise
+        finally:
+            self._queued[lane] -= 1
+        self.admitted += 1
+
+    def release(self):
+        """
+        Hand the slot to the highest priority waiter, or free it.
+        """
+        while self._waiters:
+            _, _, future, _ = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    async def run(self, lane, fn, deadline=None):
+        """
+        Run fn() in a model slot, bounded by deadline.
+        """
+        await self.acquire(lane, deadline)
+        task = asyncio.current_task() if lane in self.preemptible else None
+        if task is not None:
+            self._preemptible_tasks.add(task)
+        start = time.monotonic()
+        try:
+            result = await within_deadline(fn(), deadline)
+        except DeadlineExceeded:
+            self.expired += 1
+            raise
+        finally:
+            self._preemptible_tasks.discard(task)
+            self.release()
+        elapsed = time.monotonic() - start
+        self._service_time[lane] = 0.8 * self._service_time[lane] + 0.2 * elapsed
+        return result
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": dict(self._queued),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "preempted": self.preempted,
+        }
+
+
+# Shared by both engines so suggestions and generations compete for the same slots
+model_admission = AdmissionController(
+    max_concurrent=config.MAX_CONCURRENT_MODEL_CALLS,
+    lanes={
+        "suggestion": (0, config.MAX_QUEUED_SUGGESTIONS),
+        "generate": (1, config.MAX_QUEUED_GENERATIONS),
+        # Background work never queues and makes way for real requests
+        "speculation": (2, 0),
+    },
+    preemptible=("speculation",)
+)
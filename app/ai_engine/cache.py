@@ -0,0 +1,526 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+_FINGERPRINT_CHUNK = 64 * 1024
+
+def fingerprint(text: str) -> bytes:
+    """
+    128-bit digest of text, for cache keys that should not hold a copy of
+    it. Large texts are encoded and hashed a chunk at a time. SHA-256 rather
+    than BLAKE2b: with the CPU's SHA instructions it is several times faster.
+    """
+    digest = hashlib.sha256()
+    for start in range(0, len(text), _FINGERPRINT_CHUNK):
+        digest.update(text[start:start + _FINGERPRINT_CHUNK].encode("utf-8", "surrogatepass"))
+    return digest.digest()[:16]
+
+
+class _Packed(bytes):
+    """A str value stored zlib-compressed."""
+
+
+def _pack(value, compress_min):
+    if type(value) is not str:
+        return value
+    if compress_min and len(value) >= compress_min:
+        packed = zlib.compress(value.encode("utf-8", "surrogatepass"))
+        if len(packed) < len(value):
+            return _Packed(packed)
+    return value
+
+
+def _unpack(value):
+    if type(value) is _Packed:
+        return zlib.decompress(value).decode("utf-8", "surrogatepass")
+    return value
+
+
+def _approx_size(obj) -> int:
+    """
+    Cheap estimate of the payload size of a cache key or value.
+    """
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        return sum(_approx_size(item) for item in obj) + 8 * len(obj)
+    return 8
+
+
+class MemoryCache:
+    """
+    In-process LRU cache bounded by total key + value size, with optional TTL.
+
+    String values of at least compress_min characters are kept
+    zlib-compressed (0 never compresses).
+    """
+
+    def __init__(self, max_bytes=config.CACHE_MAX_BYTES, ttl=config.CACHE_TTL,
+                 compress_min=config.CACHE_COMPRESS_MIN_BYTES):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress_min = compress_min
+        self._data = OrderedDict()  # key -> (value, size, expires)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, size, expires = entry
+        if expires and expires < time.time():
+            self._discard(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return _unpack(value)
+
+    async def get_async(self, key, default=None):
+        # Nothing to wait for; same interface as the shared backends
+        return self.get(key, default)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        value = _pack(value, self.compress_min)
+        size = _approx_size(key) + _approx_size(value)
+        if size > self.max_bytes:
+            return
+        self._discard(key)
+        self._data[key] = (value, size, time.time() + ttl if ttl else 0)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            old_key = next(iter(self._data))
+            self._discard(old_key)
+            self.evictions += 1
+
+    def _discard(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and not (entry[2] and entry[2] < time.time())
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def keys(self):
+        return list(self._data)
+
+    def items(self):
+        return [(key, _unpack(entry[0])) for key, entry in self._data.items()]
+
+    def clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+
+    def warm(self):
+        return 0
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """
+    On-disk cache shared by every worker process on the host.
+
+    Entries are bounded by total bytes per namespace and evicted least
+    recently used first. Keys are hashed together with the model version, so
+    bumping AI_ENGINE_MODEL_VERSION invalidates everything cached before.
+    A small in-process hot tier avoids a query for the most recent hits.
+
+    Writes (new entries and LRU touches) are queued to a writer thread and
+    committed in batches, so a caller never waits for the database write
+    lock; they are visible here at once through the hot tier, and to other
+    processes once committed (flush() waits for that). Request handlers
+    read with get_async(), which queries in a thread on a hot-tier miss.
+    """
+
+    def __init__(self, namespace, path=config.CACHE_PATH, max_bytes=config.CACHE_MAX_BYTES,
+                 ttl=config.CACHE_TTL, model_version=config.MODEL_VERSION, hot_entries=config.CACHE_WARM_ENTRIES):
+        self.namespace = namespace
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.model_version = model_version
+        self._hot = MemoryCache(max_bytes=max(max_bytes // 16, 1), ttl=0)
+        # The hot tier is also used from the writer and query threads
+        self._hot_lock = threading.Lock()
+        self._hot_entries = hot_entries
+        self._local = threading.local()
+        self._writes = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key BLOB PRIMARY KEY, namespace TEXT NOT NULL, version TEXT NOT NULL,"
+                " value TEXT NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed)")
+            # Running byte total per namespace, so writes never have to scan the table
+            db.execute("CREATE TABLE IF NOT EXISTS cache_sizes (namespace TEXT PRIMARY KEY, bytes INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO cache_sizes VALUES (?, 0)", (namespace,))
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _hash(self, key) -> bytes:
+        raw = repr((self.namespace, self.model_version, key)).encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def _get_hot(self, hashed, now):
+        with self._hot_lock:
+            hot = self._hot.get(hashed)
+        if hot is not None and (not hot[1] or hot[1] >= now):
+            self.hits += 1
+            return hot[0]
+        return None
+
+    def _get_stored(self, hashed, now):
+        # Readers never wait for the writer in WAL mode
+        row = self._connection().execute(
+            "SELECT value, expires, accessed FROM cache_entries WHERE key = ?", (hashed,)
+        ).fetchone()
+        if row is None or (row[1] and row[1] < now):
+            self.misses += 1
+            return None
+        # LRU order only needs to be roughly right; skip the write for hot rows
+        if now - row[2] > 1.0:
+            self._queue_write(("touch", hashed, now))
+        value = json.loads(row[0])
+        with self._hot_lock:
+            self._hot.set(hashed, (value, row[1]))
+        self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        hashed = self._hash(key)
+        now = time.time()
+        value = self._get_hot(hashed, now)
+        if value is None:
+            value = self._get_stored(hashed, now)
+        return default if value is None else value
+
+    async def get_async(self, key, default=None):
+        """get() that runs the query in a thread instead of on the event loop."""
+        hashed = self._hash(key)
+        now = time.time()
+        value = self._get_hot(hashed, now)
+        if value is None:
+            value = await asyncio.to_thread(self._get_stored, hashed, now)
+        return default if value is None else value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        hashed = self._hash(key)
+        encoded = json.dumps(value)
+        size = len(hashed) + len(encoded.encode("utf-8", "surrogatepass"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires = now + ttl if ttl else 0
+        with self._hot_lock:
+            self._hot.set(hashed, (value, expires))
+        self._queue_write(("set", hashed, encoded, size, expires, now))
+
+    def _queue_write(self, write):
+        if self._writer is None or not self._writer.is_alive():
+            with self._writer_lock:
+                if self._writer is None or not self._writer.is_alive():
+                    if self._writer is None:
+                        # Commit what is still queued when the process exits normally
+                        atexit.register(self.flush)
+                    self._writer = threading.Thread(
+                        target=self._write_loop, name=f"cache-writer-{self.namespace}", daemon=True
+                    )
+                    self._writer.start()
+        self._writes.put(write)
+
+    def _write_loop(self):
+        while True:
+            writes = [self._writes.get()]
+            # Everything queued meanwhile goes into the same transaction
+            while len(writes) < 256:
+                try:
+                    writes.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit(writes)
+            except Exception:
+                logger.exception(f"Dropped {len(writes)} {self.namespace} cache writes")
+            finally:
+                for _ in writes:
+                    self._writes.task_done()
+
+    def _commit(self, writes):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            added = 0
+            for write in writes:
+                if write[0] == "touch":
+                    db.execute("UPDATE cache_entries SET accessed = ? WHERE key = ?", (write[2], write[1]))
+                    continue
+                _, hashed, encoded, size, expires, now = write
+                old = db.execute("SELECT size FROM cache_entries WHERE key = ?", (hashed,)).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, namespace, version, value, size, expires, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (hashed, self.namespace, self.model_version, encoded, size, expires, now),
+                )
+                added += size - (old[0] if old else 0)
+            if added:
+                total = self._add_bytes(db, added)
+                if total > self.max_bytes:
+                    self.evictions += self._evict(db, total - self.max_bytes)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def flush(self):
+        """Wait until every queued write is committed."""
+        self._writes.join()
+
+    def _add_bytes(self, db, delta) -> int:
+        db.execute("UPDATE cache_sizes SET bytes = bytes + ? WHERE namespace = ?", (delta, self.namespace))
+        return db.execute("SELECT bytes FROM cache_sizes WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+    def _evict(self, db, excess) -> int:
+        """Delete least recently used entries until excess bytes are freed."""
+        freed = 0
+        evicted = []
+        for hashed, size in db.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed", (self.namespace,)
+        ):
+            if freed >= excess:
+                break
+            evicted.append((hashed,))
+            freed += size
+        db.executemany("DELETE FROM cache_entries WHERE key = ?", evicted)
+        self._add_bytes(db, -freed)
+        with self._hot_lock:
+            for (hashed,) in evicted:
+                self._hot._discard(hashed)
+        return len(evicted)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __len__(self):
+        self.flush()
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def clear(self):
+        self.flush()
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+        db.execute("UPDATE cache_sizes SET bytes = 0 WHERE namespace = ?", (self.namespace,))
+        db.execute("COMMIT")
+        with self._hot_lock:
+            self._hot.clear()
+
+    def purge(self) -> int:
+        """
+        Delete expired entries and entries written by other model versions.
+        """
+        self.flush()
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = db.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND (version != ? OR (expires > 0 AND expires < ?))",
+                (self.namespace, self.model_version, time.time()),
+            ).rowcount
+            db.execute(
+                "UPDATE cache_sizes SET bytes = (SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?)"
+                " WHERE namespace = ?",
+                (self.namespace, self.namespace),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def warm(self) -> int:
+        """
+        Drop stale entries and load the most recently used ones into the hot tier.
+        """
+        self.purge()
+        rows = self._connection().execute(
+            "SELECT key, value, expires FROM cache_entries WHERE namespace = ? AND version = ?"
+            " ORDER BY accessed DESC LIMIT ?",
+            (self.namespace, self.model_version, self._hot_entries),
+        ).fetchall()
+        with self._hot_lock:
+            for hashed, value, expires in reversed(rows):
+                self._hot.set(hashed, (json.loads(value), expires))
+        return len(rows)
+
+    def stats(self):
+        # Counted from the database; queued writes are not in it yet
+        db = self._connection()
+        entries = db.execute("SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        size = db.execute("SELECT bytes FROM cache_sizes WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def _jsonable(value):
+    # Fingerprints in cache keys are bytes, which JSON has no type for
+    if isinstance(value, bytes):
+        return {"hex": value.hex()}
+    if isinstance(value, tuple):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _hashable(value):
+    # JSON turns the tuples in cache keys into lists
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return bytes.fromhex(value["hex"])
+    return value
+
+
+def save_snapshot(path, caches, model_version=config.MODEL_VERSION) -> int:
+    """
+    Write the live entries of the in-process caches in caches (namespace ->
+    cache) to path as JSON lines, least recently used first. Other backends
+    persist on their own and are skipped. Returns the entries written.
+    """
+    written = 0
+    temporary = f"{path}.{os.getpid()}.tmp"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"version": model_version}) + "\n")
+        for namespace, cache in caches.items():
+            if not isinstance(cache, MemoryCache):
+                continue
+            for key, value in cache.items():
+                if key in cache:
+                    f.write(json.dumps([namespace, _jsonable(key), value]) + "\n")
+                    written += 1
+    # Several workers may share the path; each replaces it whole
+    os.replace(temporary, path)
+    return written
+
+
+def load_snapshot(path, caches, model_version=config.MODEL_VERSION) -> int:
+    """
+    Fill the in-process caches in caches from a save_snapshot file, keeping
+    its recency order. A missing file or one saved for another model
+    version loads nothing. Returns the entries loaded.
+    """
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return 0
+    loaded = 0
+    with f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("version") != model_version:
+            return 0
+        for line in f:
+            namespace, key, value = json.loads(line)
+            cache = caches.get(namespace)
+            if isinstance(cache, MemoryCache):
+                cache.set(_hashable(key), value)
+                loaded += 1
+    return loaded
+
+
+def create_cache(namespace):
+    """
+    Build the cache backend selected by AI_ENGINE_CACHE_BACKEND, or a client
+    for the coordinator's cache when running under app.server.
+    """
+    if config.COORDINATOR_SOCKET:
+        from app.ai_engine.coordinator import RemoteCache
+        return RemoteCache(namespace, config.COORDINATOR_SOCKET)
+    return create_local_cache(namespace)
+
+
+def create_local_cache(namespace):
+    """
+    Build the cache backend selected by AI_ENGINE_CACHE_BACKEND in this process.
+    """
+    if config.CACHE_BACKEND == "sqlite":
+        return SQLiteCache(namespace)
+    if config.CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown cache backend: {config.CACHE_BACKEND}")
+    return MemoryCache()
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+class Superseded(Exception):
+    """
+    Raised for a request cancelled because a newer one arrived for its document.
+    """
+
+    def __init__(self):
+        super().__init__("Superseded by a newer request for this document.")
+
+
+class SessionTracker:
+    """
+    Keeps the in-flight request per editor document and cancels it when a
+    newer request for the same document arrives, releasing its model slot.
+
+    Also estimates the model time saved: each aborted model call is credited
+    with the typical call duration minus the time it had already run.
+    """
+
+    def __init__(self):
+        self._current = {}          # document_id -> task
+        self._superseded = set()
+        self._model_seconds = None  # moving average of completed model calls
+        self.superseded = 0
+        self.aborted_model_calls = 0
+        self.saved_model_seconds = 0.0
+
+    async def run(self, document_id, coro):
+        """
+        Await coro as the current request for document_id.
+        """
+        if document_id is None:
+            return await coro
+
+        previous = self._current.get(document_id)
+        if previous is not None and not previous.done():
+            self._superseded.add(previous)
+            previous.cancel()
+            self.superseded += 1
+
+        task = asyncio.ensure_future(coro)
+        self._current[document_id] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task in self._superseded:
+                raise Superseded() from None
+            # Our caller went away; do not leave the model call running
+            task.cancel()
+            raise
+        finally:
+            self._superseded.discard(task)
+            if self._current.get(document_id) is task:
+                del self._current[document_id]
+
+    async def track_model_call(self, awaitable):
+        """
+        Await a model call, recording its duration or the time saved by aborting it.
+        """
+        start = time.monotonic()
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            elapsed = time.monotonic() - start
+            self.aborted_model_calls += 1
+            if self._model_seconds is not None:
+                self.saved_model_seconds += max(self._model_seconds - elapsed, 0.0)
+            raise
+        elapsed = time.monotonic() - start
+        if self._model_seconds is None:
+            self._model_seconds = elapsed
+        else:
+            self._model_seconds = 0.9 * self._model_seconds + 0.1 * elapsed
+        return result
+
+    def stats(self):
+        return {
+            "active_documents": len(self._current),
+            "superseded": self.superseded,
+            "aborted_model_calls": self.aborted_model_calls,
+            "saved_model_seconds": self.saved_model_seconds,
+        }
@@ -0,0 +1,63 @@
+import asyncio
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key.
+
+    The first caller for a key starts the work; callers that arrive while it
+    is still in flight wait on the same task and receive its result (or its
+    exception) instead of starting their own model call. The shared call is
+    only cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> [task, number of waiting callers]
+        self.calls = 0       # number of times the work was actually started
+        self.coalesced = 0   # number of callers that joined an in-flight call
+        self.abandoned = 0   # shared calls cancelled because nobody waited any more
+
+    async def do(self, key, fn):
+        """
+        Run fn() for key, or join the call already in flight for that key.
+        """
+        entry = self._inflight.get(key)
+        if entry is None or entry[0].get_loop() is not asyncio.get_running_loop():
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            entry = [task, 0]
+            self._inflight[key] = entry
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        task = entry[0]
+
+        entry[1] += 1
+        try:
+            # Shield so one caller being cancelled does not cancel the shared call
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                # Last interested caller is gone; stop the work
+                self._forget(key, task)
+                task.cancel()
+                self.abandoned += 1
+            raise
+        finally:
+            entry[1] -= 1
+
+    def __contains__(self, key):
+        """Whether a call for key is in flight (joining it would coalesce)."""
+        return key in self._inflight
+
+    def _forget(self, key, task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,246 @@
+import ast
+import re
+
+_PYTHON_IMPORT = re.compile(r"^(import|from)\s")
+_PYTHON_IMPORT_LINE = re.compile(r"\n(?:import|from)[^\S\n]")
+_PYTHON_SCOPE = re.compile(r"^\s*(async\s+def|def|class)\s")
+_JS_IMPORT = re.compile(r"^\s*(import\s|export\s.*\sfrom\s|(const|let|var)\s.*=\s*require\()")
+# Runs of plain code, strings and comments (whose braces do not count), and
+# single braces; regex literals are not handled
+_JS_SIGNIFICANT = re.compile(r"""
+    [^"'`/{}]+ | "(?:[^"\\\n]|\\.)*"? | '(?:[^'\\\n]|\\.)*'? | `(?:[^`\\]|\\.)*`?
+  | //[^\n]* | /\*.*?(?:\*/|\Z) | [{}/]
+""", re.VERBOSE | re.DOTALL)
+
+# Share of the budget that imports may take
+_IMPORT_SHARE = 0.25
+# Longest top-level block around the cursor that is outlined with ast
+_PARSE_MAX_LINES = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for code (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _python_imports(text):
+    # Import lines are found by one regular expression search over the text,
+    # not a match per line: imports are few and files can be long
+    imports = []
+    line = 0
+    position = 0  # where line starts
+    resume = 0    # after the lines already taken
+    for match in _PYTHON_IMPORT_LINE.finditer("\n" + text):
+        start = match.start()  # in text, the match is one character later
+        if start < resume:
+            continue
+        line += text.count("\n", position, start)
+        position = start
+        imports.append(line)
+        end = text.find("\n", start)
+        if end == -1:
+            end = len(text)
+        statement = text[start:end]
+        if "(" in statement and ")" not in statement:
+            # from x import (a,\n b) spans several lines, up to the one closing it
+            close = text.find(")", end)
+            if close == -1:
+                close = len(text)
+            last = line + text.count("\n", end, close)
+            imports.extend(range(line + 1, last + 1))
+            line = last
+            position = text.rfind("\n", 0, close) + 1
+            end = text.find("\n", close)
+            if end == -1:
+                end = len(text)
+        resume = end + 1
+    return imports
+
+
+def _python_headers(lines):
+    """
+    Line numbers of the headers of the def/class blocks that enclose the last line.
+    """
+    # Only the top-level block around the cursor is parsed, so the cost does
+    # not grow with the file
+    top = len(lines) - 1
+    while top > 0 and (not lines[top].strip() or lines[top][0] in " \t"):
+        top -= 1
+    while top > 0 and lines[top - 1].startswith("@"):
+        top -= 1
+    if len(lines) - top > _PARSE_MAX_LINES:
+        # A long class or function: parsing costs far more per line than the walk
+        return _python_headers_by_indent(lines, top)
+    # The line at the cursor is usually mid-edit, and a failed parse costs
+    # many times a successful one: a statement at its indentation stands in
+    cursor = lines[-1]
+    block = lines[top:-1]
+    block.append(cursor[:len(cursor) - len(cursor.lstrip())] + "pass")
+    try:
+        tree = ast.parse("\n".join(block))
+    except SyntaxError:
+        # Still incomplete above the cursor; fall back to indentation
+        return _python_headers_by_indent(lines, top)
+
+    last = len(lines) - top
+    headers = []
+    nodes = tree.body
+    while nodes:
+        enclosing = [
+            node for node in nodes
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+            and node.lineno <= last <= node.end_lineno
+        ]
+        if not enclosing:
+            break
+        node = enclosing[-1]
+        # Decorators and a signature spanning several lines belong to the header
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        headers.extend(range(top + start - 1, top + node.body[0].lineno - 1))
+        nodes = node.body
+    return headers
+
+
+def _python_headers_by_indent(lines, top):
+    headers = []
+    # Walk up from the cursor; each def/class less indented than the last one found encloses it
+    indent = None
+    for i in range(len(lines) - 1, top - 1, -1):
+        line = lines[i]
+        if not line.strip():
+            continue
+        current = len(line) - len(line.lstrip())
+        if indent is None:
+            indent = current + 1 if _PYTHON_SCOPE.match(line) else current
+        if current < indent:
+            indent = current
+            if _PYTHON_SCOPE.match(line):
+                headers.append(i)
+        if indent == 0:
+            break
+    return headers[::-1]
+
+
+def _javascript_imports(lines):
+    return [
+        i for i, line in enumerate(lines)
+        if ("import" in line or "require(" in line or "from" in line) and _JS_IMPORT.match(line)
+    ]
+
+
+def is_import(line: str, language: str) -> bool:
+    """Whether a single line would be kept as an import (ignores continuation lines)."""
+    if language == "python":
+        return bool(_PYTHON_IMPORT.match(line))
+    if language == "javascript":
+        return bool(_JS_IMPORT.match(line))
+    return False
+
+
+def find_imports(lines, language):
+    """Line numbers of the import statements in lines."""
+    if language == "python":
+        return _python_imports("\n".join(lines))
+    if language == "javascript":
+        return _javascript_imports(lines)
+    return []
+
+
+def _javascript_headers(prefix):
+    """
+    Line numbers of the lines opening the braces that are still open at the
+    end of prefix (functions, classes, blocks).
+    """
+    open_lines = []
+    line = 0
+    position = 0
+    for match in _JS_SIGNIFICANT.finditer(prefix):
+        token = match.group()
+        if token == "{":
+            line += prefix.count("\n", position, match.start())
+            position = match.start()
+            open_lines.append(line)
+        elif token == "}":
+            if open_lines:
+                open_lines.pop()
+    return sorted(set(open_lines))
+
+
+def build_context(prefix: str, language: str, budget: int) -> str:
+    """
+    Trim the code before the cursor to roughly budget tokens.
+
+    Code that fits is returned unchanged. Otherwise the result keeps, in
+    file order: the imports, the headers of the functions/classes (or, for
+    JavaScript, open blocks) enclosing the cursor, and as many lines
+    directly before the cursor as the budget allows. Gaps are marked with
+    an ellipsis comment. budget <= 0 disables trimming.
+    """
+    if budget <= 0 or estimate_tokens(prefix) <= budget:
+        return prefix
+    imports = _python_imports(prefix) if language == "python" else None
+    return build_context_lines(prefix.split("\n"), language, budget, imports=imports, size=len(prefix))
+
+
+def build_context_lines(lines, language, budget, imports=None, size=None):
+    """
+    build_context for code already split into lines (the last one ends at
+    the cursor). imports, and size (the length of the joined lines), may be
+    passed in when the caller tracks them.
+    """
+    if size is None:
+        size = sum(map(len, lines)) + len(lines) - 1
+    if budget <= 0 or size // 4 + 1 <= budget:
+        return "\n".join(lines)
+
+    if imports is None:
+        imports = find_imports(lines, language)
+    if language == "python":
+        headers = _python_headers(lines)
+        gap = "# ..."
+    elif language == "javascript":
+        headers = _javascript_headers("\n".join(lines))
+        gap = "// ..."
+    else:
+        headers, gap = [], "..."
+
+    cursor = len(lines) - 1
+    selected = {cursor}
+    used = estimate_tokens(lines[cursor])
+
+    def take(i):
+        nonlocal used
+        cost = estimate_tokens(lines[i])
+        if i in selected:
+            return True
+        if used + cost > budget:
+            return False
+        selected.add(i)
+        used += cost
+        return True
+
+    # Enclosing scopes first (innermost is most useful), then imports, then nearby lines
+    for i in reversed(headers):
+        if not take(i):
+            break
+    import_budget = used + int(budget * _IMPORT_SHARE)
+    for i in imports:
+        if used + estimate_tokens(lines[i]) > import_budget or not take(i):
+            break
+    # The longest run, so take() is inlined
+    for i in range(cursor - 1, -1, -1):
+        if i not in selected:
+            cost = len(lines[i]) // 4 + 1
+            if used + cost > budget:
+                break
+            selected.add(i)
+            used += cost
+
+    out = []
+    previous = -1
+    for i in sorted(selected):
+        if i > previous + 1:
+            out.append(gap)
+        out.append(lines[i])
+        previous = i
+    return "\n".join(out)
@@ -0,0 +1,539 @@
+import asyncio
+import itertools
+import logging
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+
+from app import config
+from app.ai_engine.cache import MemoryCache, create_local_cache
+
+logger = logging.getLogger(__name__)
+
+# Messages are pickled tuples behind a 4-byte length. Only processes that can
+# open the socket file (kept in a private directory by app.server) can talk
+# to the coordinator.
+_HEADER = struct.Struct("!I")
+
+
+def _encode(message) -> bytes:
+    try:
+        body = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # An exception that cannot be pickled still reaches the caller, as text
+        request_id, kind, error = message
+        body = pickle.dumps((request_id, kind, RuntimeError(str(error))), protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(body)) + body
+
+
+async def _read(reader):
+    header = await reader.readexactly(_HEADER.size)
+    return pickle.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+
+
+def _read_sync(sock):
+    def exactly(n):
+        data = bytearray()
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("Coordinator closed the connection.")
+            data += chunk
+        return bytes(data)
+
+    return pickle.loads(exactly(_HEADER.unpack(exactly(_HEADER.size))[0]))
+
+
+class Coordinator:
+    """
+    Owns the caches and the Ollama connection pool for every worker process.
+
+    Workers connect over a unix socket. Cache operations are answered in
+    order as they arrive; model calls run concurrently, are matched to their
+    replies by request ID, and can be cancelled by the worker. Connections
+    that subscribe to a cache namespace are told when one of its entries is
+    overwritten with a different value, so workers can drop their copy.
+    """
+
+    def __init__(self, model_client=None):
+        if model_client is None:
+            from app.ai_engine.pool import OllamaPool
+            model_client = OllamaPool.from_config()
+        self.model_client = model_client
+        self.caches = {}
+        self._subscribers = {}  # namespace -> {reply function of each subscribed connection}
+
+    def cache(self, namespace):
+        cache = self.caches.get(namespace)
+        if cache is None:
+            cache = self.caches[namespace] = create_local_cache(namespace)
+        return cache
+
+    async def serve(self, path, ready=None):
+        """
+        Listen on path until cancelled; ready (an asyncio.Event) is set once connections are accepted.
+        """
+        for namespace in ("suggestion", "generation"):
+            warmed = self.cache(namespace).warm()
+            logger.info(f"Warmed {warmed} {namespace} cache entries")
+        health_checks = asyncio.create_task(self.model_client.run_health_checks(config.HEALTH_CHECK_INTERVAL))
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            health_checks.cancel()
+
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        calls = {}
+
+        async def reply(request_id, kind, payload=None):
+            async with lock:
+                writer.write(_encode((request_id, kind, payload)))
+                await writer.drain()
+
+        try:
+            while True:
+                request_id, op, args = await _read(reader)
+                if op == "subscribe":
+                    self._subscribers.setdefault(args[0], set()).add(reply)
+                elif op in ("generate", "generate_on_all"):
+                    task = asyncio.create_task(self._generate(request_id, args, reply, op))
+                    calls[request_id] = task
+                    task.add_done_callback(lambda _, request_id=request_id: calls.pop(request_id, None))
+                elif op == "cancel":
+                    task = calls.pop(request_id, None)
+                    if task is not None:
+                        task.cancel()
+                else:
+                    try:
+                        result = await self._cache_op(reply, op, *args)
+                    except Exception as e:
+                        result, kind = e, "error"
+                    else:
+                        kind = "result"
+                    # Writes (request_id None) are not acknowledged
+                    if request_id is not None:
+                        await reply(request_id, kind, result)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # The worker is gone; nobody is waiting for its model calls
+            for task in calls.values():
+                task.cancel()
+            for subscribers in self._subscribers.values():
+                subscribers.discard(reply)
+            writer.close()
+
+    async def _cache_op(self, sender, op, namespace=None, *args):
+        if op == "backend_stats":
+            return self.model_client.stats()
+        cache = self.cache(namespace)
+        if op == "get":
+            return await cache.get_async(args[0])
+        if op == "set":
+            key, value = args[0], args[1]
+            previous = await cache.get_async(key)
+            cache.set(*args)
+            if previous is not None and previous != value:
+                await self._invalidate(sender, namespace, key)
+            return None
+        if op == "contains":
+            return await cache.get_async(args[0]) is not None
+        if op == "len":
+            return len(cache)
+        if op == "clear":
+            return cache.clear()
+        if op == "stats":
+            return cache.stats()
+        raise ValueError(f"Unknown coordinator operation: {op}")
+
+    async def _invalidate(self, sender, namespace, key):
+        """Tell the other subscribed connections that key changed."""
+        for reply in list(self._subscribers.get(namespace, ())):
+            if reply is not sender:
+                try:
+                    await reply(None, "invalidate", key)
+                except ConnectionError:
+                    pass
+
+    async def _generate(self, request_id, kwargs, reply, op="generate"):
+        try:
+            response = await getattr(self.model_client, op)(**kwargs)
+            if not kwargs.get("stream"):
+                await reply(request_id, "result", response)
+                return
+            try:
+                async for part in response:
+                    await reply(request_id, "part", part)
+            finally:
+                await response.aclose()
+            await reply(request_id, "end")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            try:
+                await reply(request_id, "error", e)
+            except ConnectionError:
+                pass
+
+
+def run_coordinator(path, parent_pid=None):
+    """
+    Process entry point: serve the coordinator on path until terminated, or
+    until parent_pid exits (so a killed server never leaves it behind).
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        serving = asyncio.ensure_future(Coordinator().serve(path))
+        while parent_pid is None or os.getppid() == parent_pid:
+            done, _ = await asyncio.wait([serving], timeout=1)
+            if done:
+                return serving.result()
+        serving.cancel()
+        await asyncio.gather(serving, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+class _SyncConnection:
+    """
+    Blocking request/response connection to the coordinator, one per thread
+    (and per process, so a forked worker does not share its parent's socket).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _socket(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def call(self, op, *args):
+        sock = self._socket()
+        try:
+            sock.sendall(_encode((0, op, args)))
+            _, kind, payload = _read_sync(sock)
+        except OSError:
+            self._local.sock = None
+            raise
+        if kind == "error":
+            raise payload
+        return payload
+
+    def send(self, op, *args):
+        """Fire and forget: no reply is sent for request ID None."""
+        try:
+            self._socket().sendall(_encode((None, op, args)))
+        except OSError:
+            self._local.sock = None
+            raise
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+class _Channel:
+    """
+    One multiplexed asyncio connection to the coordinator. Messages it
+    sends without a request ID (invalidations) go to on_push(kind, payload),
+    which also gets ("closed", None) when the connection is lost.
+    """
+
+    def __init__(self, reader, writer, on_push=None):
+        self.reader = reader
+        self.writer = writer
+        self.on_push = on_push
+        self._ids = itertools.count(1)
+        self._pending = {}  # request ID -> future (single reply) or queue (stream)
+        self._reader_task = asyncio.ensure_future(self._dispatch())
+
+    @property
+    def closed(self):
+        return self._reader_task.done()
+
+    async def _dispatch(self):
+        error = ConnectionError("The coordinator connection was closed.")
+        try:
+            while True:
+                request_id, kind, payload = await _read(self.reader)
+                if request_id is None:
+                    if self.on_push is not None:
+                        self.on_push(kind, payload)
+                    continue
+                pending = self._pending.get(request_id)
+                if isinstance(pending, asyncio.Queue):
+                    pending.put_nowait((kind, payload))
+                elif pending is not None and not pending.done():
+                    if kind == "error":
+                        pending.set_exception(payload)
+                    else:
+                        pending.set_result(payload)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = ConnectionError(f"Lost the coordinator connection: {e}")
+        except Exception as e:
+            # A frame that does not decode: nothing after it on the stream can be trusted
+            logger.error(f"Bad message from the coordinator: {e!r}")
+            error = ConnectionError(f"Bad message from the coordinator: {e!r}")
+        finally:
+            self.writer.close()
+            if self.on_push is not None:
+                self.on_push("closed", None)
+            # Whatever ended the connection, nobody may be left waiting on it
+            for pending in self._pending.values():
+                if isinstance(pending, asyncio.Queue):
+                    pending.put_nowait(("error", error))
+                elif not pending.done():
+                    pending.set_exception(error)
+
+    def send(self, op, args):
+        """Fire and forget: no reply is sent for request ID None."""
+        self.writer.write(_encode((None, op, args)))
+
+    def _send(self, request_id, op, args):
+        self.writer.write(_encode((request_id, op, args)))
+
+    async def call(self, args, op="generate"):
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            self._send(request_id, op, args)
+            return await future
+        except asyncio.CancelledError:
+            if not self.closed:
+                self._send(request_id, "cancel", None)
+            raise
+        finally:
+            del self._pending[request_id]
+
+    async def stream(self, kwargs):
+        request_id = next(self._ids)
+        queue = self._pending[request_id] = asyncio.Queue()
+        finished = False
+        try:
+            self._send(request_id, "generate", kwargs)
+            while True:
+                kind, payload = await queue.get()
+                if kind == "part":
+                    yield payload
+                    continue
+                finished = True
+                if kind == "error":
+                    raise payload
+                return
+        finally:
+            del self._pending[request_id]
+            if not finished and not self.closed:
+                # Closed early (first line found, client gone, ...): stop the model
+                self._send(request_id, "cancel", None)
+
+
+class _Channels:
+    """
+    The _Channel of each event loop, (re)connected on first use.
+    on_connect(channel) runs for every new connection.
+    """
+
+    def __init__(self, path, on_connect=None, on_push=None):
+        self.path = path
+        self.on_connect = on_connect
+        self.on_push = on_push
+        self._channels = {}  # event loop -> _Channel
+        self._connecting = {}
+
+    def current(self):
+        """This event loop's open channel, or None (also outside an event loop)."""
+        try:
+            channel = self._channels.get(asyncio.get_running_loop())
+        except RuntimeError:
+            return None
+        return channel if channel is not None and not channel.closed else None
+
+    async def get(self):
+        loop = asyncio.get_running_loop()
+        channel = self._channels.get(loop)
+        if channel is not None and not channel.closed:
+            return channel
+        connecting = self._connecting.get(loop)
+        if connecting is None:
+            self._channels = {l: c for l, c in self._channels.items() if not l.is_closed()}
+            connecting = self._connecting[loop] = asyncio.ensure_future(asyncio.open_unix_connection(self.path))
+        try:
+            reader, writer = await asyncio.shield(connecting)
+        finally:
+            self._connecting.pop(loop, None)
+        channel = self._channels.get(loop)
+        if channel is None or channel.closed or channel.reader is not reader:
+            channel = self._channels[loop] = _Channel(reader, writer, self.on_push)
+            if self.on_connect is not None:
+                self.on_connect(channel)
+        return channel
+
+    async def close(self):
+        """Close this event loop's connection."""
+        channel = self._channels.pop(asyncio.get_running_loop(), None)
+        if channel is not None:
+            channel.writer.close()
+            await asyncio.gather(channel._reader_task, return_exceptions=True)
+
+
+class RemoteCache:
+    """
+    Cache held by the coordinator, shared by every worker process.
+
+    Request handlers use get_async(), which goes over an asyncio connection
+    and never blocks the event loop; get() and the other synchronous calls
+    are for scripts and tests. Recently used entries are also kept in a
+    small in-process tier so repeated hits do not leave the worker. That
+    tier is only filled while the connection is subscribed to the
+    coordinator's invalidations: an entry overwritten by another worker
+    (a regenerated function, say) is dropped here, and everything is
+    dropped if the connection is lost. clear() only empties this worker's
+    tier and the shared cache.
+    """
+
+    def __init__(self, namespace, path, hot_max_bytes=max(config.CACHE_MAX_BYTES // 16, 1)):
+        self.namespace = namespace
+        self._connection = _SyncConnection(path)
+        self._channels = _Channels(path, on_connect=self._subscribe, on_push=self._on_push)
+        self._hot = MemoryCache(max_bytes=hot_max_bytes)
+        self._shared_stats = (0.0, None)  # (time.monotonic() of refresh_stats(), coordinator's stats)
+        self.hits = 0
+        self.misses = 0
+
+    def _subscribe(self, channel):
+        channel.send("subscribe", (self.namespace,))
+
+    def _on_push(self, kind, payload):
+        if kind == "invalidate":
+            self._hot._discard(payload)
+        elif kind == "closed":
+            # Invalidations may have been missed
+            self._hot.clear()
+
+    def _count(self, value, default):
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        value = self._hot.get(key)
+        if value is None:
+            value = self._connection.call("get", self.namespace, key)
+        return self._count(value, default)
+
+    async def get_async(self, key, default=None):
+        value = self._hot.get(key)
+        if value is None:
+            channel = await self._channels.get()
+            value = await channel.call((self.namespace, key), "get")
+            if value is not None and not channel.closed:
+                self._hot.set(key, value)
+        return self._count(value, default)
+
+    def set(self, key, value, ttl=None):
+        channel = self._channels.current()
+        if channel is None:
+            # Outside the event loop, or not connected from it yet
+            self._connection.send("set", self.namespace, key, value, ttl)
+            return
+        self._hot.set(key, value, ttl)
+        channel.send("set", (self.namespace, key, value, ttl))
+
+    def __contains__(self, key):
+        return key in self._hot or self._connection.call("contains", self.namespace, key)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __len__(self):
+        return self._connection.call("len", self.namespace)
+
+    def clear(self):
+        self._hot.clear()
+        self._connection.call("clear", self.namespace)
+
+    def warm(self):
+        # The coordinator warms the shared cache when it starts
+        return 0
+
+    def close(self):
+        self._connection.close()
+
+    async def refresh_stats(self):
+        """Fetch the shared cache's stats for stats() without blocking the event loop."""
+        channel = await self._channels.get()
+        self._shared_stats = (time.monotonic(), await channel.call((self.namespace,), "stats"))
+
+    def stats(self):
+        refreshed, stats = self._shared_stats
+        if stats is None or time.monotonic() - refreshed > 1.0:
+            stats = self._connection.call("stats", self.namespace)
+        # Hits and misses as seen by this worker, sizes of the shared cache
+        return {**stats, "hits": self.hits, "misses": self.misses}
+
+
+class CoordinatorClient:
+    """
+    Model client for worker processes: calls go through the coordinator's
+    Ollama pool. Same interface as OllamaPool.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._channels = _Channels(path)
+        self._stats_connection = _SyncConnection(path)
+        self._backend_stats = (0.0, None)
+
+    async def generate(self, **kwargs):
+        channel = await self._channels.get()
+        if kwargs.get("stream"):
+            return channel.stream(kwargs)
+        return await channel.call(kwargs)
+
+    async def generate_on_all(self, **kwargs):
+        channel = await self._channels.get()
+        return await channel.call(kwargs, "generate_on_all")
+
+    async def run_health_checks(self, interval):
+        # The coordinator checks the backends for everyone
+        return
+
+    async def close(self):
+        """Close this event loop's connection to the coordinator."""
+        self._stats_connection.close()
+        await self._channels.close()
+
+    async def refresh_stats(self):
+        """Fetch the backend stats for stats() without blocking the event loop."""
+        channel = await self._channels.get()
+        self._backend_stats = (time.monotonic(), await channel.call((), "backend_stats"))
+
+    def stats(self):
+        refreshed, stats = self._backend_stats
+        if stats is None or time.monotonic() - refreshed > 1.0:
+            stats = self._stats_connection.call("backend_stats")
+        return stats
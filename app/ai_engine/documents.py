@@ -0,0 +1,236 @@
+import bisect
+import itertools
+from collections import OrderedDict
+
+from app import config
+from app.ai_engine.context import build_context_lines, find_imports, is_import
+
+class DocumentVersionMismatch(Exception):
+    """
+    Raised when deltas are sent for a document the server does not have in
+    the expected version; the client should resend the full code.
+    """
+
+    def __init__(self, message="Unknown document or version; send the full code."):
+        super().__init__(message)
+
+
+class Document:
+    """
+    Server-side copy of an editor buffer.
+
+    Keeps the lines, the offset where each starts and the line numbers of
+    its imports, and updates them in place for each text delta. The
+    offsets of all lines after the last edit are shifted lazily, by one
+    pending amount, so a delta costs work proportional to the lines it
+    edits and to its distance (in lines) from the previous delta, not to
+    the size of the buffer. The full text is only joined again when read.
+    """
+
+    def __init__(self, text, language):
+        self.version = 0
+        self.language = language
+        self.lines = text.split("\n")
+        self.size = len(text)
+        self.imports = find_imports(self.lines, language)
+        self._text = text
+        self._starts = None     # offset of each line, built on first use
+        self._shift_from = 0    # offsets of lines after this one are _shift short
+        self._shift = 0
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = "\n".join(self.lines)
+        return self._text
+
+    def _line_starts(self):
+        if self._starts is None:
+            self._starts = [0]
+            self._starts.extend(itertools.accumulate(len(line) + 1 for line in self.lines[:-1]))
+        return self._starts
+
+    def _move_shift(self, line):
+        """
+        Store the offsets up to line exactly and the ones after it _shift
+        short, touching only the lines between line and _shift_from.
+        """
+        starts, shift, exact = self._starts, self._shift, self._shift_from
+        if shift and line > exact:
+            starts[exact + 1:line + 1] = [start + shift for start in starts[exact + 1:line + 1]]
+        elif shift and line < exact:
+            starts[line + 1:exact + 1] = [start - shift for start in starts[line + 1:exact + 1]]
+        self._shift_from = line
+
+    def _start(self, line):
+        start = self._starts[line]
+        return start + self._shift if self._shift and line > self._shift_from else start
+
+    def position(self, offset):
+        """(line, column) of a character offset."""
+        starts = self._line_starts()
+        if not self._shift:
+            line = bisect.bisect_right(starts, offset) - 1
+            return line, offset - starts[line]
+        tail = self._shift_from + 1
+        line = bisect.bisect_right(starts, offset, 0, tail) - 1
+        if line == tail - 1:
+            # Maybe further on, where the stored offsets are _shift short
+            line = bisect.bisect_right(starts, offset - self._shift, tail) - 1
+        return line, offset - self._start(line)
+
+    def apply(self, offset, deleted, inserted):
+        """
+        Replace text[offset:offset + deleted] with inserted.
+        """
+        if offset < 0 or deleted < 0 or offset + deleted > self.size:
+            raise ValueError("Delta is outside the document.")
+        first, column = self.position(offset)
+        last, _ = self.position(offset + deleted)
+
+        old_lines = self.lines[first:last + 1]
+        block = "\n".join(old_lines)
+        new_lines = (block[:column] + inserted + block[column + deleted:]).split("\n")
+        self.lines[first:last + 1] = new_lines
+        change = len(inserted) - deleted
+        self.size += change
+        self._text = None
+
+        # The lines after this edit take its length change on top of the pending shift
+        self._move_shift(last)
+        start = self._starts[first]
+        new_starts = [start]
+        for line in new_lines[:-1]:
+            start += len(line) + 1
+            new_starts.append(start)
+        self._starts[first:last + 1] = new_starts
+        self._shift_from = first + len(new_lines) - 1
+        self._shift += change
+
+        changed = range(first, last + 1)
+        if any(i in changed for i in self.imports) or any(is_import(line, self.language) for line in new_lines):
+            # An import (or one of its continuation lines) changed
+            self.imports = find_imports(self.lines, self.language)
+        elif len(new_lines) != len(old_lines):
+            shift = len(new_lines) - len(old_lines)
+            self.imports = [i + shift if i > last else i for i in self.imports]
+
+    def set_language(self, language):
+        if language != self.language:
+            self.language = language
+            self.imports = find_imports(self.lines, language)
+
+    def context(self, cursor_position, budget):
+        """
+        Same as context.build_context for the text before cursor_position,
+        reusing the document's lines and imports.
+        """
+        if cursor_position is None or cursor_position < 0:
+            cursor_position = self.size
+        line, column = self.position(cursor_position)
+        lines = self.lines[:line]
+        lines.append(self.lines[line][:column])
+        imports = self.imports[:bisect.bisect_left(self.imports, line)]
+        return build_context_lines(lines, self.language, budget, imports=imports, size=min(cursor_position, self.size))
+
+
+class DocumentStore:
+    """
+    Documents by ID, bounded by count and total text size; the least
+    recently used documents are evicted first.
+    """
+
+    def __init__(self, max_documents=1000, max_bytes=64 * 1024 * 1024):
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self._documents = OrderedDict()
+        self.current_bytes = 0
+        self.opened = 0
+        self.deltas = 0
+        self.evictions = 0
+
+    def open(self, document_id, text, language):
+        """
+        Start (or resynchronise) a document with its full text.
+        """
+        previous = self._documents.pop(document_id, None)
+        if previous is not None:
+            self.current_bytes -= previous.size
+        document = Document(text, language)
+        if previous is not None:
+            document.version = previous.version + 1
+        self._documents[document_id] = document
+        self.current_bytes += len(text)
+        self.opened += 1
+        self._evict()
+        return document
+
+    def get(self, document_id):
+        document = self._documents.get(document_id)
+        if document is not None:
+            self._documents.move_to_end(document_id)
+        return document
+
+    def peek(self, document_id):
+        """Look a document up without touching its LRU position."""
+        return self._documents.get(document_id)
+
+    def apply(self, document_id, deltas, version=None):
+        """
+        Apply deltas (in order) to a known document and return it.
+
+        Raises DocumentVersionMismatch when the document is unknown here or
+        version is given and differs from the server's.
+        """
+        document = self.get(document_id)
+        if document is None:
+            raise DocumentVersionMismatch()
+        if version is not None and version != document.version:
+            raise DocumentVersionMismatch(
+                f"Document is at version {document.version}, not {version}; send the full code."
+            )
+        before = document.size
+        try:
+            for delta in deltas:
+                document.apply(delta.offset, delta.deleted, delta.inserted)
+        except ValueError:
+            # A partly applied edit leaves the copy unusable
+            self.close(document_id)
+            raise
+        document.version += 1
+        self.current_bytes += document.size - before
+        self.deltas += len(deltas)
+        self._evict()
+        return document
+
+    def close(self, document_id):
+        document = self._documents.pop(document_id, None)
+        if document is not None:
+            self.current_bytes -= document.size
+
+    def _evict(self):
+        while self._documents and (
+            len(self._documents) > self.max_documents or self.current_bytes > self.max_bytes
+        ):
+            _, document = self._documents.popitem(last=False)
+            self.current_bytes -= document.size
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._documents)
+
+    def stats(self):
+        return {
+            "documents": len(self._documents),
+            "bytes": self.current_bytes,
+            "opened": self.opened,
+            "deltas": self.deltas,
+            "evictions": self.evictions,
+        }
+
+
+# Editor buffers kept between requests, shared by both engines
+document_store = DocumentStore(
+    max_documents=config.DOCUMENT_MAX_SESSIONS,
+    max_bytes=config.DOCUMENT_MAX_BYTES
+)
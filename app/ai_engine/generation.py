@@ -1,84 +1,204 @@
-from app.ai_engine.utils import get_ollama_client
-from cachetools import LRUCache
+from app.ai_engine.utils import get_ollama_client, get_async_ollama_client, log_sampled
+from app.ai_engine.cache import create_cache, fingerprint
+from app.ai_engine.coalescing import SingleFlight
+from app.ai_engine.admission import model_admission, within_deadline
+from app.ai_engine.metrics import GENERATION_VALIDATIONS, STAGE_SECONDS, language_label
+from app.ai_engine.normalize import ShingleIndex, normalize_code
+from app.ai_engine.routing import model_router
+from app.ai_engine.context import build_context
+from app.ai_engine.tracing import record_outcome
+from app.ai_engine.postprocess import GenerationStreamFilter, clean_generation
+from app.ai_engine.validation import check_syntax
+from app import config
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize cache (max 1000 entries)
-generation_cache = LRUCache(maxsize=1000)
+# Cache of generated functions (backend and size limits come from app.config)
+generation_cache = create_cache("generation")
 
-# Get Ollama client
-ollama_client = get_ollama_client()
+# Identical generations requested concurrently share one model call
+generation_inflight = SingleFlight()
+
+# Optional near-duplicate lookup for inputs that normalize differently
+generation_near_duplicates = ShingleIndex(threshold=config.NEAR_DUPLICATE_THRESHOLD)
+
+# Async client pool for the API server (scripts use the blocking get_ollama_client())
+async_ollama_client = get_async_ollama_client()
+
+def _build_prompt(code: str, language: str) -> str:
+    """
+    Build the Ollama prompt for completing a function body.
+    """
+    code = build_context(code, language, config.PROMPT_TOKEN_BUDGET)
+    return f"Complete the following {language} function by providing only the function body as plain code (do not repeat the function signature, do not include markdown, code blocks, comments, or explanations). The output should be the exact code to append after the function signature, with proper indentation, and must be syntactically correct and return an appropriate value:\n{code}\nReturn only the function body, nothing else."
+
+def _cache_key(code: str, context: dict, language: str):
+    """
+    Return (cache key, normalized code). Whitespace and comments do not
+    change the key, so the cache holds bodies and each caller's own
+    signature is put back in front; the key keeps only a fingerprint of the
+    code, and the normalized text is for the near-duplicate index.
+    """
+    normalized = normalize_code(code, language)
+    return (fingerprint(normalized), tuple(sorted(context.items()))), normalized
+
+def _lookup(cache_key, normalized):
+    body = generation_cache.get(cache_key)
+    if body is None:
+        similar = generation_near_duplicates.lookup(cache_key[1], normalized)
+        if similar is not None:
+            body = generation_cache.get(similar)
+    return body
+
+async def _lookup_async(cache_key, normalized):
+    body = await generation_cache.get_async(cache_key)
+    if body is None:
+        similar = generation_near_duplicates.lookup(cache_key[1], normalized)
+        if similar is not None:
+            body = await generation_cache.get_async(similar)
+    return body
+
+def _store(cache_key, normalized, body):
+    generation_cache[cache_key] = body
+    generation_near_duplicates.add(cache_key[1], cache_key, normalized)
 
 def generate_function(code: str, context: dict) -> str:
     """
     Generate a complete function using Ollama with caching.
     """
-    # Create a cache key based on inputs
-    cache_key = (code, tuple(sorted(context.items())))
+    language = context.get("language", "python").lower()
+    cache_key, normalized = _cache_key(code, context, language)
 
     # Check cache first
-    if cache_key in generation_cache:
-        return generation_cache[cache_key]
+    body = _lookup(cache_key, normalized)
+    if body is None:
+        prompt = _build_prompt(code, language)
 
-    language = context.get("language", "python").lower()
-    prompt = f"Complete the following {language} function by providing only the function body as plain code (do not repeat the function signature, do not include markdown, code blocks, comments, or explanations). The output should be the exact code to append after the function signature, with proper indentation, and must be syntactically correct and return an appropriate value:\n{code}\nReturn only the function body, nothing else."
-
-    # Call Ollama to generate function
-    response = ollama_client.generate(model="codellama", prompt=prompt)
-    generated_code = response['response'].strip()
-
-    # Log the raw response for debugging
-    logger.debug(f"Raw response from Ollama: {repr(generated_code)}")
-
-    # Post-process to remove markdown, comments, and explanations
-    lines = generated_code.split("\n")
-    code_lines = []
-    in_code_block = False
-    for line in lines:
-        line = line.strip()
-        # Skip markdown code block markers
-        if line.startswith("```"):
-            in_code_block = not in_code_block
-            continue
-        # Skip comments and empty lines outside code blocks
-        if not in_code_block and (line.startswith("#") or line.startswith("//") or not line):
-            continue
-        # Skip explanatory text (heuristic: lines without indentation are likely explanations)
-        if not in_code_block and not line.startswith(" ") and not line.startswith("\t"):
-            continue
-        # Add the actual code line
-        code_lines.append(line)
-
-    generated_code = "\n".join(code_lines).strip()
-
-    # Log the processed code
-    logger.debug(f"Processed code: {repr(generated_code)}")
-
-    # If the generated code is empty or invalid, use a placeholder
-    if not generated_code or generated_code.isspace():
-        if language == "python":
-            generated_code = "    return None  # Generated placeholder"
-        elif language == "javascript":
-            generated_code = "    return null;  // Generated placeholder\n}"
-        else:
-            generated_code = "// Generated code for unsupported language"
-    else:
-        # Ensure the generated code is a continuation (remove the input code if present)
-        code_stripped = code.strip()
-        if generated_code.startswith(code_stripped):
-            generated_code = generated_code[len(code_stripped):].strip()
-
-        # For JavaScript, ensure the closing brace is included if needed
-        if language == "javascript" and not generated_code.endswith("}"):
-            generated_code = f"{generated_code}\n}}"
+        # Call Ollama to generate function
+        response = get_ollama_client().generate(model=model_router.preferred("generate", language), prompt=prompt)
+        body = clean_generation(code, response['response'], language)
+        log_sampled(logger, "Raw response from Ollama: %r, processed: %r", response['response'], body)
+
+        # Cache the result
+        _store(cache_key, normalized, body)
 
     # Combine the input signature with the generated body for a ready-to-use function
-    final_code = f"{code}\n{generated_code}"
+    return f"{code}\n{body}"
 
-    # Cache the result
-    generation_cache[cache_key] = final_code
-    return final_code
+async def generate_function_async(code: str, context: dict, deadline: float = None) -> str:
+    """
+    Async variant of generate_function; awaits the model call instead of
+    blocking the event loop. deadline is an absolute time.monotonic() value
+    after which the call is abandoned.
+    """
+    language = context.get("language", "python").lower()
+    labels = {"action": "generate", "language": language_label(language)}
+
+    with STAGE_SECONDS.time(stage="cache_lookup", **labels):
+        cache_key, normalized = _cache_key(code, context, language)
+        body = await _lookup_async(cache_key, normalized)
+    if body is not None:
+        record_outcome("cache")
+        return f"{code}\n{body}"
+
+    async def call_model():
+        prompt = _build_prompt(code, language)
+        model, fallback = model_router.route("generate", language)
+        with STAGE_SECONDS.time(stage="model_call", **labels):
+            response = await model_admission.run(
+                "generate",
+                lambda: model_router.call(model, async_ollama_client.generate(model=model, prompt=prompt)),
+                deadline
+            )
+        with STAGE_SECONDS.time(stage="postprocess", **labels):
+            body = clean_generation(code, response['response'], language)
+        log_sampled(logger, "Raw response from Ollama: %r, processed: %r", response['response'], body)
+        # A fallback model's answer is not kept in place of the routed model's
+        if not fallback:
+            _store(cache_key, normalized, body)
+        return body
+
+    # Callers whose code normalizes the same share one call, each keeping its own signature
+    record_outcome("coalesced" if cache_key in generation_inflight else "model")
+    body = await within_deadline(generation_inflight.do(cache_key, call_model), deadline)
+    return f"{code}\n{body}"
+
+async def generate_validated_async(code: str, context: dict, deadline: float = None):
+    """
+    generate_function_async, checked to parse: a function that does not is
+    regenerated once, with the syntax error in the prompt, and the fix
+    replaces the cached body. Returns (function, error); error is None if
+    the returned function parses.
+    """
+    language = context.get("language", "python").lower()
+    labels = {"language": language_label(language)}
+    function = await generate_function_async(code, context, deadline)
+    with STAGE_SECONDS.time(stage="syntax_check", action="generate", **labels):
+        error = check_syntax(function, language)
+    if error is None:
+        GENERATION_VALIDATIONS.inc(result="valid", **labels)
+        return function, None
+
+    prompt = f"{_build_prompt(code, language)}\nA previous answer was not valid {language} ({error}); make sure this one is."
+    model, fallback = model_router.route("generate", language)
+    with STAGE_SECONDS.time(stage="model_call", action="generate", **labels):
+        response = await model_admission.run(
+            "generate",
+            lambda: model_router.call(model, async_ollama_client.generate(model=model, prompt=prompt)),
+            deadline
+        )
+    body = clean_generation(code, response['response'], language)
+    regenerated = f"{code}\n{body}"
+    if check_syntax(regenerated, language) is not None:
+        GENERATION_VALIDATIONS.inc(result="invalid", **labels)
+        return function, error
+    GENERATION_VALIDATIONS.inc(result="regenerated", **labels)
+    if not fallback:
+        _store(*_cache_key(code, context, language), body)
+    return regenerated, None
+
+async def generate_function_stream(code: str, context: dict, deadline: float = None):
+    """
+    Stream a generated function as it is produced by the model.
 
+    Yields text chunks whose concatenation equals what generate_function
+    would return; the body is cached once the stream completes.
+    """
+    language = context.get("language", "python").lower()
+    cache_key, normalized = _cache_key(code, context, language)
+    body = await _lookup_async(cache_key, normalized)
+    if body is not None:
+        record_outcome("cache")
+        yield f"{code}\n{body}"
+        return
+
+    record_outcome("model")
+    prompt = _build_prompt(code, language)
+    stream_filter = GenerationStreamFilter(code, language)
+    model, fallback = model_router.route("generate", language)
+
+    # The deadline applies to getting a model slot; once tokens flow they are forwarded
+    await model_admission.acquire("generate", deadline)
+    try:
+        # The input signature goes out first, before the model has produced anything
+        chunks = [f"{code}\n"]
+        yield chunks[0]
+
+        with model_router.track(model):
+            stream = await async_ollama_client.generate(model=model, prompt=prompt, stream=True)
+            async for part in stream:
+                delta = stream_filter.feed(part['response'])
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+    finally:
+        model_admission.release()
+
+    delta = stream_filter.finish()
+    if delta:
+        chunks.append(delta)
+        yield delta
+
+    if not fallback:
+        _store(cache_key, normalized, "".join(chunks[1:]))
@@ -0,0 +1,140 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition without a client library dependency.
+
+_metrics = []
+_collectors = []
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return sum(entry[0]) if entry else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def register_collector(fn):
+    """
+    Register fn() -> iterable of (name, type, help, labels dict, value) read at scrape time.
+
+    Used for components that already keep their own counters (caches, pool, ...).
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    # Samples of one metric must be contiguous, whichever collector produced them
+    families = {}
+    for collector in _collectors:
+        for name, kind, help, labels, value in collector():
+            family = families.setdefault(name, [f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+            family.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    for family in families.values():
+        lines.extend(family)
+    return "\n".join(lines) + "\n"
+
+
+# Per-stage latency of /api/ai-engine requests
+STAGE_SECONDS = Histogram(
+    "ai_engine_stage_seconds",
+    "Time spent per request stage (validation, cache_lookup, local_completion, model_call, postprocess, syntax_check, total).",
+    ("stage", "action", "language")
+)
+
+# Time suggestion model calls spend in the batch scheduler before they are sent
+BATCH_WAIT_SECONDS = Histogram(
+    "ai_engine_batch_wait_seconds",
+    "Time suggestions waited in the batch scheduler (window and parallel cap) before their model call."
+)
+
+# Syntax checks of generated functions requested with "validate"
+GENERATION_VALIDATIONS = Counter(
+    "ai_engine_generation_validations_total",
+    "Validated generations by result (valid, regenerated, invalid).",
+    ("result", "language")
+)
+
+# Suggestion cache misses the local n-gram index answered or left to the model
+LOCAL_COMPLETIONS = Counter(
+    "ai_engine_local_completions_total",
+    "Suggestions the local n-gram index was asked for, by result (served, declined).",
+    ("result", "language")
+)
+
+_LANGUAGE_LABELS = {"python", "javascript"}
+
+def language_label(language):
+    """Bound label cardinality: anything unsupported is reported as "other"."""
+    language = (language or "python").lower()
+    return language if language in _LANGUAGE_LABELS else "other"
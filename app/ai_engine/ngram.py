@@ -0,0 +1,183 @@
+import glob
+import os
+import re
+
+# Characters of code before the cursor that are tokenized for a prediction
+CONTEXT_CHARS = 512
+
+_COMMENTS = {
+    "python": r"#[^\n]*",
+    "javascript": r"//[^\n]*|/\*.*?\*/",
+}
+_EXTENSIONS = {".py": "python", ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".ts": "javascript"}
+
+
+def _token_pattern(comment):
+    return re.compile(
+        r"(?P<newline>[ \t]*(?:\n[ \t]*)+)"
+        r"|(?P<space>[ \t]+)"
+        rf"|(?P<comment>{comment})"
+        r"""|(?P<token>\w+|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|\S)""",
+        re.S
+    )
+
+
+_PATTERNS = {language: _token_pattern(comment) for language, comment in _COMMENTS.items()}
+# Languages without comment rules never match the comment group
+_DEFAULT_PATTERN = _token_pattern(r"(?!)")
+
+
+def tokenize(text, language):
+    """
+    Tokens of code for the n-gram model: "\\n" for every line break (with the
+    next line's indentation dropped, as suggestions carry none), and words,
+    string literals and single punctuation characters, each with a leading
+    space if whitespace preceded it on the line. Comments are skipped.
+    """
+    tokens = []
+    space = False
+    for match in _PATTERNS.get(language, _DEFAULT_PATTERN).finditer(text):
+        kind = match.lastgroup
+        if kind == "newline":
+            if not tokens or tokens[-1] != "\n":
+                tokens.append("\n")
+            space = False
+        elif kind == "space":
+            space = bool(tokens) and tokens[-1] != "\n"
+        elif kind == "token":
+            tokens.append(" " + match.group() if space else match.group())
+            space = False
+    return tokens
+
+
+class NgramIndex:
+    """
+    Token n-gram model of code, for answering predictable next lines
+    (`return a + b`, a closing brace, `pass`) without the model.
+
+    Counts of the token following each context of 1 to order - 1 tokens
+    are kept per language, together with the most frequent follower.
+    predict() decodes the next line greedily, each step backing off to the
+    longest context seen at least min_count times, and answers only while
+    the product of the steps' probabilities stays at or above
+    min_confidence. At most max_contexts contexts are counted; later ones
+    are ignored.
+    """
+
+    def __init__(self, order=6, min_count=3, min_confidence=0.9, max_contexts=500_000, max_tokens=48, enabled=True):
+        self.order = order
+        self.min_count = min_count
+        self.min_confidence = min_confidence
+        self.max_contexts = max_contexts
+        self.max_tokens = max_tokens
+        self.enabled = enabled
+        self._counts = {}  # (language, *context) -> [total, best token, best count, {token: count}]
+        self.learned = 0
+        self.predictions = 0
+        self.answered = 0
+
+    def _history(self, before, language):
+        tokens = tokenize(before[-CONTEXT_CHARS:], language)
+        if len(before) > CONTEXT_CHARS:
+            # The cut may have split the first token
+            tokens = tokens[1:]
+        return tokens[-(self.order - 1):]
+
+    def learn(self, language, text, before=""):
+        """
+        Count the tokens of text, with the end of before as their left context.
+        """
+        history = self._history(before, language) if before else []
+        tokens = tokenize(text, language)
+        if tokens[:1] == ["\n"] and history[-1:] == ["\n"]:
+            tokens = tokens[1:]
+        counts = self._counts
+        longest = self.order - 1
+        for token in tokens:
+            for k in range(1, min(len(history), longest) + 1):
+                key = (language, *history[-k:])
+                entry = counts.get(key)
+                if entry is None:
+                    if len(counts) >= self.max_contexts:
+                        continue
+                    entry = counts[key] = [0, None, 0, {}]
+                entry[0] += 1
+                count = entry[3][token] = entry[3].get(token, 0) + 1
+                if count > entry[2]:
+                    entry[1], entry[2] = token, count
+            history.append(token)
+            if len(history) > longest:
+                del history[0]
+        self.learned += len(tokens)
+
+    def _next(self, language, history):
+        for k in range(len(history), 0, -1):
+            entry = self._counts.get((language, *history[-k:]))
+            if entry is not None and entry[0] >= self.min_count:
+                return entry[1], entry[2] / entry[0]
+        return None, 0.0
+
+    def predict(self, language, before):
+        """
+        The line following the code in before (without indentation), or None
+        if the model is not confident enough. If before ends inside a line,
+        that line has to be predicted to end first.
+        """
+        self.predictions += 1
+        history = self._history(before, language)
+        needs_newline = bool(history) and history[-1] != "\n"
+        line = []
+        confidence = 1.0
+        for _ in range(self.max_tokens + 1):
+            token, probability = self._next(language, history)
+            confidence *= probability
+            if token is None or confidence < self.min_confidence:
+                return None
+            if token == "\n":
+                if not needs_newline:
+                    if not line:
+                        return None
+                    self.answered += 1
+                    return "".join(line).strip()
+                needs_newline = False
+            elif needs_newline:
+                # The model would continue the current line instead
+                return None
+            else:
+                line.append(token)
+            history.append(token)
+            if len(history) >= self.order:
+                del history[0]
+        return None
+
+    def index_files(self, patterns):
+        """
+        Learn from the source files matching the glob patterns (recursive
+        "**" allowed); the language comes from the file extension. Returns
+        the number of files read.
+        """
+        files = 0
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                language = _EXTENSIONS.get(os.path.splitext(path)[1])
+                if language is None or not os.path.isfile(path):
+                    continue
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    self.learn(language, f.read())
+                files += 1
+        return files
+
+    def clear(self):
+        self._counts.clear()
+        self.learned = 0
+
+    def __len__(self):
+        return len(self._counts)
+
+    def stats(self):
+        return {
+            "contexts": len(self._counts),
+            "learned_tokens": self.learned,
+            "predictions": self.predictions,
+            "answered": self.answered,
+        }
@@ -0,0 +1,152 @@
+import io
+import re
+import tokenize
+from collections import OrderedDict
+
+# Separator for normalized tokens; cannot occur inside a token
+_SEP = "\x00"
+
+_SKIPPED_PYTHON_TOKENS = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+
+_JS_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`)
+  | (?P<space>\s+)
+  | (?P<token>[A-Za-z_$][\w$]*|\d[\w.]*|>>>=|===|!==|\*\*=|<<=|>>=|>>>|\?\?=|&&=|\|\|=|\.\.\.
+      |=>|==|!=|<=|>=|&&|\|\||\?\?|\?\.|\+\+|--|\*\*|<<|>>|[-+*/%&|^]=|\S)
+""", re.VERBOSE | re.DOTALL)
+
+
+def _python_tokens(code):
+    tokens = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type in _SKIPPED_PYTHON_TOKENS:
+                continue
+            if tok.type == tokenize.NEWLINE:
+                tokens.append("\n")
+            elif tok.type == tokenize.INDENT:
+                tokens.append("<indent>")
+            elif tok.type == tokenize.DEDENT:
+                tokens.append("<dedent>")
+            else:
+                tokens.append(tok.string)
+    except (tokenize.TokenError, SyntaxError):
+        # e.g. an unclosed bracket or inconsistent dedent while the user is typing
+        return None
+    return tokens
+
+
+def _javascript_tokens(code):
+    # Lightweight: no regex literals or ASI; good enough to ignore layout and comments
+    return [
+        match.group()
+        for match in _JS_TOKEN.finditer(code)
+        if match.lastgroup in ("string", "token")
+    ]
+
+
+def normalize_code(code: str, language: str) -> str:
+    """
+    Canonical form of code for cache keys.
+
+    Insensitive to whitespace (other than Python indentation structure) and
+    comments: Python is tokenized with the tokenize module, JavaScript with a
+    small regex tokenizer. Other languages, and Python that does not
+    tokenize, only have their whitespace collapsed.
+    """
+    if language == "python":
+        tokens = _python_tokens(code)
+    elif language == "javascript":
+        tokens = _javascript_tokens(code)
+    else:
+        tokens = None
+    if tokens is None:
+        tokens = code.split()
+    return _SEP.join(tokens)
+
+
+class ShingleIndex:
+    """
+    Near-duplicate lookup over normalized code.
+
+    Each entry is kept as the set of hashed k-token shingles of its
+    normalized code. lookup() returns the stored key with the highest
+    Jaccard similarity to the query, if it reaches threshold. Entries are
+    scoped (e.g. by request context) and bounded LRU; threshold=0 disables
+    the index.
+    """
+
+    def __init__(self, threshold=0.0, k=4, max_entries=1000):
+        self.threshold = threshold
+        self.k = k
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (scope, key) -> frozenset of shingle hashes
+        self._postings = {}            # (scope, shingle) -> set of keys containing it
+        self.lookups = 0
+        self.hits = 0
+
+    def _shingles(self, normalized):
+        tokens = normalized.split(_SEP)
+        if len(tokens) <= self.k:
+            return frozenset([hash(tuple(tokens))])
+        return frozenset(hash(tuple(tokens[i:i + self.k])) for i in range(len(tokens) - self.k + 1))
+
+    def add(self, scope, key, normalized):
+        if self.threshold <= 0:
+            return
+        if (scope, key) in self._entries:
+            self._entries.move_to_end((scope, key))
+            return
+        shingles = self._shingles(normalized)
+        self._entries[(scope, key)] = shingles
+        for shingle in shingles:
+            self._postings.setdefault((scope, shingle), set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self.remove(*next(iter(self._entries)))
+
+    def lookup(self, scope, normalized):
+        """
+        Return the key of the most similar stored entry, or None.
+        """
+        if self.threshold <= 0:
+            return None
+        self.lookups += 1
+        shingles = self._shingles(normalized)
+        overlap = {}
+        for shingle in shingles:
+            for key in self._postings.get((scope, shingle), ()):
+                overlap[key] = overlap.get(key, 0) + 1
+
+        best, best_score = None, 0.0
+        for key, shared in overlap.items():
+            score = shared / (len(shingles) + len(self._entries[(scope, key)]) - shared)
+            if score > best_score:
+                best, best_score = key, score
+        if best is None or best_score < self.threshold:
+            return None
+        self._entries.move_to_end((scope, best))
+        self.hits += 1
+        return best
+
+    def remove(self, scope, key):
+        shingles = self._entries.pop((scope, key), None)
+        for shingle in shingles or ():
+            keys = self._postings[(scope, shingle)]
+            keys.discard(key)
+            if not keys:
+                del self._postings[(scope, shingle)]
+
+    def clear(self):
+        self._entries.clear()
+        self._postings.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
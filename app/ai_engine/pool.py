@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+
+from app import config
+from app.ai_engine.utils import AsyncOllamaClient
+
+logger = logging.getLogger(__name__)
+
+class NoBackendAvailable(ConnectionError):
+    """
+    Raised when every Ollama backend is ejected or has already failed this request.
+    """
+
+    def __init__(self):
+        super().__init__("No healthy Ollama backend available.")
+
+
+def _is_retryable(error) -> bool:
+    """Connection problems and server-side errors are worth trying elsewhere."""
+    # Imported here to keep them out of the app's import time
+    import httpx
+    import ollama
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+
+class Backend:
+    """
+    One Ollama host with its own keep-alive client and concurrency limit.
+    """
+
+    def __init__(self, host, max_concurrent, timeout, keepalive_connections):
+        self.host = host
+        self.max_concurrent = max_concurrent
+        self.client = AsyncOllamaClient(
+            host=host,
+            timeout=timeout,
+            limits=dict(
+                max_connections=max_concurrent,
+                max_keepalive_connections=keepalive_connections,
+                keepalive_expiry=60
+            )
+        )
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def record_failure(self, eject_after, eject_seconds):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= eject_after:
+            if self.healthy:
+                logger.warning(f"Ejecting Ollama backend {self.host} for {eject_seconds}s")
+            self.ejected_until = time.monotonic() + eject_seconds
+
+
+class OllamaPool:
+    """
+    Client for a set of Ollama hosts.
+
+    Each call goes to the healthy backend with the fewest outstanding
+    requests, waiting if every backend is at its concurrency limit. A
+    backend that fails eject_after times in a row is taken out of rotation
+    for eject_seconds; connection and 5xx errors are retried on another
+    backend up to `retries` times. Health checks probe every backend and
+    re-admit ejected ones as soon as they answer.
+    """
+
+    def __init__(self, hosts, max_concurrent=16, timeout=120.0, retries=1, eject_after=3,
+                 eject_seconds=30.0, keepalive_connections=16):
+        self.backends = [Backend(host, max_concurrent, timeout, keepalive_connections) for host in hosts]
+        self.retries = retries
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._released = {}  # event loop -> asyncio.Event set when a slot frees up
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            config.OLLAMA_HOSTS,
+            max_concurrent=config.BACKEND_MAX_CONCURRENT,
+            timeout=config.OLLAMA_TIMEOUT,
+            retries=config.BACKEND_RETRIES,
+            eject_after=config.BACKEND_EJECT_AFTER,
+            eject_seconds=config.BACKEND_EJECT_SECONDS,
+            keepalive_connections=config.BACKEND_KEEPALIVE_CONNECTIONS
+        )
+
+    def _release_event(self):
+        loop = asyncio.get_running_loop()
+        event = self._released.get(loop)
+        if event is None:
+            self._released = {l: e for l, e in self._released.items() if not l.is_closed()}
+            event = self._released[loop] = asyncio.Event()
+        return event
+
+    async def _acquire(self, exclude):
+        """Reserve a slot on the least loaded healthy backend not in exclude."""
+        while True:
+            candidates = [b for b in self.backends if b.healthy and b not in exclude]
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: b.outstanding)
+            if backend.outstanding < backend.max_concurrent:
+                backend.outstanding += 1
+                backend.requests += 1
+                return backend
+            await self._release_event().wait()
+
+    def _release(self, backend):
+        backend.outstanding -= 1
+        event = self._released.get(asyncio.get_running_loop())
+        if event is not None:
+            # Wake everyone waiting for a slot, then start a fresh event for later waiters
+            event.set()
+            self._released[asyncio.get_running_loop()] = asyncio.Event()
+
+    async def generate(self, **kwargs):
+        """
+        Same as ollama.AsyncClient.generate, routed across the pool.
+        """
+        tried = []
+        last_error = None
+        for _ in range(self.retries + 1):
+            backend = await self._acquire(tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            try:
+                response = await backend.client.generate(**kwargs)
+                if kwargs.get("stream"):
+                    # Pull the first part here so connection errors can still be retried
+                    first = await response.__anext__()
+            except StopAsyncIteration:
+                backend.record_success()
+                self._release(backend)
+                return _empty_stream()
+            except Exception as e:
+                self._release(backend)
+                if not _is_retryable(e):
+                    raise
+                backend.record_failure(self.eject_after, self.eject_seconds)
+                last_error = e
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+
+            backend.record_success()
+            if kwargs.get("stream"):
+                # The slot stays taken until the stream is finished or closed
+                return self._stream(backend, first, response)
+            self._release(backend)
+            return response
+        raise last_error or NoBackendAvailable()
+
+    async def generate_on_all(self, **kwargs):
+        """
+        Send the same (non-streaming) generate call to every healthy backend,
+        e.g. to load a model on all of them. Returns when all have answered.
+        """
+        backends = [b for b in self.backends if b.healthy]
+        if not backends:
+            raise NoBackendAvailable()
+        return await asyncio.gather(*[b.client.generate(**kwargs) for b in backends])
+
+    async def _stream(self, backend, first, response):
+        try:
+            yield first
+            async for part in response:
+                yield part
+        finally:
+            await response.aclose()
+            self._release(backend)
+
+    async def check_health(self):
+        """
+        Probe every backend once; eject the ones that fail, re-admit the ones that answer.
+        """
+        async def probe(backend):
+            try:
+                await backend.client.list()
+            except Exception as e:
+                logger.warning(f"Health check failed for Ollama backend {backend.host}: {e}")
+                backend.consecutive_failures = max(backend.consecutive_failures, self.eject_after - 1)
+                backend.record_failure(self.eject_after, self.eject_seconds)
+            else:
+                backend.record_success()
+
+        await asyncio.gather(*[probe(backend) for backend in self.backends])
+
+    async def run_health_checks(self, interval):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        return [
+            {
+                "host": b.host,
+                "healthy": b.healthy,
+                "outstanding": b.outstanding,
+                "requests": b.requests,
+                "failures": b.failures,
+            }
+            for b in self.backends
+        ]
+
+
+async def _empty_stream():
+    return
+    yield
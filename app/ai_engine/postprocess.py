@@ -0,0 +1,301 @@
+# Cleaning of raw model output, shared by both engines. Each response is
+# scanned once, with the work done by str.split/find/strip rather than
+# per-line Python checks.
+
+# Returned when the model gives nothing usable
+GENERATION_PLACEHOLDERS = {
+    "python": "    return None  # Generated placeholder",
+    "javascript": "    return null;  // Generated placeholder\n}",
+    None: "// Generated code for unsupported language",
+}
+SUGGESTION_PLACEHOLDERS = {
+    "python": "    pass  # suggested",
+    "javascript": "return null;  // Suggested placeholder",
+    None: "// Suggestion for unsupported language",
+}
+
+def _scan_fences(raw: str) -> list:
+    """
+    Lines inside ``` fences of stripped raw, for any fence placement:
+    jumps from one ``` to the next, and one in the middle of a line is not
+    a fence.
+    """
+    find = raw.find
+    lines = []
+    inside = False
+    content = 0  # start of the current fenced block
+    i = find("```")
+    while i != -1:
+        start = raw.rfind("\n", 0, i) + 1
+        end = find("\n", i)
+        if end == -1:
+            end = len(raw)
+        if start == i or raw[start:i].isspace():
+            if inside and start > content:
+                lines += raw[content:start - 1].split("\n")
+            inside = not inside
+            content = end + 1
+        i = find("```", end)
+    if inside and content <= len(raw):
+        lines += raw[content:].split("\n")
+    return lines
+
+
+def _dedent(lines: list, prefix: str = "") -> str:
+    """
+    lines without trailing whitespace or leading and trailing blank lines,
+    with the indentation of the first one replaced by prefix on every line;
+    a line indented less than that starts at prefix. Blank lines stay empty.
+    """
+    text = "\n".join(map(str.rstrip, lines)).strip("\n")
+    if not text:
+        return text
+    size = len(text) - len(text.lstrip())
+    if not size:
+        return _indent(text, prefix) if prefix else text
+    indent = "\n" + text[:size]
+    if "\n\n" not in text and text.count(indent) == text.count("\n"):
+        # Every line shares the indentation
+        return prefix + text[size:].replace(indent, "\n" + prefix)
+    indent = indent[1:]
+    return "\n".join(
+        prefix + (line[size:] if line.startswith(indent) else line.lstrip()) if line else line
+        for line in text.split("\n")
+    )
+
+
+def _indent(text: str, prefix: str) -> str:
+    """prefix before every non-blank line of text."""
+    if "\n\n" not in text:
+        return prefix + text.replace("\n", "\n" + prefix)
+    return "\n".join(prefix + line if line else line for line in text.split("\n"))
+
+
+def _body_prefix(code: str, language: str) -> str:
+    """
+    Indentation of the body under code's last line (the def line of a
+    Python signature, which may be a method): one level deeper. Bodies in
+    other languages are left as generated.
+    """
+    if language != "python":
+        return ""
+    line = code.rstrip()
+    line = line[line.rfind("\n") + 1:]
+    return line[:len(line) - len(line.lstrip())] + "    "
+
+
+def _generation_placeholder(language: str, prefix: str) -> str:
+    if language == "python":
+        return prefix + GENERATION_PLACEHOLDERS["python"].lstrip()
+    return GENERATION_PLACEHOLDERS.get(language, GENERATION_PLACEHOLDERS[None])
+
+
+def fenced_code(raw: str) -> str:
+    """
+    The lines inside ``` fences, dedented by the first one's indentation;
+    everything outside a fence (prose, comments, a stray signature) is
+    dropped.
+    """
+    if "```" not in raw:
+        return ""
+    parts = ("\n" + raw).split("\n```")
+    if raw.count("```") != len(parts) - 1:
+        lines = _scan_fences(raw.strip())
+    elif len(parts) <= 3:
+        # One fence pair (the usual answer): the block after the opening fence line
+        start = parts[1].find("\n")
+        lines = parts[1][start + 1:].split("\n") if start != -1 else []
+    else:
+        # Every ``` starts a line: odd parts are the fenced blocks
+        lines = []
+        for block in parts[1::2]:
+            start = block.find("\n")
+            if start != -1:
+                lines += block[start + 1:].split("\n")
+    return _dedent(lines)
+
+
+def clean_generation(code: str, raw: str, language: str) -> str:
+    """
+    Function body from a raw generation: fenced code only, without an echo
+    of the input code, indented under the signature for Python and closed
+    for JavaScript, or a placeholder if empty. The signature, a newline and
+    the body form the returned function.
+    """
+    # Python bodies go one level under the signature
+    prefix = _body_prefix(code, language)
+    body = fenced_code(raw)
+    if not body:
+        return _generation_placeholder(language, prefix)
+
+    # Ensure the generated code is a continuation (remove the input code if present)
+    code_stripped = code.strip()
+    if body.startswith(code_stripped):
+        body = _dedent(body[len(code_stripped):].split("\n"), prefix)
+    elif prefix:
+        body = _indent(body, prefix)
+
+    # For JavaScript, ensure the closing brace is included if needed
+    if language == "javascript" and not body.endswith("}"):
+        body = f"{body}\n}}"
+    return body
+
+
+def first_suggestion_line(text: str):
+    """
+    First non-blank line of text that is not a bare fence, stripped, or None.
+    """
+    for line in text.split("\n"):
+        line = line.strip()
+        if line and line != "```":
+            return line
+    return None
+
+
+def clean_suggestion(raw: str, language: str) -> str:
+    """
+    Single suggested line from a raw response, indented for Python, or a
+    placeholder if there is nothing usable.
+    """
+    suggestion = first_suggestion_line(raw) or ""
+
+    # Add indentation for Python(4 spaces: Standard Python indentation)
+    if language == "python" and suggestion:
+        suggestion = "    " + suggestion
+
+    # Fallback if suggestion is empty or invalid
+    if not suggestion or "#" in suggestion:
+        suggestion = SUGGESTION_PLACEHOLDERS.get(language, SUGGESTION_PLACEHOLDERS[None])
+    return suggestion
+
+
+class SuggestionStreamFilter:
+    """
+    Incremental version of first_suggestion_line for streamed model output.
+
+    feed() returns the first usable line once it is complete, so the model
+    stream can be closed; finish() returns whatever incomplete text is left.
+    """
+
+    def __init__(self):
+        self._partial = ""
+
+    def feed(self, chunk: str):
+        text = self._partial + chunk
+        end = text.rfind("\n")
+        if end == -1:
+            self._partial = text
+            return None
+        self._partial = text[end + 1:]
+        return first_suggestion_line(text[:end])
+
+    def finish(self) -> str:
+        partial, self._partial = self._partial, ""
+        return partial
+
+
+class GenerationStreamFilter:
+    """
+    Incremental version of clean_generation for streamed model output.
+
+    Feed raw chunks as they arrive; each call returns the part of the
+    function body that is now safe to forward. Concatenating the outputs of
+    feed() and finish() gives the body that clean_generation would produce
+    for the whole response.
+    """
+
+    def __init__(self, code: str, language: str):
+        self.language = language
+        self._code_stripped = code.strip()
+        self._prefix = _body_prefix(code, language)
+        self._partial = ""          # incomplete last line of the stream
+        self._in_code_block = False
+        self._held = []             # kept lines that may still echo the input code
+        self._echo_resolved = False
+        self._blank_lines = 0       # blank lines waiting for a following code line
+        self._last_line = ""
+        self._kept_code = False     # whether any non-blank line survived filtering
+        self._indent = None         # indentation of the first fenced code line
+        self._body_indent = None    # and of the first body line, once the echo is gone
+
+    def _keep(self, line: str):
+        """Return the line, right-stripped, if clean_generation would keep it, else None."""
+        if line.lstrip().startswith("```"):
+            self._in_code_block = not self._in_code_block
+            return None
+        return line.rstrip() if self._in_code_block else None
+
+    @staticmethod
+    def _dedent(line: str, indent: str) -> str:
+        return line[len(indent):] if line.startswith(indent) else line.lstrip()
+
+    def _emit(self, line: str) -> str:
+        if not line:
+            self._blank_lines += 1
+            return ""
+        if not self._last_line:
+            # Nothing emitted yet: leading blank lines are stripped
+            self._body_indent = line[:len(line) - len(line.lstrip())]
+            self._blank_lines = 0
+        line = self._dedent(line, self._body_indent)
+        indented = self._prefix + line
+        if not self._last_line:
+            self._last_line = line
+            return indented
+        out = "\n" * (self._blank_lines + 1) + indented
+        self._blank_lines = 0
+        self._last_line = line
+        return out
+
+    def _resolve_echo(self) -> str:
+        """Drop the input code if the model repeated it, then release held lines."""
+        self._echo_resolved = True
+        trailing_blanks = 0
+        while self._held and not self._held[-1]:
+            self._held.pop()
+            trailing_blanks += 1
+        text = "\n".join(self._held).strip()
+        self._held = []
+        if text.startswith(self._code_stripped):
+            text = text[len(self._code_stripped):]
+        out = "".join(self._emit(line) for line in text.split("\n")) if text else ""
+        self._blank_lines += trailing_blanks
+        return out
+
+    def _push(self, line: str) -> str:
+        if line:
+            self._kept_code = True
+            if self._indent is None:
+                self._indent = line[:len(line) - len(line.lstrip())]
+            line = self._dedent(line, self._indent)
+        if self._echo_resolved:
+            return self._emit(line)
+        self._held.append(line)
+        text = "\n".join(self._held).strip()
+        if len(text) < len(self._code_stripped) and self._code_stripped.startswith(text):
+            return ""
+        return self._resolve_echo()
+
+    def feed(self, chunk: str) -> str:
+        *lines, self._partial = (self._partial + chunk).split("\n")
+        out = []
+        for line in lines:
+            line = self._keep(line)
+            if line is not None:
+                out.append(self._push(line))
+        return "".join(out)
+
+    def finish(self) -> str:
+        out = []
+        line = self._keep(self._partial)
+        self._partial = ""
+        if line is not None:
+            out.append(self._push(line))
+        if not self._echo_resolved:
+            out.append(self._resolve_echo())
+
+        if not self._kept_code:
+            out.append(_generation_placeholder(self.language, self._prefix))
+        elif self.language == "javascript" and not self._last_line.endswith("}"):
+            out.append("\n}")
+        return "".join(out)
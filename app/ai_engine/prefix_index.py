@@ -0,0 +1,157 @@
+from collections import OrderedDict
+
+class _Node:
+    __slots__ = ("children", "value", "tag", "parent", "first")
+
+    def __init__(self, parent=None, first=None):
+        # first character of the edge label -> (edge label, child node)
+        self.children = {}
+        self.value = None
+        self.tag = None
+        # Where the node hangs, so it can be removed without its prefix
+        self.parent = parent
+        self.first = first
+
+
+class PrefixIndex:
+    """
+    Radix trie over code[:cursor_position] that reuses earlier suggestions
+    while the user types them.
+
+    When a new prefix is an indexed prefix followed by the leading part of
+    its suggestion, the rest of that suggestion is still valid and can be
+    returned without calling the model. Entries are evicted in LRU order
+    once max_entries is reached; max_entries=0 disables the index.
+    on_hit(tag) is called on the first hit of each tagged suggestion.
+    """
+
+    def __init__(self, max_entries=1000, on_hit=None):
+        self.max_entries = max_entries
+        self.on_hit = on_hit
+        self._roots = {}
+        self._lru = OrderedDict()  # node holding a value -> scope
+        self.lookups = 0
+        self.hits = 0
+
+    def insert(self, scope, prefix, suggestion, tag=None):
+        """
+        Index suggestion for prefix; scope separates languages/contexts, and
+        tag (e.g. the model that made it) is passed to on_hit.
+        """
+        if self.max_entries <= 0:
+            return
+        node = self._roots.setdefault(scope, _Node())
+        pos = 0
+        while pos < len(prefix):
+            edge = node.children.get(prefix[pos])
+            if edge is None:
+                child = _Node(node, prefix[pos])
+                node.children[prefix[pos]] = (prefix[pos:], child)
+                node = child
+                pos = len(prefix)
+                break
+            label, child = edge
+            common = _common_length(label, prefix, pos)
+            if common < len(label):
+                # Split the edge at the point where the prefixes diverge
+                middle = _Node(node, prefix[pos])
+                middle.children[label[common]] = (label[common:], child)
+                child.parent, child.first = middle, label[common]
+                node.children[prefix[pos]] = (label[:common], middle)
+                child = middle
+            node = child
+            pos += common
+        node.value = suggestion
+        node.tag = tag
+
+        # Keyed by node: the trie already holds the prefix, no second copy is kept
+        self._lru[node] = scope
+        self._lru.move_to_end(node)
+        while len(self._lru) > self.max_entries:
+            old_node, old_scope = self._lru.popitem(last=False)
+            self._remove(old_scope, old_node)
+
+    def lookup(self, scope, prefix):
+        """
+        Return the still-untyped rest of an earlier suggestion, or None.
+        """
+        self.lookups += 1
+        node = self._roots.get(scope)
+        candidates = []
+        pos = 0
+        while node is not None:
+            if node.value is not None:
+                candidates.append((pos, node))
+            if pos == len(prefix):
+                break
+            edge = node.children.get(prefix[pos])
+            if edge is None or not prefix.startswith(edge[0], pos):
+                break
+            pos += len(edge[0])
+            node = edge[1]
+
+        # Prefer the most recent (deepest) prefix that still explains what was typed
+        for start, match in reversed(candidates):
+            rest = _continuation(prefix[start:], match.value)
+            if rest is not None:
+                self.hits += 1
+                self._lru.move_to_end(match)
+                if match.tag is not None and self.on_hit is not None:
+                    # Once per suggestion, however many keystrokes it serves
+                    self.on_hit(match.tag)
+                    match.tag = None
+                return rest
+        return None
+
+    def _remove(self, scope, node):
+        node.value = None
+        node.tag = None
+        # Prune nodes that no longer hold a value or lead anywhere
+        while node.parent is not None and node.value is None and not node.children:
+            del node.parent.children[node.first]
+            node = node.parent
+        root = self._roots.get(scope)
+        if root is not None and not root.children and root.value is None:
+            del self._roots[scope]
+
+    def clear(self):
+        self._roots.clear()
+        self._lru.clear()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def stats(self):
+        return {
+            "entries": len(self._lru),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+        }
+
+
+def _common_length(label, text, pos):
+    """Length of the common prefix of label and text[pos:]."""
+    limit = min(len(label), len(text) - pos)
+    i = 0
+    while i < limit and label[i] == text[pos + i]:
+        i += 1
+    return i
+
+
+def _continuation(typed, suggestion):
+    """
+    Return the part of suggestion left after the user typed `typed`, or None
+    if the typed text is not a leading part of the suggestion.
+    """
+    if not typed:
+        # Exact prefix matches are answered by the suggestion cache itself
+        return None
+    # Suggestions are next lines; the editor inserts the newline and its own indentation
+    if typed.startswith("\n"):
+        typed = typed[1:]
+    typed = typed.lstrip(" \t")
+    suggestion = suggestion.lstrip(" \t")
+    if "\n" in typed or len(typed) >= len(suggestion) or not suggestion.startswith(typed):
+        return None
+    return suggestion[len(typed):]
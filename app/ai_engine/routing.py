@@ -0,0 +1,161 @@
+import time
+from contextlib import contextmanager
+
+from app import config
+from app.ai_engine.metrics import Histogram
+
+# Latency of model calls by the model that answered them
+MODEL_CALL_SECONDS = Histogram(
+    "ai_engine_model_call_seconds",
+    "Time from sending a model call to its answer, per model.",
+    ("model",)
+)
+
+
+class _ModelStats:
+    __slots__ = ("outstanding", "calls", "latency", "fallbacks", "served", "accepted")
+
+    def __init__(self):
+        self.outstanding = 0
+        self.calls = 0
+        self.latency = 0.0     # exponentially weighted seconds per call
+        self.fallbacks = 0     # requests sent to the fallback instead of this model
+        self.served = 0        # suggestions this model produced
+        self.accepted = 0      # of those, typed by the user (typed-prefix hits)
+
+
+class ModelRouter:
+    """
+    Chooses the Ollama model for each request from its action and language.
+
+    routes maps (action, language) or (action, None) to a model; anything
+    else goes to default. While the chosen model's estimated queue wait
+    (calls in flight beyond what the backends run at once, times its recent
+    latency) is over fallback_wait seconds, requests go to the fallback
+    model instead, and their results are not cached.
+
+    Per model the router keeps calls in flight, latency, fallbacks, and how
+    many of its suggestions were served and then accepted, so routes can be
+    tuned from data.
+    """
+
+    def __init__(self, routes=None, default="codellama", fallback=None, fallback_wait=0.0, parallel=1):
+        self.routes = dict(routes or {})
+        self.default = default
+        self.fallback = fallback
+        self.fallback_wait = fallback_wait
+        self.parallel = max(1, parallel)
+        self._models = {}
+
+    @classmethod
+    def from_config(cls):
+        routes = parse_routes(config.MODEL_ROUTES)
+        return cls(
+            routes=routes,
+            default=config.MODEL,
+            # The model suggestions use is the fast one
+            fallback=config.FALLBACK_MODEL or routes.get(("suggestion", None), config.MODEL),
+            fallback_wait=config.FALLBACK_QUEUE_MS / 1000,
+            parallel=config.MODEL_PARALLEL * len(config.OLLAMA_HOSTS)
+        )
+
+    def _stats(self, model):
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = _ModelStats()
+        return stats
+
+    def preferred(self, action, language):
+        routes = self.routes
+        return routes.get((action, language)) or routes.get((action, None)) or self.default
+
+    def models(self):
+        """Every model a request can be sent to, in a stable order."""
+        models = [self.default, *self.routes.values(), self.fallback]
+        return list(dict.fromkeys(model for model in models if model))
+
+    def queue_wait(self, model):
+        """Estimated seconds a new call to model would wait for the backends."""
+        stats = self._models.get(model)
+        if stats is None:
+            return 0.0
+        waiting = stats.outstanding + 1 - self.parallel
+        return max(0, waiting) / self.parallel * stats.latency
+
+    def route(self, action, language):
+        """
+        Return (model, fallback): the model to call and whether it is the
+        fallback for an overloaded preferred model.
+        """
+        model = self.preferred(action, language)
+        if (self.fallback_wait > 0 and self.fallback and model != self.fallback
+                and self.queue_wait(model) > self.fallback_wait):
+            self._stats(model).fallbacks += 1
+            return self.fallback, True
+        return model, False
+
+    @contextmanager
+    def track(self, model):
+        """Count a call to model as in flight; its latency is recorded if it succeeds."""
+        stats = self._stats(model)
+        stats.outstanding += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            stats.outstanding -= 1
+        elapsed = time.monotonic() - start
+        stats.calls += 1
+        stats.latency = elapsed if stats.calls == 1 else 0.8 * stats.latency + 0.2 * elapsed
+        MODEL_CALL_SECONDS.observe(elapsed, model=model)
+
+    async def call(self, model, awaitable):
+        with self.track(model):
+            return await awaitable
+
+    def record_served(self, model):
+        self._stats(model).served += 1
+
+    def record_accepted(self, model):
+        if model is not None:
+            self._stats(model).accepted += 1
+
+    def clear(self):
+        """Forget the per-model stats."""
+        self._models.clear()
+
+    def stats(self):
+        return [
+            {
+                "model": model,
+                "outstanding": stats.outstanding,
+                "calls": stats.calls,
+                "latency_seconds": stats.latency,
+                "queue_wait_seconds": self.queue_wait(model),
+                "fallbacks": stats.fallbacks,
+                "served": stats.served,
+                "accepted": stats.accepted,
+                "accept_rate": stats.accepted / stats.served if stats.served else 0.0,
+            }
+            for model, stats in self._models.items()
+        ]
+
+
+def parse_routes(spec):
+    """
+    Parse "action[:language]=model" pairs separated by commas into a routes dict.
+    """
+    routes = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        target, _, model = item.partition("=")
+        action, _, language = target.strip().partition(":")
+        if not model.strip() or action not in ("suggestion", "generate"):
+            raise ValueError(f"Invalid model route: {item.strip()!r}")
+        routes[(action, language.lower() or None)] = model.strip()
+    return routes
+
+
+# Shared by both engines
+model_router = ModelRouter.from_config()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import Counter, deque
+
+from app.ai_engine.metrics import BATCH_WAIT_SECONDS
+
+class BatchScheduler:
+    """
+    Sits between the engine and the model client and groups requests.
+
+    Requests are collected for up to window_ms (or until max_batch requests
+    are waiting) and the batch is then dispatched at once, with at most
+    max_parallel model calls outstanding. Ollama has no multi-prompt
+    endpoint, so a batch is sent as concurrent calls that the server can
+    schedule onto its parallel slots together. A window of 0 disables
+    batching: each request is sent on its own, still within max_parallel.
+    The time each request waits before its call is observed in
+    ai_engine_batch_wait_seconds.
+    """
+
+    def __init__(self, dispatch, window_ms=5, max_batch=16, max_parallel=64):
+        self._dispatch = dispatch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_parallel = max_parallel
+        self._loop = None
+        self._pending = deque()
+        self._semaphore = None
+        self._worker = None
+        self._batch_full = None
+        # Stats
+        self.submitted = 0
+        self.batch_sizes = Counter()
+        self.wait_times = deque(maxlen=10000)
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    async def submit(self, **kwargs):
+        """
+        Queue one model call and wait for its response.
+        """
+        self.submitted += 1
+        queued_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending.clear()
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+            self._worker = None
+        if self.window <= 0:
+            async with self._semaphore:
+                self._waited(queued_at)
+                return await self._dispatch(**kwargs)
+
+        future = loop.create_future()
+        self._pending.append((queued_at, kwargs, future))
+        if self._worker is None or self._worker.done():
+            # The worker only lives while there is something queued
+            self._worker = loop.create_task(self._run())
+        elif len(self._pending) >= self.max_batch and self._batch_full is not None:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                # Wait out the window of the oldest queued request, or until the batch fills up
+                timeout = self.window - (time.perf_counter() - self._pending[0][0])
+                self._batch_full = asyncio.Event()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+                self._batch_full = None
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch))]
+            self.batch_sizes[len(batch)] += 1
+            for item in batch:
+                loop.create_task(self._dispatch_one(*item))
+
+    async def _dispatch_one(self, queued_at, kwargs, future):
+        if future.done():
+            # The caller gave up while queued
+            return
+        async with self._semaphore:
+            if future.done():
+                return
+            self._waited(queued_at)
+            call = asyncio.ensure_future(self._dispatch(**kwargs))
+            # Abandoning the request cancels the model call
+            future.add_done_callback(lambda f: call.cancel() if f.cancelled() else None)
+            try:
+                result = await call
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                return
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+    def _waited(self, queued_at):
+        wait = time.perf_counter() - queued_at
+        self.wait_times.append(wait)
+        BATCH_WAIT_SECONDS.observe(wait)
+
+    def stats(self):
+        waits = sorted(self.wait_times)
+
+        def percentile(p):
+            return waits[min(int(len(waits) * p), len(waits) - 1)] if waits else 0.0
+
+        return {
+            "submitted": self.submitted,
+            "queue_depth": self.queue_depth,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "wait_p50": percentile(0.5),
+            "wait_p99": percentile(0.99),
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from app.ai_engine.admission import Overloaded
+
+class Speculator:
+    """
+    Runs low-priority background work for requests that are likely to come next.
+
+    compute(*args) is started for a key only while the model is lightly
+    loaded (fewer than max_load of the admission slots busy, nobody
+    queued), at most one per scope (a newer speculation for the same
+    document cancels the older one). A real request for the same key can
+    join() the speculation in flight instead of starting its own call.
+
+    compute may return None when there turns out to be nothing to do (the
+    result is cached already); that counts as skipped. Completed
+    speculations are remembered so that later hits can be counted as
+    accepted; model time spent on speculations that were cancelled,
+    failed, or never used is counted as wasted. A completed one is unused
+    once a request or speculation for other code arrives in its scope, or
+    once it is forgotten (more than max_tracked completed).
+    """
+
+    def __init__(self, compute, admission, enabled=False, max_load=0.5, max_tracked=1000):
+        self.compute = compute
+        self.admission = admission
+        self.enabled = enabled
+        self.max_load = max_load
+        self.max_tracked = max_tracked
+        self._tasks = {}                # scope -> (key, task)
+        self._pending = {}              # key -> task
+        self._completed = OrderedDict() # key -> (seconds spent, scope), until used or forgotten
+        self._unused = {}               # scope -> key of its completed speculation
+        self.started = 0
+        self.skipped = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.accepted = 0
+        self.wasted_seconds = 0.0
+
+    def _idle(self):
+        admission = self.admission
+        return admission.queued() == 0 and admission.active < admission.max_concurrent * self.max_load
+
+    def schedule(self, scope, key, *args):
+        """
+        Start compute(*args) for key in the background if the model has room.
+        """
+        if not self.enabled:
+            return
+        previous = self._tasks.get(scope)
+        if previous is not None and previous[0] == key and not previous[1].done():
+            return
+        if key in self._pending or key in self._completed:
+            return
+        if not self._idle():
+            self.skipped += 1
+            return
+        self.cancel(scope)
+        self._discard(scope)
+
+        self.started += 1
+        task = asyncio.ensure_future(self._run(scope, key, args))
+        self._tasks[scope] = (key, task)
+        self._pending[key] = task
+        task.add_done_callback(lambda t: self._finished(scope, key, t))
+
+    async def _run(self, scope, key, args):
+        start = time.monotonic()
+        try:
+            result = await self.compute(*args)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            self.wasted_seconds += time.monotonic() - start
+            raise
+        except Overloaded:
+            # Lost the race for the last free slot
+            self.skipped += 1
+            raise
+        except Exception:
+            # Model errors and the like: the real request will try for itself
+            self.failed += 1
+            self.wasted_seconds += time.monotonic() - start
+            raise
+        if result is None:
+            self.skipped += 1
+            return None
+        self.completed += 1
+        self._discard(scope)
+        self._completed[key] = (time.monotonic() - start, scope)
+        if scope is not None:
+            self._unused[scope] = key
+        while len(self._completed) > self.max_tracked:
+            old_key, (seconds, old_scope) = self._completed.popitem(last=False)
+            self.wasted_seconds += seconds
+            if self._unused.get(old_scope) == old_key:
+                del self._unused[old_scope]
+        return result
+
+    def _discard(self, scope):
+        """Count the completed, unused speculation of scope as wasted."""
+        key = self._unused.pop(scope, None)
+        if key is not None:
+            seconds, _ = self._completed.pop(key, (0.0, None))
+            self.wasted_seconds += seconds
+
+    def _finished(self, scope, key, task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        current = self._tasks.get(scope)
+        if current is not None and current[1] is task:
+            del self._tasks[scope]
+        if not task.cancelled():
+            # Retrieve the exception so a failed speculation is not reported as unhandled
+            task.exception()
+
+    def cancel(self, scope):
+        """Cancel the speculation running for scope, if any."""
+        current = self._tasks.pop(scope, None)
+        if current is not None and not current[1].done():
+            current[1].cancel()
+
+    def supersede(self, scope, key):
+        """
+        A real request for key arrived in scope; the speculation running
+        there for any other key is no longer useful.
+        """
+        if scope is None:
+            return
+        current = self._tasks.get(scope)
+        if current is not None and current[0] != key:
+            self.cancel(scope)
+        if self._unused.get(scope, key) != key:
+            self._discard(scope)
+
+    def record_hit(self, key):
+        """Count a cache hit on key as an accepted speculation, if it was one."""
+        completed = self._completed.pop(key, None)
+        if completed is not None:
+            self.accepted += 1
+            if self._unused.get(completed[1]) == key:
+                del self._unused[completed[1]]
+
+    async def join(self, key):
+        """
+        Wait for the speculation in flight for key and return its result, or
+        None if there is none or it was cancelled or failed.
+        """
+        task = self._pending.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+        self.record_hit(key)
+        return result
+
+    def stats(self):
+        return {
+            "started": self.started,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "accepted": self.accepted,
+            "accept_rate": self.accepted / self.completed if self.completed else 0.0,
+            "wasted_seconds": self.wasted_seconds,
+        }
@@ -1,62 +1,320 @@
-from app.ai_engine.utils import get_ollama_client
-from cachetools import LRUCache
+from app.ai_engine.utils import get_ollama_client, get_async_ollama_client
+from app.ai_engine.cache import create_cache, fingerprint
+from app.ai_engine.coalescing import SingleFlight
+from app.ai_engine.prefix_index import PrefixIndex
+from app.ai_engine.scheduler import BatchScheduler
+from app.ai_engine.admission import model_admission, within_deadline
+from app.ai_engine.cancellation import SessionTracker
+from app.ai_engine.metrics import LOCAL_COMPLETIONS, STAGE_SECONDS, language_label
+from app.ai_engine.ngram import CONTEXT_CHARS, NgramIndex
+from app.ai_engine.context import build_context
+from app.ai_engine.documents import document_store
+from app.ai_engine.postprocess import SUGGESTION_PLACEHOLDERS, SuggestionStreamFilter, clean_suggestion
+from app.ai_engine.routing import model_router
+from app.ai_engine.speculation import Speculator
+from app.ai_engine.tracing import record_outcome
+from app import config
 
-# Initialize cache (max 1000 entries) to store previously requested suggestions
-suggestion_cache = LRUCache(maxsize=1000)
+# Cache of previously requested suggestions (backend and size limits come from app.config)
+suggestion_cache = create_cache("suggestion")
 
-# Get Ollama client
-ollama_client = get_ollama_client()
+# Local n-gram model of the project's code and accepted suggestions, for next
+# lines predictable enough to skip the model (off unless configured)
+suggestion_ngrams = NgramIndex(
+    min_count=config.NGRAM_MIN_COUNT,
+    min_confidence=config.NGRAM_MIN_CONFIDENCE,
+    max_contexts=config.NGRAM_MAX_CONTEXTS,
+    enabled=config.NGRAM_ENABLED
+)
+
+def _on_accepted(tag):
+    # The user typed a suggestion: credit its model and learn the line
+    model, language, before, suggestion = tag
+    model_router.record_accepted(model)
+    if suggestion_ngrams.enabled:
+        suggestion_ngrams.learn(language, f"\n{suggestion}\n", before)
+
+# Index over code prefixes so a suggestion keeps being served while the user types it
+# (which counts as the producing model's suggestion being accepted)
+suggestion_prefix_index = PrefixIndex(max_entries=1000, on_hit=_on_accepted)
+
+# Identical suggestions requested concurrently share one model call
+suggestion_inflight = SingleFlight()
+
+# Latest suggestion request per editor document; older ones get cancelled
+suggestion_sessions = SessionTracker()
+
+# Async client pool for the API server (scripts use the blocking get_ollama_client())
+async_ollama_client = get_async_ollama_client()
+
+# Groups suggestion model calls over a short window before dispatching them
+suggestion_scheduler = BatchScheduler(
+    lambda **kwargs: async_ollama_client.generate(**kwargs),
+    window_ms=config.BATCH_WINDOW_MS,
+    max_batch=config.BATCH_MAX_SIZE,
+    max_parallel=config.BATCH_MAX_PARALLEL
+)
+
+def _prompt_code(code, cursor_position, language, document_id=None):
+    """
+    The code before the cursor as the prompt has it: large buffers are cut
+    down to the code around the cursor. Trailing whitespace is kept, since
+    the suggestion depends on it even though the prompt strips it.
+    """
+    document = document_store.peek(document_id) if document_id is not None else None
+    if document is not None and document.text is code:
+        # Reuse the document's lines and imports instead of re-splitting the buffer
+        return document.context(cursor_position, config.PROMPT_TOKEN_BUDGET)
+    return build_context(_code_prefix(code, cursor_position), language, config.PROMPT_TOKEN_BUDGET)
+
+def _build_prompt(prompt_code, language):
+    """
+    Build the Ollama prompt from the code before the cursor (see _prompt_code).
+    """
+    return f"Given the following {language} code, provide the next line of code to continue the function (do not include markdown, code blocks, or explanations):\n{prompt_code.strip()}\n# Return the next line of code"
+
+def _code_prefix(code, cursor_position):
+    if cursor_position is None or cursor_position < 0:
+        cursor_position = len(code)
+    return code[:cursor_position]
+
+def _cache_key(prompt_code, context):
+    # The prompt only depends on the code it is given, which is bounded by the
+    # token budget, and the key keeps a fingerprint of it rather than a copy
+    return (fingerprint(prompt_code), tuple(sorted(context.items())))
+
+def _lookup_typed_prefix(code, cursor_position, cache_key):
+    """
+    Return the rest of an earlier suggestion the user is typing, or None.
+    Rests are not cached: the suggestion cache only holds whole next lines,
+    which speculation can follow.
+    """
+    return suggestion_prefix_index.lookup(cache_key[1], _code_prefix(code, cursor_position))
+
+def _store(code, cursor_position, cache_key, suggestion, language, model=None):
+    suggestion_cache[cache_key] = suggestion
+    # Placeholders are not worth following as the user types
+    if suggestion not in SUGGESTION_PLACEHOLDERS.values():
+        prefix = _code_prefix(code, cursor_position)
+        # What _on_accepted needs; only the end of the prefix is kept
+        tag = (model, language, prefix[-CONTEXT_CHARS:], suggestion)
+        suggestion_prefix_index.insert(cache_key[1], prefix, suggestion, tag=tag)
+        if model is not None:
+            model_router.record_served(model)
+
+def _complete_locally(code, cursor_position, language):
+    """
+    The n-gram index's suggestion for the next line, or None if it is off
+    or not confident enough.
+    """
+    if not suggestion_ngrams.enabled:
+        return None
+    labels = {"action": "suggestion", "language": language_label(language)}
+    with STAGE_SECONDS.time(stage="local_completion", **labels):
+        line = suggestion_ngrams.predict(language, _code_prefix(code, cursor_position))
+        suggestion = clean_suggestion(line, language) if line else None
+    if suggestion is None or suggestion in SUGGESTION_PLACEHOLDERS.values():
+        LOCAL_COMPLETIONS.inc(result="declined", language=labels["language"])
+        return None
+    LOCAL_COMPLETIONS.inc(result="served", language=labels["language"])
+    record_outcome("local")
+    return suggestion
 
 def suggest_code(code, cursor_position, context):
     """
     Generate inline code suggestions using Ollama with caching.
     """
     # Create a cache key based on input parameters
-    cache_key = (code, cursor_position, tuple(sorted(context.items())))
+    language = context.get("language", "python").lower()
+    prompt_code = _prompt_code(code, cursor_position, language)
+    cache_key = _cache_key(prompt_code, context)
 
     # Check if the result is already cached and return if available
-    if cache_key in suggestion_cache:
-        return suggestion_cache[cache_key]
+    cached = suggestion_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    language = context.get("language", "python").lower()
-    if cursor_position is None or cursor_position < 0:
-        cursor_position = len(code)
-    code_prefix = code[:cursor_position].strip()
-
-    # Prepare prompt for Ollama
-    prompt = f"Given the following {language} code, provide the next line of code to continue the function (do not include markdown, code blocks, or explanations):\n{code_prefix}\n# Return the next line of code"
-
-    # Call Ollama codellama model to generate suggestion
-    response = ollama_client.generate(model="codellama", prompt=prompt)
-    suggestion = response['response'].strip()
-
-    # Parse the response to extract the suggestion (remove markdown code blocks)
-    lines = suggestion.split("\n")
-    suggestion_lines = []
-    in_code_block = False
-    for line in lines:
-        if line.strip() == "```":
-            in_code_block = not in_code_block
-        elif in_code_block and line.strip():
-            suggestion_lines.append(line.strip())
-        elif not in_code_block and line.strip():
-            suggestion_lines.append(line.strip())
-    suggestion = suggestion_lines[0] if suggestion_lines else ""
-
-    # Add indentation for Python(4 spaces: Standard Python indentation) 
-    if language == "python" and suggestion:
-        suggestion = "    " + suggestion
-
-    # Fallback if suggestion is empty or invalid
-    if not suggestion or "#" in suggestion:
-        if language == "python":
-            suggestion = "    pass  # suggested"
-        elif language == "javascript":
-            suggestion = "return null;  // Suggested placeholder"
-        else:
-            suggestion = "// Suggestion for unsupported language"
+    # Reuse an earlier suggestion if the user is typing it
+    rest = _lookup_typed_prefix(code, cursor_position, cache_key)
+    if rest is not None:
+        return rest
+
+    local = _complete_locally(code, cursor_position, language)
+    if local is not None:
+        return local
+    prompt = _build_prompt(prompt_code, language)
+
+    # Call the Ollama model routed for suggestions
+    response = get_ollama_client().generate(model=model_router.preferred("suggestion", language), prompt=prompt)
+    suggestion = clean_suggestion(response['response'], language)
 
     # Cache the result
-    suggestion_cache[cache_key] = suggestion
+    _store(code, cursor_position, cache_key, suggestion, language)
+    return suggestion
+
+async def suggest_code_async(code, cursor_position, context, deadline=None, document_id=None, supersede=True):
+    """
+    Async variant of suggest_code; awaits the model call instead of blocking
+    the event loop, so one worker can keep many suggestions in flight.
+    deadline is an absolute time.monotonic() value after which the call is abandoned.
+    A newer request with the same document_id cancels this one (raises Superseded),
+    unless supersede is false (the cursors of one batch run side by side).
+    """
+    suggestion, outcome = await suggestion_sessions.run(
+        document_id if supersede else None,
+        _suggest_code_async(code, cursor_position, context, deadline, document_id)
+    )
+    # A rest completes the current line, which was speculated on when its suggestion was served
+    if outcome != "prefix":
+        _speculate_next(code, cursor_position, context, suggestion, document_id)
+    return suggestion
+
+def _accepted_state(code, cursor_position, suggestion):
+    """
+    The code and cursor position after the user accepts suggestion and moves
+    to the next line.
+    """
+    prefix = _code_prefix(code, cursor_position)
+    if prefix and not prefix.endswith("\n"):
+        suggestion = "\n" + suggestion
+    inserted = suggestion + "\n"
+    accepted = prefix + inserted + code[len(prefix):]
+    # Clients that omit the cursor mean the end of the buffer
+    return accepted, None if cursor_position is None else len(prefix) + len(inserted)
+
+def _speculate_next(code, cursor_position, context, suggestion, document_id):
+    if not suggestion_speculator.enabled or suggestion in SUGGESTION_PLACEHOLDERS.values():
+        return
+    next_code, next_cursor = _accepted_state(code, cursor_position, suggestion)
+    prompt_code = _prompt_code(next_code, next_cursor, context.get("language", "python").lower())
+    cache_key = _cache_key(prompt_code, context)
+    suggestion_speculator.schedule(document_id, cache_key, next_code, next_cursor, context, cache_key, prompt_code)
+
+async def _speculative_suggestion(code, cursor_position, context, cache_key, prompt_code):
+    """
+    Compute and cache a suggestion nobody has asked for yet, in the
+    speculation lane (which real requests preempt). Returns None if it is
+    cached already.
+    """
+    if await suggestion_cache.get_async(cache_key) is not None:
+        return None
+    language = context.get("language", "python").lower()
+    prompt = _build_prompt(prompt_code, language)
+    model, fallback = model_router.route("suggestion", language)
+    response = await model_admission.run(
+        "speculation",
+        lambda: model_router.call(model, suggestion_scheduler.submit(model=model, prompt=prompt))
+    )
+    suggestion = clean_suggestion(response['response'], language)
+    if not fallback:
+        _store(code, cursor_position, cache_key, suggestion, language, model)
     return suggestion
 
+# Background suggestions for the likely next keystrokes (off unless configured)
+suggestion_speculator = Speculator(
+    _speculative_suggestion,
+    model_admission,
+    enabled=config.SPECULATION_ENABLED,
+    max_load=config.SPECULATION_MAX_LOAD
+)
+
+async def _suggest_code_async(code, cursor_position, context, deadline, document_id):
+    """The suggestion, and how it was answered (as recorded by record_outcome)."""
+    language = context.get("language", "python").lower()
+    labels = {"action": "suggestion", "language": language_label(language)}
+
+    prompt_code = _prompt_code(code, cursor_position, language, document_id)
+    cache_key = _cache_key(prompt_code, context)
+    suggestion_speculator.supersede(document_id, cache_key)
+    with STAGE_SECONDS.time(stage="cache_lookup", **labels):
+        cached = await suggestion_cache.get_async(cache_key)
+        outcome = "cache"
+        if cached is None:
+            cached = _lookup_typed_prefix(code, cursor_position, cache_key)
+            outcome = "prefix"
+    if cached is not None:
+        record_outcome(outcome)
+        suggestion_speculator.record_hit(cache_key)
+        return cached, outcome
+
+    local = _complete_locally(code, cursor_position, language)
+    if local is not None:
+        return local, "local"
+
+    # The suggestion may already be being computed in the background
+    speculated = await within_deadline(suggestion_speculator.join(cache_key), deadline)
+    if speculated is not None:
+        record_outcome("speculation")
+        return speculated, "speculation"
+
+    async def call_model():
+        prompt = _build_prompt(prompt_code, language)
+        model, fallback = model_router.route("suggestion", language)
+        with STAGE_SECONDS.time(stage="model_call", **labels):
+            response = await suggestion_sessions.track_model_call(model_admission.run(
+                "suggestion",
+                lambda: model_router.call(model, suggestion_scheduler.submit(model=model, prompt=prompt)),
+                deadline
+            ))
+        with STAGE_SECONDS.time(stage="postprocess", **labels):
+            suggestion = clean_suggestion(response['response'], language)
+        # A fallback model's answer is not kept in place of the routed model's
+        if not fallback:
+            _store(code, cursor_position, cache_key, suggestion, language, model)
+        return suggestion
+
+    outcome = "coalesced" if cache_key in suggestion_inflight else "model"
+    record_outcome(outcome)
+    return await within_deadline(suggestion_inflight.do(cache_key, call_model), deadline), outcome
+
+async def suggest_code_stream(code, cursor_position, context, deadline=None, document_id=None):
+    """
+    Streaming variant of suggest_code_async.
+
+    Only the first usable line of the model output becomes the suggestion, so
+    it is yielded as soon as that line is complete and the model stream is
+    closed instead of waiting for the rest of the generation.
+    """
+    language = context.get("language", "python").lower()
+    prompt_code = _prompt_code(code, cursor_position, language, document_id)
+    cache_key = _cache_key(prompt_code, context)
+    cached = await suggestion_cache.get_async(cache_key)
+    if cached is not None:
+        record_outcome("cache")
+        yield cached
+        return
+    rest = _lookup_typed_prefix(code, cursor_position, cache_key)
+    if rest is not None:
+        record_outcome("prefix")
+        yield rest
+        return
+
+    local = _complete_locally(code, cursor_position, language)
+    if local is not None:
+        yield local
+        return
+    prompt = _build_prompt(prompt_code, language)
+    record_outcome("model")
+
+    model, fallback = model_router.route("suggestion", language)
+    await model_admission.acquire("suggestion", deadline)
+    stream_filter = SuggestionStreamFilter()
+    first_line = None
+    stream = None
+    try:
+        with model_router.track(model):
+            stream = await async_ollama_client.generate(model=model, prompt=prompt, stream=True)
+            async for part in stream:
+                first_line = stream_filter.feed(part['response'])
+                if first_line is not None:
+                    break
+    finally:
+        # Stop the model as soon as we have what we need
+        if hasattr(stream, "aclose"):
+            await stream.aclose()
+        model_admission.release()
+
+    suggestion = clean_suggestion(first_line if first_line is not None else stream_filter.finish(), language)
+    if not fallback:
+        _store(code, cursor_position, cache_key, suggestion, language, model)
+    yield suggestion
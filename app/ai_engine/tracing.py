@@ -0,0 +1,203 @@
+import contextvars
+import gzip
+import json
+import os
+import time
+from collections import OrderedDict
+
+from app import config
+
+# The trace record of the request being handled, so the engines can note
+# where its answer came from (a dict, so child tasks write to the same one)
+_current = contextvars.ContextVar("trace_record", default=None)
+
+
+def record_outcome(outcome):
+    """
+    Note how the current request was answered: "cache", "prefix", "local",
+    "speculation", "coalesced", "model" or "error". A no-op unless traced.
+    """
+    record = _current.get()
+    if record is not None:
+        record["o"] = outcome
+
+
+def _common_affixes(old, new):
+    """Lengths of the longest common prefix and (non-overlapping) suffix."""
+    # Binary search over slice comparisons, which run in C
+    limit = min(len(old), len(new))
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[:mid] == new[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    low, high = 0, limit - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return prefix, low
+
+
+class TraceRecorder:
+    """
+    Appends /api/ai-engine requests to a gzipped JSON-lines trace.
+
+    Each line holds the arrival time (seconds since the recorder started),
+    the request payload, the HTTP status, the latency in milliseconds and
+    how the request was answered. Consecutive requests for a document
+    mostly share their code, so code is stored as [prefix, suffix, middle]
+    against the previous code of the same document (or of the previous
+    request without one). That previous code is kept for at most
+    max_documents documents and max_bytes of code, least recently used
+    dropped first; the next request for a dropped document stores its
+    code in full. A header line starts every recording session;
+    read_trace() turns the file back into full payloads.
+
+    "{pid}" in the path is replaced with the process ID, so every worker
+    can write its own file.
+    """
+
+    def __init__(self, path=None, flush_every=64, max_documents=config.DOCUMENT_MAX_SESSIONS,
+                 max_bytes=config.DOCUMENT_MAX_BYTES):
+        self.path = path.format(pid=os.getpid()) if path else None
+        self.flush_every = flush_every
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self._file = None
+        self._start = None
+        self._last_code = OrderedDict()  # document_id -> code, least recently used first
+        self._last_code_bytes = 0
+        self._unflushed = 0
+        self.recorded = 0
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._start = time.time()
+        self._write({"trace": 1, "start": self._start})
+
+    def _write(self, line):
+        self._file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def start(self, payload):
+        """
+        Begin the record for a request (payload as received) and make it the
+        current one; pass it to finish() once the request is answered.
+        """
+        if self._file is None:
+            self._open()
+        record = {"_t0": time.perf_counter(), "_arrival": time.time(), "p": payload, "o": None}
+        _current.set(record)
+        return record
+
+    def bind(self, record):
+        """Make record the current one again (e.g. inside a streamed response)."""
+        _current.set(record)
+
+    def finish(self, record, status):
+        payload = dict(record["p"])
+        line = {
+            "t": round(record["_arrival"] - self._start, 4),
+            "s": status,
+            "l": round((time.perf_counter() - record["_t0"]) * 1000, 2),
+            "o": record["o"],
+        }
+        code = payload.pop("code", None)
+        if code is not None:
+            document_id = payload.get("document_id")
+            previous = self._remember(document_id, code)
+            if previous is not None:
+                prefix, suffix = _common_affixes(previous, code)
+                code = [prefix, suffix, code[prefix:len(code) - suffix]]
+            line["c"] = code
+        line["p"] = payload
+        self._write(line)
+        self.recorded += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def _remember(self, document_id, code):
+        """Keep code as document_id's latest and return the one it replaces, if still kept."""
+        previous = self._last_code.pop(document_id, None)
+        if previous is not None:
+            self._last_code_bytes -= len(previous)
+        self._last_code[document_id] = code
+        self._last_code_bytes += len(code)
+        while len(self._last_code) > self.max_documents or self._last_code_bytes > self.max_bytes:
+            _, dropped = self._last_code.popitem(last=False)
+            self._last_code_bytes -= len(dropped)
+        return previous
+
+    def flush(self):
+        if self._file is not None:
+            # A sync flush leaves a file that can be read up to here even if the process dies
+            self._file.flush()
+            self._unflushed = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path):
+    """
+    Yield the records of a trace file as dicts with "time" (seconds since
+    the first session started), "payload" (with the full code), "status",
+    "latency_ms" and "outcome". Records come in the order requests
+    finished; sort by time for arrival order. A truncated last block is
+    ignored.
+    """
+    first_start = None
+    base = 0.0
+    last_code = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if "trace" in entry:
+                    if first_start is None:
+                        first_start = entry["start"]
+                    base = entry["start"] - first_start
+                    last_code = {}
+                    continue
+                payload = dict(entry["p"])
+                code = entry.get("c")
+                if code is not None:
+                    document_id = payload.get("document_id")
+                    if isinstance(code, list):
+                        previous = last_code[document_id]
+                        prefix, suffix, middle = code
+                        code = previous[:prefix] + middle + previous[len(previous) - suffix:]
+                    last_code[document_id] = code
+                    payload["code"] = code
+                yield {
+                    "time": base + entry["t"],
+                    "payload": payload,
+                    "status": entry["s"],
+                    "latency_ms": entry["l"],
+                    "outcome": entry["o"],
+                }
+        except EOFError:
+            # The writer was killed mid-block
+            return
+
+
+# Records traffic when AI_ENGINE_TRACE_PATH is set
+trace_recorder = TraceRecorder(config.TRACE_PATH or None)
@@ -1,8 +1,89 @@
-import ollama
+import asyncio
+import logging
+import random
+
+from app import config
+
+def log_sampled(logger, msg, *args):
+    """
+    Debug-log a hot-path message for a sample of requests only.
+
+    Arguments are formatted lazily by logging, so nothing is built when DEBUG
+    is off or the request is not sampled.
+    """
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < config.DEBUG_LOG_SAMPLE_RATE:
+        logger.debug(msg, *args)
+
+_sync_client = None
 
 def get_ollama_client():
     """
-    Return the pre-loaded Ollama client for interacting with the local ollama server.
+    Return the blocking Ollama client for the first configured host,
+    created on first use (the ollama package is slow to import and nothing
+    in the API server needs it).
     """
-    return ollama
+    global _sync_client
+    if _sync_client is None:
+        import ollama
+        _sync_client = ollama.Client(host=config.OLLAMA_HOSTS[0], timeout=config.OLLAMA_TIMEOUT)
+    return _sync_client
+
 
+class AsyncOllamaClient:
+    """
+    Asyncio wrapper around ollama.AsyncClient.
+
+    The underlying httpx connection pool is bound to the event loop that
+    created it, so one client is kept per running loop. limits holds
+    httpx.Limits arguments; ollama and httpx are only imported once the
+    first client is made.
+    """
+
+    def __init__(self, host=None, limits=None, **kwargs):
+        self.host = host
+        self.limits = limits
+        self.kwargs = kwargs
+        self._clients = {}
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # Drop clients whose loop has gone away (e.g. between test clients)
+            self._clients = {l: c for l, c in self._clients.items() if not l.is_closed()}
+            import httpx
+            import ollama
+            if self.limits is not None:
+                self.kwargs["limits"] = httpx.Limits(**self.limits)
+                self.limits = None
+            client = ollama.AsyncClient(host=self.host, **self.kwargs)
+            self._clients[loop] = client
+        return client
+
+    async def generate(self, **kwargs):
+        return await self._client().generate(**kwargs)
+
+    def __getattr__(self, name):
+        # Other API calls (list, ps, ...) go straight to the loop's client
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._client(), name)
+
+
+_async_pool = None
+
+def get_async_ollama_client():
+    """
+    Return the async client pool over the configured Ollama hosts, so model
+    calls never block the event loop. Both engines share one pool; under
+    app.server it lives in the coordinator process.
+    """
+    global _async_pool
+    if _async_pool is None:
+        if config.COORDINATOR_SOCKET:
+            from app.ai_engine.coordinator import CoordinatorClient
+            _async_pool = CoordinatorClient(config.COORDINATOR_SOCKET)
+        else:
+            from app.ai_engine.pool import OllamaPool
+            _async_pool = OllamaPool.from_config()
+    return _async_pool
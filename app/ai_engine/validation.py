@@ -0,0 +1,157 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# In-process syntax checks for generated code: no temp files and no
+# flake8/eslint subprocesses. Each check returns None for code that parses,
+# otherwise a short "line N: reason".
+
+
+def check_python(code: str):
+    """
+    Syntax error in Python source, or None. Uses the real compiler, so
+    errors it only finds after parsing (return outside a function, ...)
+    count too.
+    """
+    try:
+        compile(code, "<generated>", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return f"line {e.lineno}: {e.msg}"
+    except ValueError as e:
+        # Source containing null bytes
+        return str(e)
+    return None
+
+
+_JS_SKIP = re.compile(r"\s+|//[^\n]*|/\*.*?\*/", re.S)
+_JS_STRINGS = {
+    "'": re.compile(r"'(?:[^'\\\n]|\\.)*'", re.S),
+    '"': re.compile(r'"(?:[^"\\\n]|\\.)*"', re.S),
+}
+_JS_TEMPLATE = re.compile(r"(?:[^`\\$]|\\.|\$(?!\{))*", re.S)
+_JS_REGEX = re.compile(r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*")
+_JS_WORD = re.compile(r"[\w$#]+")
+_JS_CLOSERS = {"(": ")", "[": "]", "{": "}"}
+# After these a "/" starts a regular expression rather than a division
+_JS_KEYWORDS_BEFORE_EXPRESSION = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await",
+}
+
+
+def _js_error(code, position, reason):
+    return f"line {code.count(chr(10), 0, position) + 1}: {reason}"
+
+
+def check_javascript(code: str):
+    """
+    Lexical check of JavaScript: unterminated strings, comments, template
+    and regular expression literals, and unbalanced or mismatched brackets.
+    Not a full parser, but it catches what truncated or garbled model output
+    looks like, in one pass over the source.
+    """
+    stack = []  # (expected closer, position); "${" is a template substitution
+    regex_allowed = True
+    position, end = 0, len(code)
+    while position < end:
+        match = _JS_SKIP.match(code, position)
+        if match:
+            position = match.end()
+            continue
+        char = code[position]
+        if code.startswith("/*", position):
+            return _js_error(code, position, "unterminated comment")
+
+        if char in _JS_STRINGS:
+            match = _JS_STRINGS[char].match(code, position)
+            if match is None:
+                return _js_error(code, position, "unterminated string")
+            position = match.end()
+            regex_allowed = False
+        elif char == "`" or (char == "}" and stack and stack[-1][0] == "${"):
+            # The start of a template literal, or its text after a ${...}
+            start = stack.pop()[1] if char == "}" else position
+            position = _JS_TEMPLATE.match(code, position + 1).end()
+            if code.startswith("${", position):
+                stack.append(("${", start))
+                position += 2
+                regex_allowed = True
+            elif position < end:
+                position += 1
+                regex_allowed = False
+            else:
+                return _js_error(code, start, "unterminated template literal")
+        elif char in _JS_CLOSERS:
+            stack.append((_JS_CLOSERS[char], position))
+            position += 1
+            regex_allowed = True
+        elif char in ")]}":
+            if not stack or stack[-1][0] != char:
+                return _js_error(code, position, f"unexpected '{char}'")
+            stack.pop()
+            position += 1
+            # A block can be followed by a statement starting with a regex
+            regex_allowed = char == "}"
+        elif char == "/" and regex_allowed:
+            match = _JS_REGEX.match(code, position)
+            if match is None:
+                return _js_error(code, position, "unterminated regular expression")
+            position = match.end()
+            regex_allowed = False
+        else:
+            match = _JS_WORD.match(code, position)
+            if match:
+                regex_allowed = match.group() in _JS_KEYWORDS_BEFORE_EXPRESSION
+                position = match.end()
+            elif code.startswith(("++", "--"), position):
+                # Whatever it follows decides (a++ / 2 divides)
+                position += 2
+            else:
+                # Any other punctuator
+                regex_allowed = True
+                position += 1
+
+    if stack:
+        closer, position = stack[-1]
+        if closer == "${":
+            return _js_error(code, position, "unterminated template literal")
+        return _js_error(code, position, f"'{code[position]}' is never closed")
+    return None
+
+
+_CHECKERS = {
+    "python": check_python,
+    "javascript": check_javascript,
+}
+
+
+def check_syntax(code: str, language: str):
+    """
+    Syntax error in code, or None; languages without a checker always pass.
+    """
+    checker = _CHECKERS.get((language or "python").lower())
+    return checker(code) if checker is not None else None
+
+
+def check_function(signature: str, body: str, language: str):
+    """
+    check_syntax for a generated function exactly as it is returned:
+    signature, a newline and body (as returned by clean_generation).
+    """
+    return check_syntax(f"{signature}\n{body}", language)
+
+
+def _check_item(item):
+    return check_function(*item)
+
+
+def validate_many(items, max_workers=None, chunksize=64):
+    """
+    check_function for each (signature, body, language) in items, in order.
+    Large inputs are spread over a process pool (max_workers processes,
+    default one per core); small ones are not worth starting it for.
+    """
+    items = list(items)
+    if max_workers == 1 or len(items) < 2 * chunksize:
+        return [_check_item(item) for item in items]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_check_item, items, chunksize=chunksize))
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# One token of an obviously code-like prompt: how long a user waits for the
+# first token once the model is loaded
+_PROBE = {"prompt": "def", "options": {"num_predict": 1}}
+
+
+class Readiness:
+    """
+    Whether this process should be sent traffic, behind /health/ready.
+
+    It becomes ready once every model has been loaded on the backends and
+    answers a one-token probe within max_first_token seconds (any answer
+    when 0), and stops being ready when the server shuts down.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.models = {}  # model -> load/probe seconds or the last error
+
+    def status(self):
+        return {"ready": self.ready, "models": dict(self.models)}
+
+
+async def warm_model(client, model, keep_alive):
+    """
+    Load model on every backend of client (an empty prompt only loads it) and
+    time a one-token probe. Returns the seconds both took.
+    """
+    start = time.perf_counter()
+    await client.generate_on_all(model=model, prompt="", keep_alive=keep_alive)
+    loaded = time.perf_counter()
+    await client.generate_on_all(model=model, keep_alive=keep_alive, **_PROBE)
+    return {"load_seconds": loaded - start, "first_token_seconds": time.perf_counter() - loaded}
+
+
+async def warm_up(client, models, readiness, keep_alive=config.MODEL_KEEP_ALIVE,
+                  max_first_token=config.READY_FIRST_TOKEN_MS / 1000, retry_interval=1.0):
+    """
+    Warm each model until its probe is fast enough, retrying failed or slow
+    ones with backoff (Ollama may still be starting), then mark readiness.
+    """
+    pending = list(models)
+    delay = retry_interval
+    while True:
+        for model in list(pending):
+            try:
+                state = await warm_model(client, model, keep_alive)
+            except Exception as e:
+                logger.warning(f"Warming up model {model} failed: {e}")
+                readiness.models[model] = {"error": str(e)}
+                continue
+            readiness.models[model] = state
+            logger.info(f"Model {model} loaded in {state['load_seconds']:.2f}s, "
+                        f"first token in {state['first_token_seconds'] * 1000:.0f}ms")
+            if not max_first_token or state["first_token_seconds"] <= max_first_token:
+                pending.remove(model)
+        if not pending:
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
+    readiness.ready = True
+
+
+# The process-wide readiness state
+readiness = Readiness()
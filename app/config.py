@@ -0,0 +1,106 @@
+import os
+
+# Runtime settings, read once from the environment.
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+def _float(name, default):
+    return float(os.environ.get(name, default))
+
+# Cache backend: "memory" (per process) or "sqlite" (on disk, shared by workers)
+CACHE_BACKEND = os.environ.get("AI_ENGINE_CACHE_BACKEND", "memory")
+CACHE_PATH = os.environ.get("AI_ENGINE_CACHE_PATH", ".cache/ai_engine.sqlite3")
+# Upper bound on keys + values per cache, in bytes
+CACHE_MAX_BYTES = _int("AI_ENGINE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+# In-process caches keep values at least this long zlib-compressed (0 = never)
+CACHE_COMPRESS_MIN_BYTES = _int("AI_ENGINE_CACHE_COMPRESS_MIN_BYTES", 512)
+# Seconds before an entry expires; 0 keeps entries until evicted
+CACHE_TTL = _float("AI_ENGINE_CACHE_TTL", 0)
+# Entries loaded into the in-process hot tier at startup
+CACHE_WARM_ENTRIES = _int("AI_ENGINE_CACHE_WARM_ENTRIES", 1000)
+# Memory caches are loaded from this file at startup and saved to it at shutdown (unset = off)
+CACHE_SNAPSHOT = os.environ.get("AI_ENGINE_CACHE_SNAPSHOT", "")
+# Ollama model for requests without a route, and routes as comma separated
+# "action[:language]=model" pairs (e.g. "suggestion=codellama:7b-code,generate=codellama:13b")
+MODEL = os.environ.get("AI_ENGINE_MODEL", "codellama")
+MODEL_ROUTES = os.environ.get("AI_ENGINE_MODEL_ROUTES", "")
+# Send requests to the fallback model (default: the suggestion model) while their
+# routed model's estimated queue wait is over this many ms (0 disables)
+FALLBACK_MODEL = os.environ.get("AI_ENGINE_FALLBACK_MODEL", "")
+FALLBACK_QUEUE_MS = _float("AI_ENGINE_FALLBACK_QUEUE_MS", 0)
+# Requests each Ollama host runs at once per model (its OLLAMA_NUM_PARALLEL)
+MODEL_PARALLEL = _int("AI_ENGINE_MODEL_PARALLEL", 1)
+# Load every routed model at startup (0 = off) and ask Ollama to keep it in memory
+# this long (Ollama duration, "-1m" for ever); until loaded, /health/ready answers 503
+PRELOAD_MODELS = _int("AI_ENGINE_PRELOAD", 1) > 0
+MODEL_KEEP_ALIVE = os.environ.get("AI_ENGINE_MODEL_KEEP_ALIVE", "30m")
+# Also wait until a one-token probe of each model answers within this many ms (0 = any answer)
+READY_FIRST_TOKEN_MS = _float("AI_ENGINE_READY_FIRST_TOKEN_MS", 0)
+# Cached results from a different model version are never served
+MODEL_VERSION = os.environ.get("AI_ENGINE_MODEL_VERSION", "codellama")
+# Serve a cached generation for code this similar (Jaccard over token shingles); 0 disables
+NEAR_DUPLICATE_THRESHOLD = _float("AI_ENGINE_NEAR_DUPLICATE_THRESHOLD", 0)
+
+# Suggestion batching: collect requests for this long (0 disables batching). Ollama has
+# no multi-prompt endpoint, so a window only delays calls; it is off unless a backend gains from it
+BATCH_WINDOW_MS = _float("AI_ENGINE_BATCH_WINDOW_MS", 0)
+BATCH_MAX_SIZE = _int("AI_ENGINE_BATCH_MAX_SIZE", 16)
+# Most suggestion model calls outstanding at once
+BATCH_MAX_PARALLEL = _int("AI_ENGINE_BATCH_MAX_PARALLEL", 64)
+
+# Admission control: model calls running at once, and queued requests per lane
+MAX_CONCURRENT_MODEL_CALLS = _int("AI_ENGINE_MAX_CONCURRENT_MODEL_CALLS", 32)
+MAX_QUEUED_SUGGESTIONS = _int("AI_ENGINE_MAX_QUEUED_SUGGESTIONS", 64)
+MAX_QUEUED_GENERATIONS = _int("AI_ENGINE_MAX_QUEUED_GENERATIONS", 32)
+# Speculatively compute the suggestion that follows an accepted one (0 = off), only
+# while fewer than this share of the model slots are busy
+SPECULATION_ENABLED = _int("AI_ENGINE_SPECULATION", 0) > 0
+SPECULATION_MAX_LOAD = _float("AI_ENGINE_SPECULATION_MAX_LOAD", 0.5)
+# Answer predictable next lines from a local n-gram index (0 = off) learned from the
+# files matching these comma separated globs and from accepted suggestions, when
+# its confidence (0-1) is at least NGRAM_MIN_CONFIDENCE over contexts seen NGRAM_MIN_COUNT times
+NGRAM_ENABLED = _int("AI_ENGINE_NGRAM", 0) > 0
+NGRAM_CORPUS = os.environ.get("AI_ENGINE_NGRAM_CORPUS", "")
+NGRAM_MIN_CONFIDENCE = _float("AI_ENGINE_NGRAM_MIN_CONFIDENCE", 0.9)
+NGRAM_MIN_COUNT = _int("AI_ENGINE_NGRAM_MIN_COUNT", 3)
+NGRAM_MAX_CONTEXTS = _int("AI_ENGINE_NGRAM_MAX_CONTEXTS", 500_000)
+# Most requests accepted in one /api/ai-engine/batch call
+MAX_BATCH_ITEMS = _int("AI_ENGINE_MAX_BATCH_ITEMS", 64)
+
+# Approximate tokens of code sent in a prompt; larger buffers are trimmed around the cursor (0 = no limit)
+PROMPT_TOKEN_BUDGET = _int("AI_ENGINE_PROMPT_TOKEN_BUDGET", 1024)
+
+# Editor buffers kept for delta updates: most documents, and their total size in bytes
+DOCUMENT_MAX_SESSIONS = _int("AI_ENGINE_DOCUMENT_MAX_SESSIONS", 1000)
+DOCUMENT_MAX_BYTES = _int("AI_ENGINE_DOCUMENT_MAX_BYTES", 64 * 1024 * 1024)
+
+# Record /api/ai-engine traffic to this file for benchmarks/replay.py ("{pid}" is
+# replaced with the process ID); unset disables tracing
+TRACE_PATH = os.environ.get("AI_ENGINE_TRACE_PATH", "")
+
+# Multi-process serving (python -m app.server): worker processes, and the
+# coordinator socket the server sets for its workers (leave unset otherwise)
+WORKERS = _int("AI_ENGINE_WORKERS", os.cpu_count() or 1)
+COORDINATOR_SOCKET = os.environ.get("AI_ENGINE_COORDINATOR_SOCKET", "")
+
+# Ollama hosts to balance across (comma separated), and per-host client settings
+OLLAMA_HOSTS = [
+    host.strip()
+    for host in os.environ.get("AI_ENGINE_OLLAMA_HOSTS", os.environ.get("OLLAMA_HOST", "http://localhost:11434")).split(",")
+    if host.strip()
+]
+OLLAMA_TIMEOUT = _float("AI_ENGINE_OLLAMA_TIMEOUT", 120)
+BACKEND_MAX_CONCURRENT = _int("AI_ENGINE_BACKEND_MAX_CONCURRENT", 16)
+BACKEND_KEEPALIVE_CONNECTIONS = _int("AI_ENGINE_BACKEND_KEEPALIVE_CONNECTIONS", 16)
+# Retries on another host after a connection or 5xx error
+BACKEND_RETRIES = _int("AI_ENGINE_BACKEND_RETRIES", 1)
+# Consecutive failures before a host is ejected, and for how long
+BACKEND_EJECT_AFTER = _int("AI_ENGINE_BACKEND_EJECT_AFTER", 3)
+BACKEND_EJECT_SECONDS = _float("AI_ENGINE_BACKEND_EJECT_SECONDS", 30)
+HEALTH_CHECK_INTERVAL = _float("AI_ENGINE_HEALTH_CHECK_INTERVAL", 10)
+
+# Level of the app's own loggers (the server configures its own)
+LOG_LEVEL = os.environ.get("AI_ENGINE_LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose bodies are debug-logged (when DEBUG logging is on)
+DEBUG_LOG_SAMPLE_RATE = _float("AI_ENGINE_DEBUG_LOG_SAMPLE_RATE", 0.01)
@@ -1,25 +1,203 @@
-from fastapi import FastAPI, HTTPException
-from app.models.schemas import AIRequest, AIResponse
-from app.ai_engine.suggestions import suggest_code
-from app.ai_engine.generation import generate_function
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from app.models.schemas import ActionType, AIBatchRequest, AIBatchResponse, AIRequest, AIResponse, TextDelta
+from app.ai_engine.suggestions import (
+    suggest_code_async, suggest_code_stream, suggestion_cache, suggestion_inflight, suggestion_ngrams,
+    suggestion_prefix_index, suggestion_scheduler, suggestion_sessions, suggestion_speculator
+)
+from app.ai_engine.generation import (
+    generate_function_async, generate_function_stream, generate_validated_async, generation_cache, generation_inflight
+)
+from app.ai_engine.cache import load_snapshot, save_snapshot
+from app.ai_engine.admission import Overloaded, DeadlineExceeded, deadline_from_ms, model_admission
+from app.ai_engine.cancellation import Superseded
+from app.ai_engine.documents import DocumentVersionMismatch, document_store
+from app.ai_engine.utils import get_async_ollama_client, log_sampled
+from app.ai_engine.routing import model_router
+from app.ai_engine.tracing import record_outcome, trace_recorder
+from app.ai_engine.validation import check_syntax
+from app.ai_engine.warmup import readiness, warm_up
+from app.ai_engine.metrics import STAGE_SECONDS, language_label, register_collector, render
+from app import config
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import logging
+import math
+import time
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+def _configure_logging():
+    # Only the app's own loggers; the server sets up its own and the root logger is left alone
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(config.LOG_LEVEL)
+    if not logging.getLogger().handlers and not app_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        app_logger.addHandler(handler)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _configure_logging()
+    caches = {"suggestion": suggestion_cache, "generation": generation_cache}
+    if config.CACHE_SNAPSHOT:
+        loaded = load_snapshot(config.CACHE_SNAPSHOT, caches)
+        logger.info(f"Loaded {loaded} cache entries from {config.CACHE_SNAPSHOT}")
+    # Load the most recently used entries of the shared cache before serving
+    for cache in caches.values():
+        warmed = cache.warm()
+        logger.info(f"Warmed {warmed} cache entries")
+
+    if suggestion_ngrams.enabled and config.NGRAM_CORPUS:
+        start = time.perf_counter()
+        files = suggestion_ngrams.index_files([p.strip() for p in config.NGRAM_CORPUS.split(",") if p.strip()])
+        logger.info(f"Indexed {files} files for local completions in {time.perf_counter() - start:.2f}s")
+
+    # Keep probing the Ollama backends so dead ones are ejected before requests hit them
+    health_checks = asyncio.create_task(get_async_ollama_client().run_health_checks(config.HEALTH_CHECK_INTERVAL))
+    # Requests are served meanwhile, but /health/ready holds traffic back until the models are loaded
+    warming = None
+    if config.PRELOAD_MODELS:
+        warming = asyncio.create_task(warm_up(get_async_ollama_client(), model_router.models(), readiness))
+    else:
+        readiness.ready = True
+    yield
+    readiness.ready = False
+    if warming is not None:
+        warming.cancel()
+    health_checks.cancel()
+    if config.CACHE_SNAPSHOT:
+        saved = save_snapshot(config.CACHE_SNAPSHOT, caches)
+        logger.info(f"Saved {saved} cache entries to {config.CACHE_SNAPSHOT}")
+    trace_recorder.close()
+
 app = FastAPI(
     title="AI Assistant",
     description="A FastAPI server for an AI-powered engine using Ollama's CodeLLaMA model",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-@app.post("/api/ai-engine", response_model=AIResponse)
-async def ai_engine(request: AIRequest):
-    logger.debug(f"Received request: {request}")
+@register_collector
+def _engine_metrics():
+    """
+    Export the counters the engine components keep for themselves.
+    """
+    for name, cache in (("suggestion", suggestion_cache), ("generation", generation_cache)):
+        stats = cache.stats()
+        labels = {"cache": name}
+        yield "ai_engine_cache_hits_total", "counter", "Cache lookups that returned an entry.", labels, stats["hits"]
+        yield "ai_engine_cache_misses_total", "counter", "Cache lookups that found nothing.", labels, stats["misses"]
+        yield "ai_engine_cache_evictions_total", "counter", "Entries evicted to stay within the size bound.", labels, stats["evictions"]
+        yield "ai_engine_cache_entries", "gauge", "Entries currently cached.", labels, stats["entries"]
+        yield "ai_engine_cache_bytes", "gauge", "Approximate size of the cached entries.", labels, stats["bytes"]
+
+    stats = suggestion_prefix_index.stats()
+    yield "ai_engine_prefix_lookups_total", "counter", "Typed-prefix index lookups.", {}, stats["lookups"]
+    yield "ai_engine_prefix_hits_total", "counter", "Typed-prefix index lookups answered without the model.", {}, stats["hits"]
+
+    stats = suggestion_ngrams.stats()
+    yield "ai_engine_ngram_contexts", "gauge", "Token contexts counted by the local completion index.", {}, stats["contexts"]
+    yield "ai_engine_ngram_learned_tokens_total", "counter", "Tokens the local completion index has learned from.", {}, stats["learned_tokens"]
+
+    for name, inflight in (("suggestion", suggestion_inflight), ("generation", generation_inflight)):
+        stats = inflight.stats()
+        labels = {"engine": name}
+        yield "ai_engine_model_calls_started_total", "counter", "Model calls started after coalescing.", labels, stats["calls"]
+        yield "ai_engine_coalesced_total", "counter", "Requests that joined an identical in-flight call.", labels, stats["coalesced"]
+        yield "ai_engine_abandoned_total", "counter", "Shared calls cancelled because every caller left.", labels, stats["abandoned"]
+
+    stats = suggestion_scheduler.stats()
+    yield "ai_engine_batch_queue_depth", "gauge", "Suggestions waiting for the next batch.", {}, stats["queue_depth"]
+    for size, count in stats["batch_sizes"].items():
+        yield "ai_engine_batches_total", "counter", "Dispatched suggestion batches by size.", {"size": size}, count
+
+    stats = model_admission.stats()
+    yield "ai_engine_admission_active", "gauge", "Model calls currently holding a slot.", {}, stats["active"]
+    for lane, queued in stats["queued"].items():
+        yield "ai_engine_admission_queued", "gauge", "Requests waiting for a model slot.", {"lane": lane}, queued
+    for outcome in ("admitted", "rejected", "expired", "preempted"):
+        yield "ai_engine_admission_total", "counter", "Admission decisions by outcome.", {"outcome": outcome}, stats[outcome]
+
+    stats = document_store.stats()
+    yield "ai_engine_documents", "gauge", "Editor documents kept for delta updates.", {}, stats["documents"]
+    yield "ai_engine_document_bytes", "gauge", "Total size of the kept documents.", {}, stats["bytes"]
+    yield "ai_engine_document_deltas_total", "counter", "Text deltas applied to kept documents.", {}, stats["deltas"]
+    yield "ai_engine_document_evictions_total", "counter", "Idle documents evicted to stay within the limits.", {}, stats["evictions"]
+
+    stats = suggestion_sessions.stats()
+    yield "ai_engine_superseded_total", "counter", "Suggestions cancelled by a newer request for the same document.", {}, stats["superseded"]
+    yield "ai_engine_saved_model_seconds_total", "counter", "Estimated model time saved by cancelling superseded calls.", {}, stats["saved_model_seconds"]
+
+    stats = suggestion_speculator.stats()
+    for outcome in ("started", "skipped", "completed", "cancelled", "failed", "accepted"):
+        yield "ai_engine_speculation_total", "counter", "Background suggestions by outcome.", {"outcome": outcome}, stats[outcome]
+    yield "ai_engine_speculation_accept_rate", "gauge", "Share of completed background suggestions that were later served.", {}, stats["accept_rate"]
+    yield "ai_engine_speculation_wasted_model_seconds_total", "counter", "Model time spent on background suggestions that were never served.", {}, stats["wasted_seconds"]
+
+    for stats in model_router.stats():
+        labels = {"model": stats["model"]}
+        yield "ai_engine_model_outstanding", "gauge", "Model calls in flight, per model.", labels, stats["outstanding"]
+        yield "ai_engine_model_queue_wait_seconds", "gauge", "Estimated wait for a new call to the model.", labels, stats["queue_wait_seconds"]
+        yield "ai_engine_model_fallbacks_total", "counter", "Requests sent to the fallback model while this one was overloaded.", labels, stats["fallbacks"]
+        yield "ai_engine_model_suggestions_served_total", "counter", "Suggestions produced by the model.", labels, stats["served"]
+        yield "ai_engine_model_suggestions_accepted_total", "counter", "Suggestions from the model that the user went on to type.", labels, stats["accepted"]
+        yield "ai_engine_model_suggestion_accept_rate", "gauge", "Share of the model's suggestions that were accepted.", labels, stats["accept_rate"]
+
+    status = readiness.status()
+    yield "ai_engine_ready", "gauge", "Whether /health/ready reports the process ready for traffic.", {}, int(status["ready"])
+    for model, state in status["models"].items():
+        if "first_token_seconds" in state:
+            labels = {"model": model}
+            yield "ai_engine_model_load_seconds", "gauge", "Time the startup load of the model took.", labels, state["load_seconds"]
+            yield "ai_engine_model_first_token_seconds", "gauge", "First-token latency of the model's last startup probe.", labels, state["first_token_seconds"]
+
+    for backend in get_async_ollama_client().stats():
+        labels = {"host": backend["host"]}
+        yield "ai_engine_backend_healthy", "gauge", "Whether the Ollama backend is in rotation.", labels, int(backend["healthy"])
+        yield "ai_engine_backend_outstanding", "gauge", "Requests in flight to the Ollama backend.", labels, backend["outstanding"]
+        yield "ai_engine_backend_requests_total", "counter", "Requests sent to the Ollama backend.", labels, backend["requests"]
+        yield "ai_engine_backend_failures_total", "counter", "Failed requests to the Ollama backend.", labels, backend["failures"]
+
+def _stage_labels(request: AIRequest):
+    language = request.context.get("language") if isinstance(request.context, dict) else None
+    action = request.action.value if request.action else ActionType.SUGGESTION.value
+    return {"action": action, "language": language_label(language)}
+
+def _resolve_document(request: AIRequest):
+    """
+    Keep the server's copy of request.document_id in sync: full code opens
+    (or resets) it, deltas are applied to it and fill in request.code.
+    Returns the document version, or None for requests without a document.
+    """
+    if request.document_id is None:
+        if request.deltas:
+            raise HTTPException(status_code=400, detail="Deltas require a document_id.")
+        return None
+    if request.code is None and request.deltas is None:
+        return None
 
+    language = request.context.get("language", "python").lower() if isinstance(request.context, dict) else "python"
+    try:
+        if request.code is not None:
+            document = document_store.open(request.document_id, request.code, language)
+        else:
+            document = document_store.apply(request.document_id, request.deltas, request.document_version)
+            document.set_language(language)
+    except DocumentVersionMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    request.code = document.text
+    return document.version
+
+def _validate_request(request: AIRequest):
+    """
+    Raise an HTTPException if the request payload is not usable.
+    """
     # Check if the code field is not empty
-    if not request.code.strip():
+    if not request.code or not request.code.strip():
         raise HTTPException(status_code=400, detail="Code parameter cannot be empty.")
     # Check if the cursor position is valid
     if request.cursor_position is not None and (request.cursor_position < 0 or request.cursor_position > len(request.code)):
@@ -37,28 +215,144 @@ async def ai_engine(request: AIRequest):
                 detail=f"Unsupported language: {language}. Supported languages are: {', '.join(supported_languages)}."
             )
 
+async def _stream_response(request: AIRequest, deadline, document_version=None, trace=None):
+    """
+    Yield NDJSON lines: one {"delta": ...} per chunk, then the final AIResponse.
+    """
+    context = request.context or {}
+    start = time.perf_counter()
+    if trace is not None:
+        # The body is produced outside the endpoint's context
+        trace_recorder.bind(trace)
     try:
-        data = {}
-        message = "Action completed successfully."
-
-        if request.action == "suggestion":
-            logger.debug("Calling suggest_code")
-            suggestion = suggest_code(
+        if request.action == "generate":
+            key = "generated_code"
+            chunks = generate_function_stream(code=request.code, context=context, deadline=deadline)
+        else:
+            key = "suggestion"
+            chunks = suggest_code_stream(
                 code=request.code,
                 cursor_position=request.cursor_position,
-                context=request.context or {}
+                context=context,
+                deadline=deadline,
+                document_id=request.document_id
             )
-            logger.debug(f"Suggestion result: {suggestion}")
-            data["suggestion"] = suggestion
 
-        elif request.action == "generate":
-            logger.debug("Calling generate_function")
-            generated_code = generate_function(
-                code=request.code,
-                context=request.context or {}
-            )
-            logger.debug(f"Generated code: {generated_code}")
-            data["generated_code"] = generated_code
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield json.dumps({"delta": chunk}) + "\n"
+
+        data = {key: "".join(parts)}
+        if request.action == "generate" and request.validate_syntax:
+            # Chunks are already out, so a stream reports validity without regenerating
+            error = check_syntax(data[key], context.get("language", "python"))
+            data["valid"] = error is None
+            if error is not None:
+                data["syntax_error"] = error
+        if document_version is not None:
+            data["document_version"] = document_version
+        final = AIResponse(status="success", data=data, message="Action completed successfully.")
+        yield final.model_dump_json() + "\n"
+
+    except Overloaded as e:
+        # Headers are already sent, so the rejection goes in the stream
+        error = AIResponse(status="error", data={"retry_after": e.retry_after}, message=str(e))
+        yield error.model_dump_json() + "\n"
+    except DeadlineExceeded as e:
+        yield AIResponse(status="error", data={}, message=str(e)).model_dump_json() + "\n"
+    except Exception as e:
+        logger.error(f"Caught exception while streaming: {str(e)}")
+        record_outcome("error")
+        error = AIResponse(status="error", data={}, message=f"Internal server error: {str(e)}")
+        yield error.model_dump_json() + "\n"
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="total", **_stage_labels(request))
+        if trace is not None:
+            trace_recorder.finish(trace, 200)
+
+@app.post("/api/ai-engine", response_model=AIResponse)
+async def ai_engine(request: AIRequest):
+    log_sampled(logger, "Received request: %r", request)
+    if not trace_recorder.enabled:
+        return await _ai_engine(request)
+
+    # The payload as sent, before deltas are resolved into code
+    trace = trace_recorder.start(request.model_dump(mode="json", exclude_unset=True))
+    try:
+        response = await _ai_engine(request, trace)
+    except HTTPException as e:
+        trace_recorder.finish(trace, e.status_code)
+        raise
+    if not request.stream:
+        trace_recorder.finish(trace, 200)
+    return response
+
+async def _ai_engine(request: AIRequest, trace=None):
+    deadline = deadline_from_ms(request.deadline_ms)
+    labels = _stage_labels(request)
+
+    with STAGE_SECONDS.time(stage="validation", **labels):
+        document_version = _resolve_document(request)
+        _validate_request(request)
+
+    # Forward tokens as the model produces them
+    if request.stream:
+        return StreamingResponse(
+            _stream_response(request, deadline, document_version, trace),
+            media_type="application/x-ndjson"
+        )
+
+    with STAGE_SECONDS.time(stage="total", **labels):
+        return await _handle(request, deadline, document_version)
+
+async def _run_action(request: AIRequest, deadline, document_version=None, supersede=True):
+    """
+    Run the requested action and return the response data. With supersede
+    false, a suggestion is not cancelled by newer requests for its document.
+    """
+    data = {}
+    if document_version is not None:
+        # Lets the client send deltas against this version next time
+        data["document_version"] = document_version
+    if request.action == "suggestion":
+        suggestion = await suggest_code_async(
+            code=request.code,
+            cursor_position=request.cursor_position,
+            context=request.context or {},
+            deadline=deadline,
+            document_id=request.document_id,
+            supersede=supersede
+        )
+        log_sampled(logger, "Suggestion result: %r", suggestion)
+        data["suggestion"] = suggestion
+
+    elif request.action == "generate" and request.validate_syntax:
+        generated_code, error = await generate_validated_async(
+            code=request.code,
+            context=request.context or {},
+            deadline=deadline
+        )
+        log_sampled(logger, "Generated code: %r, syntax error: %r", generated_code, error)
+        data["generated_code"] = generated_code
+        data["valid"] = error is None
+        if error is not None:
+            data["syntax_error"] = error
+
+    elif request.action == "generate":
+        generated_code = await generate_function_async(
+            code=request.code,
+            context=request.context or {},
+            deadline=deadline
+        )
+        log_sampled(logger, "Generated code: %r", generated_code)
+        data["generated_code"] = generated_code
+    return data
+
+async def _handle(request: AIRequest, deadline, document_version=None):
+    try:
+        data = await _run_action(request, deadline, document_version)
+        message = "Action completed successfully."
 
         return AIResponse(
             status="success",
@@ -66,13 +360,264 @@ async def ai_engine(request: AIRequest):
             message=message
         )
 
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Model is overloaded, retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded.")
+    except Superseded as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except HTTPException as e:
         logger.error(f"HTTPException: {str(e)}")
         raise e
     except Exception as e:
         logger.error(f"Caught exception: {str(e)}")
+        record_outcome("error")
         return AIResponse(
             status="error",
             data={},
             message=f"Internal server error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+def _resolve_batch_document(request: AIRequest, versions: dict):
+    """
+    _resolve_document for a batch entry. Entries of one document share it:
+    once an entry has opened or updated it, later entries that send no code
+    or deltas, or its code unchanged, use that copy (and version) instead of
+    reopening it. versions maps the batch's document ids to their version.
+    """
+    version = versions.get(request.document_id)
+    if version is not None and request.deltas is None:
+        document = document_store.peek(request.document_id)
+        if document is not None and document.version == version and request.code in (None, document.text):
+            request.code = document.text
+            return version
+    version = _resolve_document(request)
+    if version is not None:
+        versions[request.document_id] = version
+    return version
+
+async def _batch_item(request: AIRequest, document_version):
+    """
+    Run one entry of a batch; failures become that entry's error response
+    (data carries the status code the single-request endpoint would use).
+    document_version is what _resolve_batch_document returned, or the
+    HTTPException it raised.
+    """
+    deadline = deadline_from_ms(request.deadline_ms)
+    try:
+        if isinstance(document_version, HTTPException):
+            raise document_version
+        _validate_request(request)
+        if request.stream:
+            raise HTTPException(status_code=400, detail="Streaming is not supported in batch requests.")
+        # Entries for one document are separate cursors, not newer requests cancelling older ones
+        data = await _run_action(request, deadline, document_version, supersede=False)
+        return AIResponse(status="success", data=data, message="Action completed successfully.")
+
+    except HTTPException as e:
+        return AIResponse(status="error", data={"status_code": e.status_code}, message=e.detail)
+    except Overloaded as e:
+        return AIResponse(
+            status="error",
+            data={"status_code": 429, "retry_after": e.retry_after},
+            message="Model is overloaded, retry later."
+        )
+    except DeadlineExceeded as e:
+        return AIResponse(status="error", data={"status_code": 504}, message=str(e))
+    except Superseded as e:
+        return AIResponse(status="error", data={"status_code": 409}, message=str(e))
+    except Exception as e:
+        logger.error(f"Caught exception in batch item: {str(e)}")
+        return AIResponse(status="error", data={"status_code": 500}, message=f"Internal server error: {str(e)}")
+
+@app.post("/api/ai-engine/batch", response_model=AIBatchResponse)
+async def ai_engine_batch(batch: AIBatchRequest):
+    """
+    Run several suggestion/generate requests in one round trip.
+
+    Every entry starts at once: cache hits are answered without waiting on
+    the model, and the misses share the model concurrently (identical
+    entries are coalesced into one call). Results come back in request order.
+    Documents are brought up to date in request order first, and entries
+    for the same document (several cursors) do not supersede each other.
+    """
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one request.")
+    if len(batch.requests) > config.MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch is limited to {config.MAX_BATCH_ITEMS} requests."
+        )
+
+    versions = {}
+    resolved = []
+    for request in batch.requests:
+        try:
+            resolved.append(_resolve_batch_document(request, versions))
+        except HTTPException as e:
+            resolved.append(e)
+    with STAGE_SECONDS.time(stage="total", action="batch", language="other"):
+        results = await asyncio.gather(*[
+            _batch_item(request, document_version) for request, document_version in zip(batch.requests, resolved)
+        ])
+    return AIBatchResponse(results=results)
+
+# Compact WebSocket message keys -> (AIRequest field, expected type)
+_WS_FIELDS = {
+    "c": ("code", str),
+    "p": ("cursor_position", int),
+    "d": ("document_id", str),
+    "v": ("document_version", int),
+    "t": ("deadline_ms", int),
+    "k": ("validate_syntax", bool),
+}
+_WS_ACTIONS = {"s": ActionType.SUGGESTION, "g": ActionType.GENERATE}
+
+def _ws_request(message: dict) -> AIRequest:
+    """
+    AIRequest for a WebSocket message. Only the types the handlers rely on
+    are checked, instead of a full pydantic validation per keystroke.
+    """
+    action = _WS_ACTIONS.get(message.get("a", "s"))
+    if action is None:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {message.get('a')!r}.")
+    fields = {"action": action}
+    for key, (name, kind) in _WS_FIELDS.items():
+        value = message.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, kind):
+            raise HTTPException(status_code=400, detail=f"Field {key!r} must be {kind.__name__}.")
+        fields[name] = value
+    language = message.get("l")
+    if language is not None:
+        if not isinstance(language, str):
+            raise HTTPException(status_code=400, detail="Field 'l' must be str.")
+        fields["context"] = {"language": language}
+    deltas = message.get("e")
+    if deltas is not None:
+        fields["deltas"] = []
+        for delta in deltas if isinstance(deltas, list) else [None]:
+            if not (isinstance(delta, list) and len(delta) == 3 and isinstance(delta[0], int)
+                    and isinstance(delta[1], int) and isinstance(delta[2], str)):
+                raise HTTPException(status_code=400, detail="Field 'e' must be a list of [offset, deleted, inserted].")
+            fields["deltas"].append(TextDelta.model_construct(offset=delta[0], deleted=delta[1], inserted=delta[2]))
+    return AIRequest.model_construct(**fields)
+
+async def _ws_reply(message: dict) -> dict:
+    """
+    Run one WebSocket request; the reply has "r" (and "v", "ok", "err" as
+    in the REST data) on success, or the REST status code "s" and message "m".
+    """
+    try:
+        request = _ws_request(message)
+        deadline = deadline_from_ms(request.deadline_ms)
+        labels = _stage_labels(request)
+        with STAGE_SECONDS.time(stage="total", **labels):
+            with STAGE_SECONDS.time(stage="validation", **labels):
+                document_version = _resolve_document(request)
+                _validate_request(request)
+            data = await _run_action(request, deadline, document_version)
+    except HTTPException as e:
+        return {"s": e.status_code, "m": e.detail}
+    except Overloaded as e:
+        return {"s": 429, "m": "Model is overloaded, retry later.", "ra": e.retry_after}
+    except DeadlineExceeded as e:
+        return {"s": 504, "m": str(e)}
+    except Superseded as e:
+        return {"s": 409, "m": str(e)}
+    except Exception as e:
+        logger.error(f"Caught exception in WebSocket request: {str(e)}")
+        return {"s": 500, "m": f"Internal server error: {str(e)}"}
+
+    reply = {"r": data["suggestion" if request.action == ActionType.SUGGESTION else "generated_code"]}
+    if "document_version" in data:
+        reply["v"] = data["document_version"]
+    if "valid" in data:
+        reply["ok"] = data["valid"]
+    if "syntax_error" in data:
+        reply["err"] = data["syntax_error"]
+    return reply
+
+@app.websocket("/ws/ai-engine")
+async def ai_engine_ws(websocket: WebSocket):
+    """
+    One long-lived connection per editor. Each text message is a compact
+    JSON request with a client-chosen ID "i"; requests run concurrently and
+    each reply carries its ID, so replies can arrive out of order.
+    {"i": ..., "a": "x"} cancels that request. Everything still running is
+    cancelled when the connection closes.
+    """
+    await websocket.accept()
+    tasks = {}
+    lock = asyncio.Lock()
+
+    async def send(reply):
+        async with lock:
+            await websocket.send_text(json.dumps(reply, separators=(",", ":")))
+
+    async def run(request_id, message):
+        reply = await _ws_reply(message)
+        reply["i"] = request_id
+        try:
+            await send(reply)
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            # The editor went away while this request was running
+            pass
+
+    def forget(task, request_id):
+        if tasks.get(request_id) is task:
+            del tasks[request_id]
+
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                request_id = message["i"]
+            except (ValueError, KeyError, TypeError):
+                await send({"i": None, "s": 400, "m": "Messages must be JSON objects with a request ID \"i\"."})
+                continue
+            if message.get("a") == "x":
+                task = tasks.pop(request_id, None)
+                if task is not None:
+                    task.cancel()
+                continue
+            task = asyncio.ensure_future(run(request_id, message))
+            tasks[request_id] = task
+            task.add_done_callback(lambda task, request_id=request_id: forget(task, request_id))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+@app.get("/health/live")
+async def health_live():
+    """
+    The process is up and answering; it may still be warming up.
+    """
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    200 once the models are loaded and warm (see app.ai_engine.warmup), 503 before that and during shutdown.
+    """
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text exposition of request stage latencies and engine counters.
+    """
+    # Under app.server the shared caches and backends are asked over the coordinator connection first
+    for component in (suggestion_cache, generation_cache, get_async_ollama_client()):
+        if hasattr(component, "refresh_stats"):
+            await component.refresh_stats()
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -1,17 +1,44 @@
 from enum import Enum
-from typing import Optional, Dict, Any
-from pydantic import BaseModel
+from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, model_validator
 
 class ActionType(str, Enum):
     SUGGESTION = 'suggestion'
     GENERATE = 'generate'
 
+# An edit to a document: replace `deleted` characters at `offset` with `inserted`
+class TextDelta(BaseModel):
+    offset: int
+    deleted: int = 0
+    inserted: str = ""
+
 # validates the incoming request payload for /api/ai-engine endpoint
 class AIRequest(BaseModel):
     action: Optional[ActionType] = ActionType.SUGGESTION
-    code: str
+    # Full buffer; may be left out when sending deltas for a known document_id
+    code: Optional[str] = None
     context: Optional[Dict[str, Any]] = None
     cursor_position: Optional[int] = None
+    stream: Optional[bool] = False
+    # Milliseconds the client is willing to wait; stale requests are rejected
+    deadline_ms: Optional[int] = None
+    # Identifies the editor buffer; a newer suggestion for it cancels older ones
+    document_id: Optional[str] = None
+    # Edits since the server's copy of document_id, applied in order instead of sending code
+    deltas: Optional[List[TextDelta]] = None
+    # Version of the document the deltas apply to (as returned in data.document_version)
+    document_version: Optional[int] = None
+    # Check that generated code parses, regenerating once if it does not (sent as "validate")
+    validate_syntax: Optional[bool] = False
+
+    @model_validator(mode="before")
+    @classmethod
+    def _validate_key(cls, data):
+        # A field called "validate" would shadow BaseModel.validate
+        if isinstance(data, dict) and "validate" in data:
+            data = dict(data)
+            data["validate_syntax"] = data.pop("validate")
+        return data
 
 # Schema for the response payload for /api/ai-engine endpoint
 class AIResponse(BaseModel):
@@ -19,6 +46,10 @@ class AIResponse(BaseModel):
     data: Dict[str, Any]
     message: str
 
+# Payload for /api/ai-engine/batch: several requests answered in one round trip
+class AIBatchRequest(BaseModel):
+    requests: List[AIRequest]
 
-
-
+# Per-request results, in the same order as the batch
+class AIBatchResponse(BaseModel):
+    results: List[AIResponse]
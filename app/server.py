@@ -0,0 +1,93 @@
+"""
+Multi-process server.
+
+Starts a coordinator process, which holds the caches and the Ollama
+connection pool, and `--workers` uvicorn worker processes serving
+app.main:app that reach it over a unix socket. Every worker sees the same
+cache and the Ollama hosts see a single client.
+
+    python -m app.server --workers 4 --port 8000
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import uvicorn
+from uvicorn.protocols.http.auto import AutoHTTPProtocol
+
+from app import config
+from app.ai_engine.coordinator import run_coordinator
+
+
+class NoDelayHTTPProtocol(AutoHTTPProtocol):
+    """
+    uvicorn's HTTP protocol with Nagle's algorithm off.
+
+    With several workers uvicorn shares a listening socket created without
+    an explicit protocol, so asyncio does not set TCP_NODELAY on accepted
+    connections and small responses wait for a delayed ACK (~40 ms).
+    """
+
+    def connection_made(self, transport):
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().connection_made(transport)
+
+
+def start_coordinator(path, timeout=10.0):
+    """
+    Start the coordinator in its own process and wait until it listens on path.
+    """
+    # A fresh interpreter, so it never picks up a coordinator socket itself
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_coordinator, args=(path, os.getpid()), name="ai-engine-coordinator", daemon=True
+    )
+    process.start()
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if not process.is_alive():
+            raise RuntimeError("The coordinator process exited during startup.")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError(f"The coordinator did not start listening on {path}.")
+        time.sleep(0.05)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Only this user can reach the socket
+    directory = tempfile.mkdtemp(prefix="ai-engine-")
+    path = os.path.join(directory, "coordinator.sock")
+    coordinator = start_coordinator(path)
+    # Workers read it from the environment; with --workers 1 the app is served from this process
+    os.environ["AI_ENGINE_COORDINATOR_SOCKET"] = path
+    config.COORDINATOR_SOCKET = path
+    # uvicorn re-raises SIGTERM once it has shut down; exit normally so the coordinator is stopped too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        uvicorn.run(
+            "app.main:app", host=args.host, port=args.port, workers=args.workers,
+            log_level=args.log_level, http=NoDelayHTTPProtocol
+        )
+    finally:
+        coordinator.terminate()
+        coordinator.join(5)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeOllama:
+    """
+    Minimal Ollama HTTP server running in a background thread.
+
+    Answers /api/generate with a fixed response (streamed as NDJSON when
+    asked), and /api/tags for health checks. Set `fail` to make every call
+    return 500. The first call for each model also waits `load_latency`,
+    as Ollama does while loading a model into memory.
+    """
+
+    def __init__(self, response="return None", latency=0.0, fail=False, load_latency=0.0):
+        self.response = response
+        self.latency = latency
+        self.fail = fail
+        self.load_latency = load_latency
+        self.requests = []
+        self._loaded = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if fake.fail:
+                    return self._send_json(500, {"error": "backend down"})
+                self._send_json(200, {"models": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                fake.requests.append(payload)
+                with fake._lock:
+                    # Calls arriving during the load wait for it too
+                    if fake.load_latency and payload.get("model") not in fake._loaded:
+                        time.sleep(fake.load_latency)
+                        fake._loaded.add(payload.get("model"))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.fail:
+                    return self._send_json(500, {"error": "backend down"})
+
+                base = {"model": payload.get("model", ""), "created_at": "2024-01-01T00:00:00Z"}
+                if not payload.get("stream", True):
+                    return self._send_json(200, {**base, "response": fake.response, "done": True})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                tokens = [fake.response[i:i + 4] for i in range(0, len(fake.response), 4)]
+                for token in tokens + [""]:
+                    line = json.dumps({**base, "response": token, "done": token == ""}).encode() + b"\n"
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.write(b"0\r\n\r\n")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
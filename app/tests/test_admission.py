@@ -0,0 +1,70 @@
+import asyncio
+import time
+import pytest
+from app.ai_engine.admission import AdmissionController, Overloaded, DeadlineExceeded
+
+@pytest.mark.asyncio
+async def test_suggestions_are_admitted_before_generations():
+    """Test that a freed slot goes to the higher priority lane first."""
+    admission = AdmissionController(max_concurrent=1)
+    order = []
+
+    async def job(lane):
+        await admission.run(lane, lambda: asyncio.sleep(0.01))
+        order.append(lane)
+
+    blocker = asyncio.ensure_future(job("generate"))
+    await asyncio.sleep(0)
+    waiting = [asyncio.ensure_future(job(lane)) for lane in ("generate", "suggestion", "generate", "suggestion")]
+    await asyncio.gather(blocker, *waiting)
+
+    assert order == ["generate", "suggestion", "suggestion", "generate", "generate"]
+    assert admission.active == 0
+
+@pytest.mark.asyncio
+async def test_full_lane_is_rejected_with_retry_hint():
+    """Test early rejection once a lane queue is full."""
+    admission = AdmissionController(max_concurrent=1, lanes={"suggestion": (0, 1), "generate": (1, 1)})
+    running = asyncio.ensure_future(admission.run("suggestion", lambda: asyncio.sleep(0.05)))
+    await asyncio.sleep(0)
+    queued = asyncio.ensure_future(admission.run("suggestion", lambda: asyncio.sleep(0)))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as error:
+        await admission.acquire("suggestion")
+    assert error.value.retry_after > 0
+    await asyncio.gather(running, queued)
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_slow_model_call():
+    """Test that a call running past its deadline is abandoned and its slot freed."""
+    admission = AdmissionController(max_concurrent=1)
+
+    with pytest.raises(DeadlineExceeded):
+        await admission.run("suggestion", lambda: asyncio.sleep(1), deadline=time.monotonic() + 0.02)
+
+    assert admission.active == 0
+    assert admission.stats()["expired"] == 1
+
+@pytest.mark.asyncio
+async def test_real_request_preempts_speculative_call():
+    """Test that a request which would have to wait takes the slot of a preemptible call."""
+    admission = AdmissionController(
+        max_concurrent=1,
+        lanes={"suggestion": (0, 4), "speculation": (2, 0)},
+        preemptible=("speculation",)
+    )
+    speculative = asyncio.ensure_future(admission.run("speculation", lambda: asyncio.sleep(1)))
+    await asyncio.sleep(0)
+
+    # No queueing in the speculation lane
+    with pytest.raises(Overloaded):
+        await admission.acquire("speculation")
+
+    start = time.monotonic()
+    await admission.run("suggestion", lambda: asyncio.sleep(0))
+    assert time.monotonic() - start < 0.5
+    with pytest.raises(asyncio.CancelledError):
+        await speculative
+    assert admission.active == 0
+    assert admission.stats()["preempted"] == 1
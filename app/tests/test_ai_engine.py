@@ -7,7 +7,7 @@ client = TestClient(app)
 
 def test_suggestion_valid_python():
     """Test the suggestion action with valid Python code."""
-    with patch("app.ai_engine.suggestions.ollama_client.generate") as mock_generate:
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
         mock_generate.return_value = {"response": "    return \"Hello, world!\""}
         response = client.post(
             "/api/ai-engine",
@@ -119,7 +119,7 @@ async def test_model_inference_error():
     suggestion_cache.clear()
     print(f"Cache after clearing: {dict(suggestion_cache)}")
 
-    with patch("app.ai_engine.suggestions.ollama_client.generate", side_effect=Exception("Model inference failed")) as mock_generate:
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=Exception("Model inference failed")) as mock_generate:
         print(f"Mock applied: {mock_generate}")
         response = client.post(
             "/api/ai-engine",
@@ -136,4 +136,473 @@ async def test_model_inference_error():
             "status": "error",
             "data": {},
             "message": "Internal server error: Model inference failed"
-        }
\ No newline at end of file
+        }
+
+@pytest.mark.asyncio
+async def test_concurrent_suggestions_do_not_block():
+    """Test that slow model calls overlap instead of running one after another."""
+    import asyncio
+    import time
+    from app.ai_engine.suggestions import suggest_code_async, suggestion_cache
+    suggestion_cache.clear()
+
+    async def slow_generate(**kwargs):
+        await asyncio.sleep(0.2)
+        return {"response": "return a + b"}
+
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=slow_generate):
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            suggest_code_async(f"def add_{i}(a, b):", None, {"language": "python"})
+            for i in range(20)
+        ])
+        elapsed = time.perf_counter() - start
+
+    assert results == ["    return a + b"] * 20
+    assert elapsed < 1.0
+
+def _fake_stream(*chunks):
+    """Build an async iterator of Ollama stream parts."""
+    async def parts():
+        for chunk in chunks:
+            yield {"response": chunk}
+    return parts()
+
+def test_generate_stream_matches_full_response():
+    """Test that streamed chunks add up to the non-streamed generation."""
+    import json
+    from app.ai_engine.generation import generation_cache
+    generation_cache.clear()
+    raw = "Here you go:\n```python\n    return a - b\n```\nDone."
+
+    with patch("app.ai_engine.generation.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": raw}
+        payload = {"action": "generate", "code": "def sub(a, b):", "context": {"language": "python"}}
+        expected = client.post("/api/ai-engine", json=payload).json()["data"]["generated_code"]
+
+        generation_cache.clear()
+        mock_generate.return_value = _fake_stream("Here you go:\n``", "`python\n    ret", "urn a - b\n```\nDone.")
+        response = client.post("/api/ai-engine", json={**payload, "stream": True})
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    deltas = "".join(event["delta"] for event in events[:-1])
+    assert deltas == expected
+    assert events[-1] == {
+        "status": "success",
+        "data": {"generated_code": expected},
+        "message": "Action completed successfully."
+    }
+
+def test_suggestion_stream_stops_after_first_line():
+    """Test that a streamed suggestion is returned from the first complete line."""
+    import json
+    from app.ai_engine.suggestions import suggestion_cache
+    suggestion_cache.clear()
+
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = _fake_stream("```\nreturn a", " + b\n", "print('never read')\n")
+        response = client.post(
+            "/api/ai-engine",
+            json={"action": "suggestion", "code": "def add(a, b):", "context": {"language": "python"}, "stream": True}
+        )
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[-1]["data"] == {"suggestion": "    return a + b"}
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_generations_are_coalesced():
+    """Test that concurrent identical requests share a single model call."""
+    import asyncio
+    from app.ai_engine.generation import generate_function_async, generation_cache, generation_inflight
+    generation_cache.clear()
+    coalesced_before = generation_inflight.coalesced
+
+    async def slow_generate(**kwargs):
+        await asyncio.sleep(0.05)
+        return {"response": "```\n    return a + b\n```"}
+
+    with patch("app.ai_engine.generation.async_ollama_client.generate", side_effect=slow_generate) as mock_generate:
+        results = await asyncio.gather(*[
+            generate_function_async("def add(a, b):", {"language": "python"})
+            for _ in range(50)
+        ])
+
+    assert mock_generate.call_count == 1
+    assert set(results) == {"def add(a, b):\n    return a + b"}
+    assert generation_inflight.coalesced - coalesced_before == 49
+
+def test_deadline_exceeded_returns_504():
+    """Test that a request whose deadline passes during the model call is abandoned."""
+    import asyncio
+    from app.ai_engine.generation import generation_cache
+    generation_cache.clear()
+
+    async def slow_generate(**kwargs):
+        await asyncio.sleep(1)
+        return {"response": "    return 1"}
+
+    with patch("app.ai_engine.generation.async_ollama_client.generate", side_effect=slow_generate):
+        response = client.post(
+            "/api/ai-engine",
+            json={"action": "generate", "code": "def one():", "context": {"language": "python"}, "deadline_ms": 50}
+        )
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request deadline exceeded."}
+
+@pytest.mark.asyncio
+async def test_newer_request_cancels_superseded_suggestion():
+    """Test that a new keystroke for the same document aborts the older model call."""
+    import asyncio
+    from app.ai_engine.cancellation import Superseded
+    from app.ai_engine.suggestions import suggest_code_async, suggestion_cache, suggestion_sessions
+    suggestion_cache.clear()
+    started = []
+    cancelled = []
+
+    async def slow_generate(**kwargs):
+        started.append(kwargs["prompt"])
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            cancelled.append(kwargs["prompt"])
+            raise
+        return {"response": "return x"}
+
+    aborted_before = suggestion_sessions.aborted_model_calls
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=slow_generate):
+        old = asyncio.ensure_future(suggest_code_async("def f(x):", None, {"language": "python"}, document_id="doc-1"))
+        await asyncio.sleep(0.05)
+        new = await suggest_code_async("def f(x):\n", None, {"language": "python"}, document_id="doc-1")
+        with pytest.raises(Superseded):
+            await old
+
+    assert new == "    return x"
+    assert len(started) == 2
+    assert len(cancelled) == 1
+    assert suggestion_sessions.aborted_model_calls - aborted_before == 1
+
+
+def test_metrics_endpoint():
+    """Test that /metrics exposes stage latencies and cache counters."""
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return 1"}
+        client.post(
+            "/api/ai-engine",
+            json={"action": "suggestion", "code": "def metrics_probe():", "context": {"language": "python"}}
+        )
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'ai_engine_stage_seconds_count{stage="validation",action="suggestion",language="python"}' in body
+    assert 'ai_engine_stage_seconds_count{stage="model_call",action="suggestion",language="python"}' in body
+    assert 'ai_engine_cache_misses_total{cache="suggestion"}' in body
+    assert "ai_engine_batch_wait_seconds_count" in body
+    assert 'ai_engine_cache_hits_total{cache="generation"}' in body
+
+
+def test_batch_endpoint():
+    """Test that a batch returns per-item results in order, reusing cached entries."""
+    from app.ai_engine.suggestions import suggestion_cache
+    suggestion_cache.clear()
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return a + b"}
+        response = client.post(
+            "/api/ai-engine/batch",
+            json={"requests": [
+                {"action": "suggestion", "code": "def add(a, b):", "context": {"language": "python"}},
+                {"action": "suggestion", "code": "", "context": {"language": "python"}},
+                {"action": "suggestion", "code": "def add(a, b):", "context": {"language": "python"}},
+            ]}
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == ["success", "error", "success"]
+        assert results[0]["data"] == {"suggestion": "    return a + b"}
+        assert results[1]["data"] == {"status_code": 400}
+        assert results[2] == results[0]
+        # The duplicate entry shares the first one's model call
+        assert mock_generate.call_count == 1
+
+
+def test_batch_cursors_in_one_document_do_not_supersede_each_other():
+    """Test that batch entries for one document share it and all get their suggestion."""
+    import asyncio
+    from app.ai_engine.suggestions import suggestion_cache
+    suggestion_cache.clear()
+    code = "def add(a, b):\n    pass\n\ndef sub(a, b):\n    pass\n"
+
+    async def generate(**kwargs):
+        await asyncio.sleep(0.01)
+        return {"response": "return a + b" if kwargs["prompt"].count("def ") == 1 else "return a - b"}
+
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=generate) as mock_generate:
+        response = client.post(
+            "/api/ai-engine/batch",
+            json={"requests": [
+                {"action": "suggestion", "document_id": "doc-batch", "code": code, "cursor_position": 15},
+                {"action": "suggestion", "document_id": "doc-batch", "cursor_position": len(code) - 9},
+                {"action": "suggestion", "document_id": "doc-batch", "code": code, "cursor_position": 15},
+            ]}
+        )
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["success"] * 3
+    assert results[0]["data"]["suggestion"] == "    return a + b"
+    assert results[1]["data"]["suggestion"] == "    return a - b"
+    # Opened once for the whole batch
+    assert {r["data"]["document_version"] for r in results} == {results[0]["data"]["document_version"]}
+    assert mock_generate.call_count == 2
+
+def test_suggestion_key_covers_only_the_prompt_context():
+    """Test that edits outside the budgeted context share a cached suggestion, and edits inside do not."""
+    from app import config
+    from app.ai_engine.suggestions import suggestion_cache
+    suggestion_cache.clear()
+    tail = "def add(a, b):\n    total = a + b\n    "
+
+    with patch.object(config, "PROMPT_TOKEN_BUDGET", 20), \
+            patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return total"}
+        for code in ("x = 1\n" * 50 + tail, "y = 2\n" + "x = 1\n" * 49 + tail, "x = 1\n" * 50 + tail.replace("+", "-")):
+            payload = {"action": "suggestion", "code": code, "context": {"language": "python"}}
+            assert client.post("/api/ai-engine", json=payload).json()["data"] == {"suggestion": "    return total"}
+
+    # The third buffer changes the code just before the cursor
+    assert mock_generate.call_count == 2
+
+def test_document_deltas_replace_full_code():
+    """Test that a suggestion can be requested with deltas against a known document."""
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return a - b"}
+        response = client.post(
+            "/api/ai-engine",
+            json={"action": "suggestion", "code": "def sub(a, b):", "context": {"language": "python"}, "document_id": "delta-doc"}
+        )
+        assert response.json()["data"]["document_version"] == 0
+
+        response = client.post(
+            "/api/ai-engine",
+            json={
+                "action": "suggestion",
+                "context": {"language": "python"},
+                "document_id": "delta-doc",
+                "document_version": 0,
+                "deltas": [{"offset": 4, "deleted": 3, "inserted": "minus"}]
+            }
+        )
+        assert response.status_code == 200
+        assert response.json()["data"] == {"document_version": 1, "suggestion": "    return a - b"}
+        assert "def minus(a, b):" in mock_generate.call_args.kwargs["prompt"]
+
+        # Stale or unknown documents make the client resend the full code
+        response = client.post(
+            "/api/ai-engine",
+            json={"action": "suggestion", "document_id": "delta-doc", "document_version": 0, "deltas": []}
+        )
+        assert response.status_code == 409
+        response = client.post(
+            "/api/ai-engine",
+            json={"action": "suggestion", "document_id": "missing-doc", "deltas": [{"offset": 0, "inserted": "x"}]}
+        )
+        assert response.status_code == 409
+
+@pytest.mark.asyncio
+async def test_speculated_suggestion_is_served_after_accepting():
+    """Test that the suggestion for the accepted state is computed in the background and then served."""
+    import asyncio
+    from app.ai_engine.suggestions import suggest_code_async, suggestion_cache, suggestion_speculator
+    suggestion_cache.clear()
+    responses = iter([{"response": "return x"}, {"response": "pass"}])
+
+    async def generate(**kwargs):
+        return next(responses)
+
+    accepted_before = suggestion_speculator.accepted
+    with patch.object(suggestion_speculator, "enabled", True), \
+            patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=generate) as mock_generate:
+        first = await suggest_code_async("def f(x):", None, {"language": "python"}, document_id="doc-spec")
+        await asyncio.sleep(0.05)
+        second = await suggest_code_async("def f(x):\n    return x\n", None, {"language": "python"}, document_id="doc-spec")
+        # Stop the speculation started for the next state before the loop closes
+        suggestion_speculator.cancel("doc-spec")
+        await asyncio.sleep(0.05)
+
+    assert first == "    return x"
+    assert second == "    pass"
+    assert mock_generate.call_count == 2
+    assert suggestion_speculator.accepted - accepted_before == 1
+
+@pytest.mark.asyncio
+async def test_typed_suggestion_rest_is_not_speculated_on():
+    """Test that serving the rest of a typed suggestion starts no speculation for a corrupted buffer."""
+    import asyncio
+    from app.ai_engine.suggestions import (
+        suggest_code_async, suggestion_cache, suggestion_prefix_index, suggestion_speculator
+    )
+    suggestion_cache.clear()
+    suggestion_prefix_index.clear()
+
+    async def generate(**kwargs):
+        return {"response": "return x"}
+
+    with patch.object(suggestion_speculator, "enabled", True), \
+            patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=generate):
+        await suggest_code_async("def f(x):", None, {"language": "python"}, document_id="doc-rest")
+        await asyncio.sleep(0.05)
+        started = suggestion_speculator.started
+        rest = await suggest_code_async("def f(x):\n    ret", None, {"language": "python"}, document_id="doc-rest")
+        suggestion_speculator.cancel("doc-rest")
+        await asyncio.sleep(0.05)
+
+    assert rest == "urn x"
+    assert suggestion_speculator.started == started
+
+def test_requests_are_traced(tmp_path):
+    """Test that traced requests record their status and how they were answered."""
+    from app.ai_engine.suggestions import suggestion_cache
+    from app.ai_engine.tracing import TraceRecorder, read_trace
+    suggestion_cache.clear()
+    path = str(tmp_path / "trace.jsonl.gz")
+    payload = {"action": "suggestion", "code": "def traced(x):", "context": {"language": "python"}}
+    with patch("app.main.trace_recorder", TraceRecorder(path)) as recorder, \
+            patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return x"}
+        client.post("/api/ai-engine", json=payload)
+        client.post("/api/ai-engine", json=payload)
+        client.post("/api/ai-engine", json={**payload, "code": ""})
+        recorder.close()
+
+    records = list(read_trace(path))
+    assert [r["status"] for r in records] == [200, 200, 400]
+    assert [r["outcome"] for r in records] == ["model", "cache", None]
+    assert records[0]["payload"] == payload
+
+def test_invalid_generation_is_regenerated_once():
+    """Test that validate regenerates code that does not parse, and caches the fix."""
+    from app.ai_engine.generation import generation_cache
+    generation_cache.clear()
+    payload = {"action": "generate", "code": "def half(x):", "context": {"language": "python"}, "validate": True}
+
+    with patch("app.ai_engine.generation.async_ollama_client.generate") as mock_generate:
+        mock_generate.side_effect = [{"response": "```\nreturn (x / 2\n```"}, {"response": "```\nreturn x / 2\n```"}]
+        first = client.post("/api/ai-engine", json=payload).json()["data"]
+        second = client.post("/api/ai-engine", json=payload).json()["data"]
+
+    assert mock_generate.call_count == 2
+    assert "'(' was never closed" in mock_generate.call_args.kwargs["prompt"]
+    assert first == second == {"generated_code": "def half(x):\n    return x / 2", "valid": True}
+
+def test_nested_generation_is_valid_without_regenerating():
+    """Test that a body with nested blocks keeps its indentation and parses the first time."""
+    from app.ai_engine.generation import generation_cache
+    generation_cache.clear()
+    payload = {"action": "generate", "code": "def sign(x):", "context": {"language": "python"}, "validate": True}
+    raw = "```python\ndef sign(x):\n    if x < 0:\n        return -1\n    return 1\n```"
+
+    with patch("app.ai_engine.generation.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": raw}
+        data = client.post("/api/ai-engine", json=payload).json()["data"]
+
+    assert mock_generate.call_count == 1
+    assert data == {"generated_code": "def sign(x):\n    if x < 0:\n        return -1\n    return 1", "valid": True}
+
+def test_websocket_replies_out_of_order_and_cancels():
+    """Test that WebSocket requests are multiplexed by ID and can be cancelled."""
+    import asyncio
+    import json
+    from app.ai_engine.generation import generation_cache, generation_inflight
+    from app.ai_engine.suggestions import suggestion_cache
+    generation_cache.clear()
+    suggestion_cache.clear()
+    abandoned_before = generation_inflight.abandoned
+
+    async def generate(prompt, **kwargs):
+        # Suggestions and generations share the client; generations are slow
+        if prompt.startswith("Complete the following"):
+            await asyncio.sleep(0.2)
+            return {"response": "```\nreturn a - b\n```"}
+        return {"response": "return a + b"}
+
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate", side_effect=generate) as mock_generate:
+        with client.websocket_connect("/ws/ai-engine") as websocket:
+            websocket.send_text(json.dumps({"i": 1, "a": "g", "c": "def sub(a, b):", "l": "python"}))
+            websocket.send_text(json.dumps({"i": 2, "c": "def add(a, b):", "l": "python"}))
+            assert json.loads(websocket.receive_text()) == {"i": 2, "r": "    return a + b"}
+            assert json.loads(websocket.receive_text()) == {"i": 1, "r": "def sub(a, b):\n    return a - b"}
+
+            websocket.send_text(json.dumps({"i": 3, "a": "g", "c": "def mul(a, b):", "l": "python"}))
+            websocket.send_text(json.dumps({"i": 3, "a": "x"}))
+            websocket.send_text(json.dumps({"i": 4, "c": "", "l": "python"}))
+            assert json.loads(websocket.receive_text()) == {"i": 4, "s": 400, "m": "Code parameter cannot be empty."}
+            websocket.send_text(json.dumps({"i": 5, "c": "def add(a, b):", "l": "python"}))
+            assert json.loads(websocket.receive_text()) == {"i": 5, "r": "    return a + b"}
+            assert generation_inflight.abandoned - abandoned_before == 1
+
+    # Two generations (one cancelled) and one suggestion, answered from the cache the second time
+    assert mock_generate.call_count == 3
+
+def test_typed_suggestion_rest_follows_a_trailing_space():
+    """Test that typing a space after a typed-prefix rest does not serve that rest again."""
+    from app.ai_engine.suggestions import suggestion_cache, suggestion_prefix_index
+    suggestion_cache.clear()
+    suggestion_prefix_index.clear()
+    payload = {"action": "suggestion", "code": "def add(a, b):", "context": {"language": "python"}}
+
+    with patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return a + b"}
+        client.post("/api/ai-engine", json=payload)
+        typed = client.post("/api/ai-engine", json={**payload, "code": "def add(a, b):\n    return a"})
+        spaced = client.post("/api/ai-engine", json={**payload, "code": "def add(a, b):\n    return a "})
+        operator = client.post("/api/ai-engine", json={**payload, "code": "def add(a, b):\n    return a + "})
+
+    assert mock_generate.call_count == 1
+    assert typed.json()["data"]["suggestion"] == " + b"
+    assert spaced.json()["data"]["suggestion"] == "+ b"
+    assert operator.json()["data"]["suggestion"] == "b"
+
+def test_suggestions_use_their_routed_model_and_count_acceptance():
+    """Test that suggestions go to the routed model, and typing one counts it as accepted."""
+    from unittest.mock import ANY
+    from app.ai_engine.routing import model_router
+    from app.ai_engine.suggestions import suggestion_cache, suggestion_prefix_index
+    suggestion_cache.clear()
+    suggestion_prefix_index.clear()
+    payload = {"action": "suggestion", "code": "def add(a, b):", "context": {"language": "python"}}
+
+    with patch.object(model_router, "routes", {("suggestion", None): "small-model"}), \
+            patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "return a + b"}
+        client.post("/api/ai-engine", json=payload)
+        typed = client.post("/api/ai-engine", json={**payload, "code": "def add(a, b):\n    return a"})
+
+    mock_generate.assert_called_once_with(model="small-model", prompt=ANY)
+    assert typed.json()["data"]["suggestion"] == " + b"
+    stats = {row["model"]: row for row in model_router.stats()}
+    assert stats["small-model"]["served"] == 1
+    assert stats["small-model"]["accepted"] == 1
+
+def test_predictable_suggestions_are_answered_locally():
+    """Test that a confident n-gram prediction skips the model, and typed model suggestions are learned."""
+    from app.ai_engine.suggestions import suggestion_cache, suggestion_ngrams, suggestion_prefix_index
+    suggestion_cache.clear()
+    suggestion_prefix_index.clear()
+    suggestion_ngrams.clear()
+    payload = {"action": "suggestion", "context": {"language": "python"}}
+
+    with patch.object(suggestion_ngrams, "enabled", True), \
+            patch("app.ai_engine.suggestions.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "raise NotImplementedError"}
+        for name in ("area", "perimeter", "volume"):
+            code = f"class Shape:\n    def {name}(self):"
+            client.post("/api/ai-engine", json={**payload, "code": code})
+            # The user types the suggestion
+            typed = client.post("/api/ai-engine", json={**payload, "code": f"{code}\n    raise NotImpl"})
+            assert typed.json()["data"]["suggestion"] == "ementedError"
+        assert mock_generate.call_count == 3
+
+        local = client.post("/api/ai-engine", json={**payload, "code": "class Shape:\n    def centroid(self):"})
+        assert local.json()["data"]["suggestion"] == "    raise NotImplementedError"
+        assert mock_generate.call_count == 3
+    suggestion_ngrams.clear()
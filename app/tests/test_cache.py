@@ -0,0 +1,110 @@
+import sqlite3
+import time
+import pytest
+from app.ai_engine.cache import MemoryCache, SQLiteCache, fingerprint, load_snapshot, save_snapshot
+
+def test_memory_cache_is_bounded_by_bytes():
+    """Test that the least recently used entries are evicted past max_bytes."""
+    cache = MemoryCache(max_bytes=100, ttl=0)
+    cache["a"] = "x" * 40
+    cache["b"] = "y" * 40
+    assert cache.get("a") == "x" * 40
+    cache["c"] = "z" * 40
+
+    assert "b" not in cache
+    assert cache.get("a") == "x" * 40
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 100
+
+def test_memory_cache_ttl():
+    """Test that expired entries are not served."""
+    cache = MemoryCache(ttl=0.01)
+    cache["a"] = "value"
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    """Test that a second process-level instance sees entries from the first."""
+    path = str(tmp_path / "cache.sqlite3")
+    key = ("def add(a, b):", 13, (("language", "python"),))
+    writer = SQLiteCache("suggestion", path=path, ttl=0)
+    writer[key] = "    return a + b"
+    # Writes are committed in the background
+    writer.flush()
+
+    other = SQLiteCache("suggestion", path=path, ttl=0)
+    assert other.get(key) == "    return a + b"
+    assert other.warm() == 1
+    assert SQLiteCache("generation", path=path, ttl=0).get(key) is None
+
+def test_sqlite_cache_model_version_invalidation(tmp_path):
+    """Test that entries written for another model version are ignored and purged."""
+    path = str(tmp_path / "cache.sqlite3")
+    old = SQLiteCache("generation", path=path, ttl=0, model_version="v1")
+    old["k"] = "old"
+    old.flush()
+
+    cache = SQLiteCache("generation", path=path, ttl=0, model_version="v2")
+    assert cache.get("k") is None
+    assert cache.purge() == 1
+    assert len(cache) == 0
+
+def test_sqlite_cache_evicts_by_bytes(tmp_path):
+    """Test that the on-disk cache stays within its byte budget."""
+    cache = SQLiteCache("generation", path=str(tmp_path / "cache.sqlite3"), max_bytes=500, ttl=0)
+    for i in range(20):
+        cache[f"key-{i}"] = "v" * 50
+    cache.flush()
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 500
+    assert stats["evictions"] > 0
+    assert cache.get("key-19") == "v" * 50
+
+def test_snapshot_round_trip(tmp_path):
+    """Test that memory caches are refilled from a snapshot in recency order, for the same model version only."""
+    path = str(tmp_path / "snapshot.jsonl")
+    key = (fingerprint("def add(a, b):"), (("language", "python"),))
+    saved = MemoryCache(max_bytes=200, ttl=0)
+    saved[key] = "    return a + b"
+    saved["old"] = "x" * 40
+    saved.get(key)
+    assert save_snapshot(path, {"generation": saved}, model_version="v1") == 2
+
+    loaded = MemoryCache(max_bytes=200, ttl=0)
+    assert load_snapshot(path, {"generation": loaded}, model_version="v1") == 2
+    assert loaded.keys() == ["old", key]
+    assert loaded[key] == "    return a + b"
+    assert load_snapshot(path, {"generation": MemoryCache()}, model_version="v2") == 0
+    assert load_snapshot(str(tmp_path / "missing.jsonl"), {"generation": MemoryCache()}) == 0
+
+def test_memory_cache_stores_values_compactly():
+    """Test that long values are kept compressed and short ones as they are, and both read back unchanged."""
+    cache = MemoryCache(max_bytes=10_000, ttl=0, compress_min=100)
+    body = "    total = 0\n    for item in items:\n        total += item\n" * 20
+    cache[(fingerprint("def total(items):"), ())] = body
+    cache["a"] = "return a + b"
+
+    assert cache[(fingerprint("def total(items):"), ())] == body
+    assert cache.stats()["bytes"] < len(body) // 4
+    assert cache["a"] == "return a + b"
+    assert cache._data["a"][0] == "return a + b"
+    assert fingerprint("x" * 200_000) != fingerprint("x" * 200_001)
+    assert len(fingerprint("x" * 200_000)) == 16
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_writes_do_not_wait_for_the_write_lock(tmp_path):
+    """Test that set() returns while another process holds the lock, and commits after."""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache("generation", path=path, ttl=0)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    start = time.monotonic()
+    cache["k"] = "    return 1"
+    assert time.monotonic() - start < 0.1
+    assert await cache.get_async("k") == "    return 1"
+
+    other.execute("COMMIT")
+    cache.flush()
+    assert await SQLiteCache("generation", path=path, ttl=0).get_async("k") == "    return 1"
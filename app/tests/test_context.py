@@ -0,0 +1,49 @@
+from app.ai_engine.context import build_context, estimate_tokens
+
+def _python_file(functions):
+    body = "\n".join(
+        f"def helper_{i}(value):\n    result = value * {i}\n    return result\n"
+        for i in range(functions)
+    )
+    return f"import os\nfrom typing import (\n    List,\n)\n\n{body}\n"
+
+def test_small_code_is_unchanged():
+    """Test that code within the budget is sent as is."""
+    code = "def add(a, b):\n    return a + b\n"
+    assert build_context(code, "python", 1024) == code
+    assert build_context(_python_file(500), "python", 0) == _python_file(500)
+
+def test_python_keeps_imports_enclosing_scopes_and_nearby_lines():
+    """Test that a trimmed Python prefix keeps what matters around the cursor."""
+    prefix = _python_file(500) + "class Report:\n    def render(self, rows):\n        total = 0\n        for row in rows:\n            total += "
+    context = build_context(prefix, "python", 200)
+
+    assert estimate_tokens(context) <= 220
+    lines = context.split("\n")
+    assert lines[:4] == ["import os", "from typing import (", "    List,", ")"]
+    assert "class Report:" in lines
+    assert "    def render(self, rows):" in lines
+    assert "# ..." in lines
+    assert context.endswith("        for row in rows:\n            total += ")
+
+def test_python_scopes_found_when_prefix_parses():
+    """Test that complete code is outlined with ast, including decorators."""
+    prefix = _python_file(500) + "@cached\ndef area(\n    width,\n    height,\n):\n    return width * height"
+    context = build_context(prefix, "python", 100)
+    assert "@cached\ndef area(\n    width,\n    height,\n):\n    return width * height" in context
+    assert "def helper_0(value):" not in context
+
+def test_javascript_keeps_open_blocks():
+    """Test that braces inside strings and comments do not confuse the scanner."""
+    functions = "\n".join(f"function helper{i}(v) {{\n  return v * {i}; // {{\n}}" for i in range(500))
+    prefix = (
+        "import fs from 'fs';\n" + functions +
+        "\nclass Report {\n  render(rows) {\n    const open = '{';\n    for (const row of rows) {\n      total += "
+    )
+    context = build_context(prefix, "javascript", 120)
+    lines = context.split("\n")
+    assert lines[0] == "import fs from 'fs';"
+    assert "class Report {" in lines
+    assert "  render(rows) {" in lines
+    assert "function helper0(v) {" not in lines
+    assert context.endswith("      total += ")
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import pytest
+from app.ai_engine.coordinator import _HEADER, Coordinator, CoordinatorClient, RemoteCache, _Channel
+
+class FakeModel:
+    def __init__(self):
+        self.cancelled = 0
+
+    async def generate(self, **kwargs):
+        if kwargs["prompt"] == "fail":
+            raise ValueError("model failed")
+        if not kwargs.get("stream"):
+            return {"response": kwargs["prompt"].upper()}
+        return self._stream(kwargs["prompt"])
+
+    async def _stream(self, prompt):
+        try:
+            for word in prompt.split():
+                yield {"response": word}
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    async def run_health_checks(self, interval):
+        await asyncio.Event().wait()
+
+    def stats(self):
+        return [{"host": "fake", "healthy": True, "outstanding": 0, "requests": 0, "failures": 0}]
+
+
+@pytest.fixture
+def coordinator():
+    """A coordinator serving on a private socket from its own thread, like the real process."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "coordinator.sock")
+    model = FakeModel()
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    servers = []
+
+    async def serve():
+        started = asyncio.Event()
+        servers.append(asyncio.ensure_future(Coordinator(model).serve(path, started)))
+        await started.wait()
+        ready.set()
+        await asyncio.gather(servers[0], return_exceptions=True)
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(serve()), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    yield path, model
+    loop.call_soon_threadsafe(servers[0].cancel)
+    thread.join(5)
+    loop.close()
+    shutil.rmtree(directory)
+
+def test_workers_share_the_coordinator_cache(coordinator):
+    """Test that an entry written by one worker is served to another."""
+    path, _ = coordinator
+    first, second = RemoteCache("suggestion", path), RemoteCache("suggestion", path)
+    other_namespace = RemoteCache("generation", path)
+
+    first[("def f():", None, ())] = "    pass"
+    assert second.get(("def f():", None, ())) == "    pass"
+    assert ("def f():", None, ()) in second
+    assert other_namespace.get(("def f():", None, ())) is None
+    assert second.stats()["entries"] == 1
+    assert second.stats()["hits"] == 1
+
+    first.clear()
+    assert len(second) == 0
+    for cache in (first, second, other_namespace):
+        cache.close()
+
+@pytest.mark.asyncio
+async def test_model_calls_go_through_the_coordinator(coordinator):
+    """Test plain, streamed, failing and abandoned model calls."""
+    path, model = coordinator
+    client = CoordinatorClient(path)
+
+    results = await asyncio.gather(*[client.generate(model="codellama", prompt=f"call {i}") for i in range(5)])
+    assert [r["response"] for r in results] == [f"CALL {i}" for i in range(5)]
+
+    stream = await client.generate(model="codellama", prompt="one two three", stream=True)
+    assert [part["response"] async for part in stream] == ["one", "two", "three"]
+
+    with pytest.raises(ValueError):
+        await client.generate(model="codellama", prompt="fail")
+
+    # Closing a stream early stops the model call in the coordinator
+    stream = await client.generate(model="codellama", prompt="a b c d e f g h", stream=True)
+    assert (await stream.__anext__())["response"] == "a"
+    await stream.aclose()
+    for _ in range(50):
+        if model.cancelled:
+            break
+        await asyncio.sleep(0.01)
+    assert model.cancelled == 1
+    assert client.stats()[0]["host"] == "fake"
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_overwritten_entries_leave_other_workers_local_tier(coordinator):
+    """Test async lookups, and that a changed entry is not served from a stale local copy."""
+    path, _ = coordinator
+    first, second = RemoteCache("generation", path), RemoteCache("generation", path)
+    key = ("def f():", ())
+    assert await first.get_async(key) is None
+
+    first[key] = "    return 1"
+    for _ in range(50):
+        if await second.get_async(key) is not None:
+            break
+        await asyncio.sleep(0.01)
+    assert await second.get_async(key) == "    return 1"
+
+    # A regenerated body replaces the first one everywhere
+    first[key] = "    return 2"
+    for _ in range(50):
+        if await second.get_async(key) == "    return 2":
+            break
+        await asyncio.sleep(0.01)
+    assert await second.get_async(key) == "    return 2"
+    await second.refresh_stats()
+    assert second.stats()["entries"] == 1
+    for cache in (first, second):
+        cache.close()
+        await cache._channels.close()
+
+@pytest.mark.asyncio
+async def test_bad_frame_fails_pending_requests():
+    """Test that a message that does not decode fails every waiting call instead of leaving it hanging."""
+    class Writer:
+        def write(self, data):
+            pass
+
+        def close(self):
+            pass
+
+    reader = asyncio.StreamReader()
+    pushed = []
+    channel = _Channel(reader, Writer(), lambda kind, payload: pushed.append(kind))
+    call = asyncio.ensure_future(channel.call({"prompt": "x"}))
+    await asyncio.sleep(0)
+    reader.feed_data(_HEADER.pack(3) + b"bad")
+
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(call, 1)
+    assert channel.closed
+    assert pushed == ["closed"]
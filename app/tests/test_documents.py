@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.ai_engine.context import build_context
+from app.ai_engine.documents import Document, DocumentStore, DocumentVersionMismatch
+from app.models.schemas import TextDelta
+
+SOURCE = "import os\nfrom typing import (\n    List,\n)\n\ndef f(x):\n    return x\n"
+
+def test_random_edits_match_plain_string_edits():
+    """Test that incremental updates keep text, lines and imports in sync."""
+    rng = random.Random(0)
+    document = Document(SOURCE, "python")
+    text = SOURCE
+    for _ in range(500):
+        offset = rng.randint(0, len(text))
+        deleted = rng.randint(0, min(5, len(text) - offset))
+        inserted = rng.choice(["", "x", "\n", "import re\n", "    ", "(\n", ")", "from a import b"])
+        document.apply(offset, deleted, inserted)
+        text = text[:offset] + inserted + text[offset + deleted:]
+
+        assert document.text == text
+        assert document.lines == text.split("\n")
+        assert document.imports == Document(text, "python").imports
+        cursor = rng.randint(0, len(text))
+        line = text.count("\n", 0, cursor)
+        assert document.position(cursor) == (line, cursor - (text.rfind("\n", 0, cursor) + 1))
+        assert document.context(cursor, 20) == build_context(text[:cursor], "python", 20)
+
+def test_store_applies_versioned_deltas():
+    """Test that deltas need a known document at the expected version."""
+    store = DocumentStore()
+    assert store.open("doc", "def f(x):\n", "python").version == 0
+
+    document = store.apply("doc", [TextDelta(offset=10, inserted="    return x")], version=0)
+    assert document.text == "def f(x):\n    return x"
+    assert document.version == 1
+    with pytest.raises(DocumentVersionMismatch):
+        store.apply("doc", [TextDelta(offset=0, inserted="#")], version=0)
+    with pytest.raises(DocumentVersionMismatch):
+        store.apply("other", [TextDelta(offset=0, inserted="#")])
+    with pytest.raises(ValueError):
+        store.apply("doc", [TextDelta(offset=100, deleted=1)])
+    assert len(store) == 0
+
+def test_store_evicts_least_recently_used():
+    """Test that the store stays within its document and byte limits."""
+    store = DocumentStore(max_documents=2, max_bytes=100)
+    store.open("a", "a" * 10, "python")
+    store.open("b", "b" * 10, "python")
+    store.get("a")
+    store.open("c", "c" * 10, "python")
+    assert store.peek("b") is None and store.peek("a") is not None
+
+    store.open("d", "d" * 95, "python")
+    assert len(store) == 1 and store.current_bytes == 95
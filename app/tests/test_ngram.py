@@ -0,0 +1,35 @@
+from app.ai_engine.ngram import NgramIndex, tokenize
+
+ADDERS = "".join(f"def add_{i}(a, b):\n    return a + b\n\n" for i in range(4))
+
+def test_tokens_drop_indentation_and_comments():
+    """Test that line breaks become one token and spacing inside a line is kept as a leading space."""
+    assert tokenize("def f(x):  # doc\n\n    return x['#']\n", "python") == [
+        "def", " f", "(", "x", ")", ":", "\n", "return", " x", "[", "'#'", "]", "\n"
+    ]
+
+def test_predicts_a_confident_next_line():
+    """Test that a line seen after the same context often enough is predicted, ending the current line first."""
+    index = NgramIndex(min_count=3, min_confidence=0.9)
+    index.learn("python", ADDERS)
+    assert index.predict("python", "import os\n\ndef add_9(a, b):") == "return a + b"
+    assert index.predict("python", "def add_9(a, b):\n    ") == "return a + b"
+    # Still typing the line, an unseen context, or another language
+    assert index.predict("python", "def add_9(a, b):\n    return a +") is None
+    assert index.predict("python", "print(x)") is None
+    assert index.predict("javascript", "def add_9(a, b):") is None
+
+def test_declines_below_the_confidence_threshold():
+    """Test that a context followed by different lines is left to the model."""
+    index = NgramIndex(min_count=3, min_confidence=0.9)
+    index.learn("javascript", "function f() {\n  return 1;\n}\n" * 3 + "function g() {\n  return 2;\n}\n" * 2)
+    assert index.predict("javascript", "function h() {\n  return 1;") == "}"
+    assert index.predict("javascript", "function h() {") is None
+
+def test_learns_accepted_lines_in_their_context():
+    """Test that an accepted line is learned after the end of the code it was suggested for."""
+    index = NgramIndex(min_count=2, min_confidence=0.9)
+    for i in range(2):
+        index.learn("python", "\n    pass\n", f"class Empty{i}(Exception):")
+    assert index.predict("python", "class Missing(Exception):") == "pass"
+    assert index.stats()["answered"] == 1
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import patch
+
+from app.ai_engine.normalize import ShingleIndex, normalize_code
+
+SCOPE = (("language", "python"),)
+
+def test_python_keys_ignore_spacing_and_comments():
+    """Test that layout and comments do not change a Python key."""
+    key = normalize_code("def add(a, b):", "python")
+    assert normalize_code("def add(a,b):  ", "python") == key
+    assert normalize_code("def add( a, b ):  # sum two numbers\n", "python") == key
+    assert normalize_code("def add(a, c):", "python") != key
+    # Indentation structure still matters
+    assert normalize_code("if x:\n    y()\nz()", "python") != normalize_code("if x:\n    y()\n    z()", "python")
+
+def test_untokenizable_python_falls_back_to_whitespace():
+    """Test that half-typed Python still gets a whitespace-insensitive key."""
+    assert normalize_code("def add(a,\n", "python") == normalize_code("def add(a,   \n", "python")
+
+def test_javascript_keys_ignore_spacing_and_comments():
+    """Test that layout and comments do not change a JavaScript key."""
+    key = normalize_code("function add(a, b) {", "javascript")
+    assert normalize_code("function add(a,b){ // sum\n", "javascript") == key
+    assert normalize_code("function  add /* a+b */ (a, b) {", "javascript") == key
+    assert normalize_code("const s = 'a  b';", "javascript") != normalize_code("const s = 'a b';", "javascript")
+
+def test_shingle_index_finds_near_duplicates():
+    """Test that a small edit finds the stored entry and a different function does not."""
+    index = ShingleIndex(threshold=0.7, k=2)
+    stored = normalize_code("def total(items, tax):\n    '''Sum the items and add tax.'''", "python")
+    index.add(SCOPE, "total", stored)
+
+    similar = normalize_code("def total(items, tax):\n    '''Sum the items, add tax.'''", "python")
+    assert index.lookup(SCOPE, similar) == "total"
+    assert index.lookup(SCOPE, normalize_code("def mean(values):", "python")) is None
+    assert index.lookup((("language", "javascript"),), similar) is None
+    assert ShingleIndex(threshold=0).lookup(SCOPE, stored) is None
+
+@pytest.mark.asyncio
+async def test_equivalent_generations_share_cache_entry():
+    """Test that reformatted input reuses the cached body under its own signature."""
+    from app.ai_engine.generation import generate_function_async, generation_cache
+    generation_cache.clear()
+    with patch("app.ai_engine.generation.async_ollama_client.generate") as mock_generate:
+        mock_generate.return_value = {"response": "```\n    return a * b\n```"}
+        first = await generate_function_async("def mul(a, b):", {"language": "python"})
+        second = await generate_function_async("def mul(a,b):  # product", {"language": "python"})
+
+    assert first == "def mul(a, b):\n    return a * b"
+    assert second == "def mul(a,b):  # product\n    return a * b"
+    assert mock_generate.call_count == 1
@@ -0,0 +1,80 @@
+import json
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.ai_engine.pool import OllamaPool, NoBackendAvailable
+from app.tests.fake_ollama import FakeOllama
+from app.main import app
+
+@pytest.fixture
+def backends():
+    servers = [FakeOllama(response="return 1").start(), FakeOllama(response="return 2").start()]
+    yield servers
+    for server in servers:
+        server.stop()
+
+@pytest.mark.asyncio
+async def test_requests_are_spread_across_backends(backends):
+    """Test least-outstanding routing over several hosts."""
+    import asyncio
+    for server in backends:
+        server.latency = 0.05
+    pool = OllamaPool([server.url for server in backends])
+
+    await asyncio.gather(*[pool.generate(model="codellama", prompt=str(i)) for i in range(8)])
+
+    assert [len(server.requests) for server in backends] == [4, 4]
+    assert all(backend["outstanding"] == 0 for backend in pool.stats())
+
+@pytest.mark.asyncio
+async def test_failed_backend_is_retried_elsewhere_and_ejected(backends):
+    """Test retry on another host and ejection after repeated failures."""
+    backends[0].fail = True
+    pool = OllamaPool([server.url for server in backends], retries=1, eject_after=2)
+
+    for _ in range(3):
+        response = await pool.generate(model="codellama", prompt="x")
+        assert response["response"] == "return 2"
+
+    assert pool.stats()[0]["healthy"] is False
+    assert len(backends[0].requests) == 2
+
+    backends[0].fail = False
+    await pool.check_health()
+    assert pool.stats()[0]["healthy"] is True
+
+@pytest.mark.asyncio
+async def test_stream_through_pool(backends):
+    """Test that streamed parts come through and release the backend slot."""
+    pool = OllamaPool([backends[0].url])
+    stream = await pool.generate(model="codellama", prompt="x", stream=True)
+    text = "".join([part["response"] async for part in stream])
+
+    assert text == "return 1"
+    assert pool.stats()[0]["outstanding"] == 0
+
+@pytest.mark.asyncio
+async def test_no_backend_available():
+    """Test the error raised when every host is unreachable."""
+    pool = OllamaPool(["http://127.0.0.1:9"], retries=1)
+    with pytest.raises(ConnectionError):
+        await pool.generate(model="codellama", prompt="x")
+    pool.backends[0].ejected_until = float("inf")
+    with pytest.raises(NoBackendAvailable):
+        await pool.generate(model="codellama", prompt="x")
+
+def test_api_through_fake_server(backends):
+    """Test the existing mock point (async_ollama_client) backed by a local fake server."""
+    from app.ai_engine.generation import generation_cache
+    generation_cache.clear()
+    backends[0].response = "```\n    return a * b\n```"
+    pool = OllamaPool([backends[0].url])
+
+    with patch("app.ai_engine.generation.async_ollama_client", pool):
+        response = TestClient(app).post(
+            "/api/ai-engine",
+            json={"action": "generate", "code": "def multiply(a, b):", "context": {"language": "python"}}
+        )
+
+    assert response.json()["data"] == {"generated_code": "def multiply(a, b):\n    return a * b"}
+    assert json.loads(json.dumps(backends[0].requests[0]))["model"] == "codellama"
@@ -0,0 +1,80 @@
+from app.ai_engine.postprocess import (
+    GenerationStreamFilter, SuggestionStreamFilter, clean_generation, clean_suggestion
+)
+from app.ai_engine.validation import check_function
+
+RESPONSES = [
+    "```python\ndef add(a, b):\n    return a + b\n```",
+    "Here is the body:\n\n```\n    total = a + b\n\n    return total\n```\nIt adds the numbers.",
+    "```\n```\n```\n    return 1\n```",
+    "Inline ``` is not a fence\n```js\n  return x;\n",
+    "    return a + b",
+    "```python\ndef add(a, b):\n    if a:\n        return a\n\n    return b\n```",
+]
+
+def test_generation_keeps_fenced_code_only():
+    """Test that prose, echoed signatures and unfenced text are dropped."""
+    assert clean_generation("def add(a, b):", RESPONSES[0], "python") == "    return a + b"
+    assert clean_generation("def add(a, b):", RESPONSES[1], "python") == "    total = a + b\n\n    return total"
+    assert clean_generation("def one():", RESPONSES[2], "python") == "    return 1"
+    assert clean_generation("function f(x) {", RESPONSES[3], "javascript") == "return x;\n}"
+    assert clean_generation("def add(a, b):", RESPONSES[4], "python") == "    return None  # Generated placeholder"
+
+def test_generation_keeps_relative_indentation():
+    """Test that nested blocks keep their indentation, one level under the signature."""
+    assert clean_generation("def add(a, b):", RESPONSES[5], "python") == "    if a:\n        return a\n\n    return b"
+    raw = "```\n        if a:\n            return a\n        return b\n```"
+    assert clean_generation("def add(a, b):", raw, "python") == "    if a:\n        return a\n    return b"
+    raw = "```js\n  if (x) {\n    return x;\n  }\n}\n```"
+    assert clean_generation("function f(x) {", raw, "javascript") == "if (x) {\n  return x;\n}\n}"
+
+def test_generation_stream_matches_whole_response():
+    """Test that every chunking of a stream gives the same body as the whole response."""
+    for raw in RESPONSES:
+        expected = clean_generation("def add(a, b):", raw, "python")
+        for size in range(1, 8):
+            stream_filter = GenerationStreamFilter("def add(a, b):", "python")
+            streamed = "".join(stream_filter.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+            assert streamed + stream_filter.finish() == expected
+
+METHOD = "class Shape:\n    def area(self):"
+METHOD_RESPONSES = [
+    "```\nif self.r:\n    return self.r ** 2\nreturn 0\n```",
+    f"```python\n{METHOD}\n        return 0\n```",
+    "no code",
+]
+
+def test_generation_indents_method_bodies_under_their_signature():
+    """Test that a method's body goes one level under its def line, not under the class."""
+    assert clean_generation(METHOD, METHOD_RESPONSES[0], "python") == (
+        "        if self.r:\n            return self.r ** 2\n        return 0"
+    )
+    for raw in METHOD_RESPONSES:
+        assert check_function(METHOD, clean_generation(METHOD, raw, "python"), "python") is None
+
+def test_generation_stream_indents_method_bodies_under_their_signature():
+    """Test that the stream filter indents a method's body like clean_generation."""
+    for raw in METHOD_RESPONSES:
+        for size in (1, 5):
+            stream_filter = GenerationStreamFilter(METHOD, "python")
+            streamed = "".join(stream_filter.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+            streamed += stream_filter.finish()
+            assert streamed == clean_generation(METHOD, raw, "python")
+            assert check_function(METHOD, streamed, "python") is None
+
+def test_suggestion_takes_first_code_line():
+    """Test that the first non-blank, non-fence line becomes the suggestion."""
+    assert clean_suggestion("```\n\n   return a + b  \n```", "python") == "    return a + b"
+    assert clean_suggestion("  return 42;\n}", "javascript") == "return 42;"
+    assert clean_suggestion("# explain\nreturn 1", "python") == "    pass  # suggested"
+    assert clean_suggestion("```\n```", "javascript") == "return null;  // Suggested placeholder"
+
+def test_suggestion_stream_stops_at_first_complete_line():
+    """Test that the stream filter reports the first usable line once it is complete."""
+    stream_filter = SuggestionStreamFilter()
+    assert stream_filter.feed("```\n  ret") is None
+    assert stream_filter.feed("urn x\nmore") == "return x"
+
+    stream_filter = SuggestionStreamFilter()
+    assert stream_filter.feed("return x") is None
+    assert stream_filter.finish() == "return x"
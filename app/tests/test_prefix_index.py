@@ -0,0 +1,57 @@
+from app.ai_engine.prefix_index import PrefixIndex
+
+SCOPE = (("language", "python"),)
+
+def test_typed_part_of_suggestion_returns_the_rest():
+    """Test that typing the start of a suggestion keeps serving its remainder."""
+    index = PrefixIndex()
+    index.insert(SCOPE, "def add(a, b):", "    return a + b")
+
+    assert index.lookup(SCOPE, "def add(a, b):\n") == "return a + b"
+    assert index.lookup(SCOPE, "def add(a, b):\n    ret") == "urn a + b"
+    assert index.lookup(SCOPE, "def add(a, b):\n  return a") == " + b"
+
+def test_diverging_or_finished_input_misses():
+    """Test that text which departs from the suggestion is not answered."""
+    index = PrefixIndex()
+    index.insert(SCOPE, "def add(a, b):", "    return a + b")
+
+    assert index.lookup(SCOPE, "def add(a, b):") is None
+    assert index.lookup(SCOPE, "def add(a, b):\n    raise") is None
+    assert index.lookup(SCOPE, "def add(a, b):\n    return a + b") is None
+    assert index.lookup((("language", "javascript"),), "def add(a, b):\n    ret") is None
+
+def test_deepest_matching_prefix_wins():
+    """Test that shared prefixes are split and the latest suggestion is used."""
+    index = PrefixIndex()
+    index.insert(SCOPE, "def f(x):", "    y = x")
+    index.insert(SCOPE, "def f(x):\n    y = x", "    return y")
+    index.insert(SCOPE, "def g(x):", "    pass")
+
+    assert index.lookup(SCOPE, "def f(x):\n    y = x\n    re") == "turn y"
+    assert index.lookup(SCOPE, "def f(x):\n    y") == " = x"
+    assert index.lookup(SCOPE, "def g(x):\n    p") == "ass"
+
+def test_lru_eviction_bounds_entries():
+    """Test that the oldest prefixes are dropped once the index is full."""
+    index = PrefixIndex(max_entries=2)
+    index.insert(SCOPE, "a = 1", "b = 2")
+    index.insert(SCOPE, "a = 3", "b = 4")
+    index.insert(SCOPE, "c = 5", "d = 6")
+
+    assert len(index) == 2
+    assert index.lookup(SCOPE, "a = 1\nb") is None
+    assert index.lookup(SCOPE, "a = 3\nb") == " = 4"
+    assert index.lookup(SCOPE, "c = 5\nd") == " = 6"
+
+def test_evicted_prefixes_are_pruned_from_split_edges():
+    """Test that evicting entries below a split edge removes their nodes, and nothing else."""
+    index = PrefixIndex(max_entries=1)
+    index.insert(SCOPE, "a = 1", "b = 2")
+    index.insert(SCOPE, "a = 3", "b = 4")
+    assert index.lookup(SCOPE, "a = 3\nb") == " = 4"
+    index.insert("other", "x = 1", "y = 2")
+
+    assert len(index) == 1
+    assert SCOPE not in index._roots
+    assert index.lookup("other", "x = 1\ny") == " = 2"
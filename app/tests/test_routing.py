@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from app.ai_engine.routing import ModelRouter, parse_routes
+
+def test_routes_by_action_and_language():
+    """Test that the most specific route wins and unrouted requests use the default."""
+    routes = parse_routes("suggestion=small, generate:javascript=js-large,generate=large")
+    router = ModelRouter(routes, default="base")
+    assert router.route("suggestion", "python") == ("small", False)
+    assert router.route("generate", "javascript") == ("js-large", False)
+    assert router.route("generate", "python") == ("large", False)
+    assert ModelRouter(default="base").route("generate", "python") == ("base", False)
+    with pytest.raises(ValueError):
+        parse_routes("complete=large")
+
+@pytest.mark.asyncio
+async def test_falls_back_while_the_large_model_is_backed_up():
+    """Test that requests go to the fallback model only while the routed one is queued up."""
+    router = ModelRouter({("generate", None): "large"}, fallback="small", fallback_wait=0.05, parallel=1)
+    await router.call("large", asyncio.sleep(0.06))
+    assert router.route("generate", "python") == ("large", False)
+
+    release = asyncio.Event()
+    calls = [asyncio.ensure_future(router.call("large", release.wait())) for _ in range(2)]
+    await asyncio.sleep(0)
+    # Two calls ahead of a new one, at ~60 ms each
+    assert router.route("generate", "python") == ("small", True)
+
+    release.set()
+    await asyncio.gather(*calls)
+    assert router.route("generate", "python") == ("large", False)
+    stats = {row["model"]: row for row in router.stats()}
+    assert stats["large"]["calls"] == 3 and stats["large"]["fallbacks"] == 1
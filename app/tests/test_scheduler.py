@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from app.ai_engine.scheduler import BatchScheduler
+
+@pytest.mark.asyncio
+async def test_requests_in_one_window_form_a_batch():
+    """Test that requests arriving within the window are dispatched together."""
+    async def dispatch(**kwargs):
+        return {"response": kwargs["prompt"]}
+
+    scheduler = BatchScheduler(dispatch, window_ms=20, max_batch=8)
+    results = await asyncio.gather(*[scheduler.submit(prompt=str(i)) for i in range(5)])
+
+    assert [r["response"] for r in results] == ["0", "1", "2", "3", "4"]
+    assert scheduler.stats()["batch_sizes"] == {5: 1}
+
+@pytest.mark.asyncio
+async def test_parallelism_is_bounded_and_errors_propagate():
+    """Test max_parallel and that a failing call only fails its own request."""
+    running = 0
+    peak = 0
+
+    async def dispatch(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if kwargs["prompt"] == "bad":
+            raise RuntimeError("model failed")
+        return {"response": "ok"}
+
+    scheduler = BatchScheduler(dispatch, window_ms=1, max_batch=4, max_parallel=2)
+    results = await asyncio.gather(
+        *[scheduler.submit(prompt="bad" if i == 3 else "good") for i in range(10)],
+        return_exceptions=True
+    )
+
+    assert peak == 2
+    assert isinstance(results[3], RuntimeError)
+    assert sum(r == {"response": "ok"} for r in results) == 9
+    assert scheduler.stats()["batch_sizes"].keys() <= {1, 2, 3, 4}
+
+@pytest.mark.asyncio
+async def test_zero_window_calls_the_model_directly():
+    """Test that batching can be switched off."""
+    async def dispatch(**kwargs):
+        return {"response": "direct"}
+
+    scheduler = BatchScheduler(dispatch, window_ms=0)
+    assert await scheduler.submit(prompt="x") == {"response": "direct"}
+    assert scheduler.stats()["batch_sizes"] == {}
+
+@pytest.mark.asyncio
+async def test_zero_window_still_bounds_parallelism():
+    """Test that max_parallel applies when batching is off, and the wait is recorded."""
+    from app.ai_engine.metrics import BATCH_WAIT_SECONDS
+    running = 0
+    peak = 0
+
+    async def dispatch(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"response": "ok"}
+
+    observed = BATCH_WAIT_SECONDS.count()
+    scheduler = BatchScheduler(dispatch, window_ms=0, max_parallel=2)
+    await asyncio.gather(*[scheduler.submit(prompt=str(i)) for i in range(6)])
+
+    assert peak == 2
+    assert BATCH_WAIT_SECONDS.count() - observed == 6
+    assert scheduler.stats()["wait_p99"] >= 0.01
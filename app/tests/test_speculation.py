@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from app.ai_engine.admission import AdmissionController
+from app.ai_engine.speculation import Speculator
+
+def make_speculator(compute, max_concurrent=4):
+    admission = AdmissionController(max_concurrent=max_concurrent)
+    return Speculator(compute, admission, enabled=True, max_load=0.5), admission
+
+@pytest.mark.asyncio
+async def test_completed_speculation_counts_as_accepted_on_hit():
+    """Test that a hit on a speculated key is counted and unused work is not."""
+    results = {}
+
+    async def compute(key):
+        results[key] = key.upper()
+        return key.upper()
+
+    speculator, _ = make_speculator(compute)
+    speculator.schedule("doc", "a", "a")
+    speculator.schedule("other", "b", "b")
+    await asyncio.sleep(0.01)
+
+    speculator.record_hit("a")
+    speculator.record_hit("a")
+    speculator.record_hit("c")
+    stats = speculator.stats()
+    assert results == {"a": "A", "b": "B"}
+    assert stats["completed"] == 2
+    assert stats["accepted"] == 1
+    assert stats["accept_rate"] == 0.5
+
+@pytest.mark.asyncio
+async def test_real_request_joins_speculation_in_flight():
+    """Test that join() waits for the running speculation instead of starting another."""
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    speculator, _ = make_speculator(compute)
+    speculator.schedule("doc", "a", "a")
+    assert await speculator.join("a") == "result"
+    assert await speculator.join("missing") is None
+    assert calls == ["a"]
+    assert speculator.stats()["accepted"] == 1
+
+@pytest.mark.asyncio
+async def test_speculation_skipped_when_busy_and_cancelled_when_stale():
+    """Test the load gate, and that a request for other code cancels the speculation."""
+    async def compute(key):
+        await asyncio.sleep(1)
+
+    speculator, admission = make_speculator(compute, max_concurrent=2)
+    admission.active = 1
+    speculator.schedule("doc", "a", "a")
+    assert speculator.stats()["skipped"] == 1
+
+    admission.active = 0
+    speculator.schedule("doc", "a", "a")
+    await asyncio.sleep(0.01)
+    speculator.supersede("doc", "a")
+    assert speculator.stats()["cancelled"] == 0
+
+    speculator.supersede("doc", "typed-something-else")
+    await asyncio.sleep(0)
+    stats = speculator.stats()
+    assert stats["cancelled"] == 1
+    assert stats["wasted_seconds"] > 0
+    assert await speculator.join("a") is None
+
+@pytest.mark.asyncio
+async def test_completed_speculation_counts_as_wasted_once_superseded():
+    """Test that an unused completed speculation is wasted when its document moves on."""
+    async def compute(key):
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    speculator, _ = make_speculator(compute)
+    speculator.schedule("doc", "a", "a")
+    await asyncio.sleep(0.05)
+    speculator.supersede("doc", "a")
+    assert speculator.stats()["wasted_seconds"] == 0
+
+    speculator.supersede("doc", "typed-something-else")
+    wasted = speculator.stats()["wasted_seconds"]
+    assert wasted > 0
+    speculator.record_hit("a")
+    assert speculator.stats()["accepted"] == 0
+
+    speculator.schedule("doc", "b", "b")
+    await asyncio.sleep(0.05)
+    speculator.schedule("doc", "c", "c")
+    assert speculator.stats()["wasted_seconds"] > wasted
+    await asyncio.sleep(0.05)
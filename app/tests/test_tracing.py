@@ -0,0 +1,59 @@
+from app.ai_engine.tracing import TraceRecorder, read_trace
+
+def record(recorder, payload, status=200, outcome=None):
+    trace = recorder.start(payload)
+    trace["o"] = outcome
+    recorder.finish(trace, status)
+
+def test_trace_round_trip(tmp_path):
+    """Test that code stored as edits against the previous request comes back whole."""
+    path = str(tmp_path / "trace.jsonl.gz")
+    payloads = [
+        {"action": "suggestion", "code": "def f(x):", "document_id": "a", "context": {"language": "python"}},
+        {"action": "suggestion", "code": "def f(x):\n    ret", "document_id": "a", "cursor_position": 17},
+        {"action": "generate", "code": "function g() {", "context": {"language": "javascript"}},
+        {"action": "suggestion", "code": "def f(y):\n    ret", "document_id": "a"},
+        {"action": "suggestion", "document_id": "a", "deltas": [{"offset": 0, "deleted": 3, "inserted": "async def"}]},
+    ]
+    recorder = TraceRecorder(path)
+    for i, payload in enumerate(payloads):
+        record(recorder, payload, outcome="model" if i % 2 else "cache")
+    recorder.close()
+
+    # A later session appends to the same file
+    recorder = TraceRecorder(path)
+    record(recorder, payloads[0], status=400)
+    recorder.close()
+
+    records = list(read_trace(path))
+    assert [r["payload"] for r in records] == payloads + payloads[:1]
+    assert [r["outcome"] for r in records] == ["cache", "model", "cache", "model", "cache", None]
+    assert records[-1]["status"] == 400
+    assert all(r["time"] >= 0 and r["latency_ms"] >= 0 for r in records)
+
+def test_truncated_trace_is_read_up_to_the_last_flush(tmp_path):
+    """Test that a trace whose writer died keeps the flushed records."""
+    path = str(tmp_path / "trace.jsonl.gz")
+    recorder = TraceRecorder(path, flush_every=2)
+    for i in range(5):
+        record(recorder, {"action": "suggestion", "code": f"def f{i}():"})
+    # Copy the file as a crash would leave it: the fifth record is still in the compressor
+    copy = str(tmp_path / "copy.jsonl.gz")
+    with open(path, "rb") as source, open(copy, "wb") as target:
+        target.write(source.read())
+    recorder.close()
+
+    assert [r["payload"]["code"] for r in read_trace(copy)] == [f"def f{i}():" for i in range(4)]
+
+def test_previous_code_is_kept_for_a_bounded_number_of_documents(tmp_path):
+    """Test that a document whose previous code was dropped is recorded in full."""
+    path = str(tmp_path / "trace.jsonl.gz")
+    recorder = TraceRecorder(path, max_documents=2)
+    payloads = [{"action": "suggestion", "code": f"def {doc}(x):{i}", "document_id": doc}
+                for i, doc in enumerate("abcab")]
+    for payload in payloads:
+        record(recorder, payload)
+    assert list(recorder._last_code) == ["a", "b"]
+    recorder.close()
+
+    assert [r["payload"] for r in read_trace(path)] == payloads
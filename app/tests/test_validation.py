@@ -0,0 +1,37 @@
+from app.ai_engine.validation import check_function, check_javascript, check_python, validate_many
+
+def test_python_errors_come_from_the_compiler():
+    """Test that Python is checked by compiling it."""
+    assert check_python("def add(a, b):\n    return a + b") is None
+    assert check_python("def add(a, b):\n    return (a + b") == "line 2: '(' was never closed"
+    assert check_python("return 1") == "line 1: 'return' outside function"
+
+def test_javascript_literals_and_brackets():
+    """Test that the JavaScript scanner accepts valid literals and finds broken ones."""
+    valid = [
+        "function f(a) {\nreturn a / 2;\n}",
+        "function f(s) {\nreturn s.replace(/[})]/g, '');\n}",
+        "function f(n) {\nreturn `${n} items ${ {a: 1}.a }`; // }\n}",
+        "function f(i) {\nreturn i++ / 2;\n}",
+    ]
+    for code in valid:
+        assert check_javascript(code) is None, code
+    assert check_javascript("function f(a) {\nreturn (a;\n}") == "line 3: unexpected '}'"
+    assert check_javascript("function f() {\nreturn 'abc;\n}") == "line 2: unterminated string"
+    assert check_javascript("function f() {\nreturn `${1}\n}") == "line 2: unterminated template literal"
+    assert check_javascript("function f() {\nreturn 1;\n") == "line 1: '{' is never closed"
+
+def test_generated_bodies_are_checked_under_their_signature():
+    """Test that a function is checked exactly as it is returned."""
+    assert check_function("def mul(a, b):", "    return a * b", "python") is None
+    assert check_function("def mul(a, b):", "return a * b", "python") is not None
+    assert check_function("def f(x):", "    if x:\n    return 1", "python") is not None
+    assert check_function("function f(a) {", "return a;\n}", "javascript") is None
+    assert check_function("fn f() {", "}}", "rust") is None
+
+def test_validate_many_in_parallel_matches_sequential():
+    """Test that the process pool gives the same results, in order."""
+    items = [("def f(x):", "    return x" if i % 3 else "    return (x", "python") for i in range(40)]
+    expected = [check_function(*item) for item in items]
+    assert validate_many(items, max_workers=1) == expected
+    assert validate_many(items, max_workers=2, chunksize=4) == expected
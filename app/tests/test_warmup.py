@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.ai_engine.utils import get_async_ollama_client
+from app.ai_engine.warmup import Readiness, readiness, warm_up
+from app.main import app
+
+class SlowToWarm:
+    """Fake pool whose first call fails and whose first probe is slow, as a cold Ollama."""
+
+    def __init__(self):
+        self.calls = []
+        self.probes = 0
+
+    async def generate_on_all(self, **kwargs):
+        self.calls.append(kwargs)
+        if len(self.calls) == 1:
+            raise ConnectionError("Ollama is starting")
+        if kwargs["prompt"]:
+            self.probes += 1
+            await asyncio.sleep(0.05 if self.probes == 1 else 0)
+        return [{"response": "", "done": True}]
+
+@pytest.mark.asyncio
+async def test_ready_once_every_model_answers_fast():
+    """Test that models are loaded with keep_alive and retried until their probe is under the limit."""
+    client = SlowToWarm()
+    state = Readiness()
+    await warm_up(client, ["small", "large"], state, keep_alive="1h", max_first_token=0.02, retry_interval=0.001)
+
+    assert state.ready
+    assert client.calls[0] == {"model": "small", "prompt": "", "keep_alive": "1h"}
+    assert all(call["keep_alive"] == "1h" for call in client.calls)
+    assert state.models["small"]["first_token_seconds"] <= 0.02
+    assert set(state.models) == {"small", "large"}
+
+def test_health_endpoints_follow_the_warmup():
+    """Test that /health/ready answers 503 until the preload is done, while /health/live is always up."""
+    released = threading.Event()
+
+    async def generate_on_all(**kwargs):
+        while not released.is_set():
+            await asyncio.sleep(0.005)
+        return []
+
+    pool = get_async_ollama_client()
+    with patch.object(config, "PRELOAD_MODELS", True), \
+         patch.object(pool, "generate_on_all", side_effect=generate_on_all, create=True), \
+         patch.object(pool, "run_health_checks", AsyncMock()):
+        with TestClient(app) as client:
+            assert client.get("/health/live").status_code == 200
+            assert client.get("/health/ready").status_code == 503
+
+            released.set()
+            deadline = time.monotonic() + 5
+            while client.get("/health/ready").status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            response = client.get("/health/ready")
+            assert response.status_code == 200
+            assert response.json()["ready"] is True
+            assert "ai_engine_ready 1" in client.get("/metrics").text
+        # Not ready for new traffic once shutting down
+        assert not readiness.ready
@@ -0,0 +1,72 @@
+"""
+Compare N sequential /api/ai-engine calls with one /api/ai-engine/batch call.
+
+The app runs in-process with a fake model that charges a fixed latency per
+call. Each round uses fresh code so nothing is served from the cache, then
+repeats the batch with half of the entries already cached.
+
+    python -m benchmarks.batch_endpoint --items 32 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.ai_engine import generation, suggestions
+from app.main import app
+
+
+def payload(i, tag):
+    if i % 2:
+        return {"action": "generate", "code": f"def {tag}_{i}(a, b):", "context": {"language": "python"}}
+    return {"action": "suggestion", "code": f"def {tag}_{i}(a, b):", "context": {"language": "python"}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    async def fake_generate(**kwargs):
+        await asyncio.sleep(args.model_latency_ms / 1000)
+        return {"response": "return a + b"}
+
+    client = TestClient(app)
+    sequential, batched, half_cached = [], [], []
+    with patch.object(suggestions.async_ollama_client, "generate", side_effect=fake_generate), \
+            patch.object(generation.async_ollama_client, "generate", side_effect=fake_generate):
+        for r in range(args.rounds):
+            start = time.perf_counter()
+            for i in range(args.items):
+                client.post("/api/ai-engine", json=payload(i, f"seq{r}"))
+            sequential.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            client.post("/api/ai-engine/batch", json={"requests": [payload(i, f"batch{r}") for i in range(args.items)]})
+            batched.append(time.perf_counter() - start)
+
+            # Half of these were answered by the previous batch
+            start = time.perf_counter()
+            client.post("/api/ai-engine/batch", json={
+                "requests": [payload(i, f"batch{r}" if i % 4 < 2 else f"mixed{r}") for i in range(args.items)]
+            })
+            half_cached.append(time.perf_counter() - start)
+
+    report = {
+        "items": args.items,
+        "sequential_ms": statistics.median(sequential) * 1000,
+        "batch_ms": statistics.median(batched) * 1000,
+        "batch_half_cached_ms": statistics.median(half_cached) * 1000,
+    }
+    report["speedup"] = report["sequential_ms"] / report["batch_ms"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
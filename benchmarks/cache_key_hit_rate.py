@@ -0,0 +1,122 @@
+"""
+Measure the generation cache hit rate with raw, normalized and near-duplicate keys.
+
+Requests are read from JSONL files of /api/ai-engine payloads (--trace) or
+synthesized from the function signatures in the given source files: each
+signature is requested several times the way editors send it, with varying
+spacing, trailing whitespace and trailing comments. The same request
+sequence is replayed against a fake model with each keying scheme.
+
+    python -m benchmarks.cache_key_hit_rate app/ai_engine/*.py
+    python -m benchmarks.cache_key_hit_rate --trace traces/session.jsonl
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+from unittest.mock import patch
+
+from app.ai_engine import generation
+from app.ai_engine.normalize import ShingleIndex
+
+_SIGNATURE = re.compile(r"^\s*((?:async\s+)?def\s+\w+\(.*\).*:|function\s+\w+\s*\(.*\)\s*\{)\s*$")
+
+
+def variants(signature, rng):
+    """Ways the same signature reaches the server from an editor."""
+    compact = re.sub(r",\s+", ",", signature)
+    spaced = re.sub(r",(?=\S)", ", ", signature)
+    comment = "//" if signature.startswith("function") else "#"
+    return [
+        signature,
+        signature + "  ",
+        compact,
+        spaced + "\n",
+        f"{signature}  {comment} TODO",
+    ][:rng.randint(1, 5)]
+
+
+def synthesized(paths, seed):
+    rng = random.Random(seed)
+    requests = []
+    for path in paths:
+        language = "javascript" if path.endswith(".js") else "python"
+        with open(path) as f:
+            for line in f:
+                match = _SIGNATURE.match(line)
+                if match:
+                    requests.extend(
+                        {"code": code, "context": {"language": language}}
+                        for code in variants(match.group(1), rng)
+                    )
+    rng.shuffle(requests)
+    return requests
+
+
+def recorded(path):
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                payload = json.loads(line)
+                payload = payload.get("payload", payload)
+                if payload.get("action") == "generate":
+                    requests.append(payload)
+    return requests
+
+
+async def replay(requests, raw_keys, threshold):
+    generation.generation_cache.clear()
+    model_calls = 0
+
+    async def fake_generate(**kwargs):
+        nonlocal model_calls
+        model_calls += 1
+        return {"response": "```\n    pass\n```"}
+
+    cache_key = generation._cache_key
+    if raw_keys:
+        cache_key = lambda code, context, language: ((code, tuple(sorted(context.items()))), code)
+
+    with patch.object(generation, "_cache_key", cache_key), \
+            patch.object(generation, "generation_near_duplicates", ShingleIndex(threshold=threshold)), \
+            patch.object(generation.async_ollama_client, "generate", side_effect=fake_generate):
+        for payload in requests:
+            await generation.generate_function_async(payload["code"], payload.get("context") or {})
+
+    return {
+        "requests": len(requests),
+        "model_calls": model_calls,
+        "hit_rate": 1 - model_calls / len(requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="source files to take function signatures from")
+    parser.add_argument("--trace", action="append", default=[], help="JSONL file of recorded requests")
+    parser.add_argument("--threshold", type=float, default=0.8, help="near-duplicate Jaccard threshold")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here as well")
+    args = parser.parse_args()
+
+    requests = synthesized(args.files, args.seed)
+    for path in args.trace:
+        requests.extend(recorded(path))
+    if not requests:
+        parser.error("give source files with function definitions or --trace")
+
+    report = {
+        "raw": asyncio.run(replay(requests, raw_keys=True, threshold=0)),
+        "normalized": asyncio.run(replay(requests, raw_keys=False, threshold=0)),
+        "near_duplicate": asyncio.run(replay(requests, raw_keys=False, threshold=args.threshold)),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
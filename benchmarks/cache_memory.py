@@ -0,0 +1,114 @@
+"""
+Measure suggestion cache memory with full-buffer keys and fingerprint keys.
+
+For each keying scheme a fresh process fills a MemoryCache (unbounded, so
+every entry stays) with --entries suggestions, each for its own --kb KB
+editor buffer (a module of small functions) with the cursor in the last
+one, as separate requests would send them. The report has the process RSS
+growth, the bytes the cache accounts for, and per-entry time to build the
+key and store, and to look a key up again:
+
+- full_buffer: the old (code, cursor_position, context) key,
+- fingerprint: app.ai_engine.suggestions._cache_key (SHA-256 of the
+  prompt's code, cut down to the token budget around the cursor, plus
+  context). Lookups are timed for full code and for
+  an open document, whose lines and imports are kept between keystrokes.
+
+    python -m benchmarks.cache_memory --entries 10000 --kb 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.context_budget import python_buffer
+
+SUGGESTIONS = ["    return a + b", "    pass", "}", "    return None", "    raise NotImplementedError"]
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def fill(scheme, entries, kb):
+    from app import config
+    from app.ai_engine import suggestions
+    from app.ai_engine.cache import MemoryCache, fingerprint
+    from app.ai_engine.documents import Document
+
+    if scheme == "full_buffer":
+        def cache_key(code, cursor_position, context):
+            return (code, cursor_position, tuple(sorted(context.items())))
+        cache = MemoryCache(max_bytes=1 << 62, ttl=0, compress_min=0)
+    else:
+        def cache_key(code, cursor_position, context):
+            return suggestions._cache_key(suggestions._prompt_code(code, cursor_position, "python"), context)
+        cache = MemoryCache(max_bytes=1 << 62, ttl=0)
+
+    base = python_buffer(kb * 1024 // 20)
+    context = {"language": "python"}
+    before = rss_bytes()
+
+    start = time.perf_counter()
+    for i in range(entries):
+        # Every request brings its own copy of the buffer
+        code = f"{base}{i}\n"
+        suggestion = SUGGESTIONS[i % len(SUGGESTIONS)]
+        # What json.loads of each response would give: a new string
+        suggestion = suggestion[:1] + suggestion[1:]
+        cache.set(cache_key(code, len(code) - 1, context), suggestion)
+    store = time.perf_counter() - start
+    grown = rss_bytes() - before
+
+    lookups = min(entries, 1000)
+    start = time.perf_counter()
+    for i in range(lookups):
+        code = f"{base}{i}\n"
+        assert cache.get(cache_key(code, len(code) - 1, context)) is not None
+    lookup = time.perf_counter() - start
+
+    report = {
+        "keys": scheme,
+        "entries": len(cache),
+        "rss_growth_mb": grown / 2 ** 20,
+        "cache_accounted_mb": cache.stats()["bytes"] / 2 ** 20,
+        "store_us_per_entry": store / entries * 1e6,
+        "lookup_us_per_entry": lookup / lookups * 1e6,
+    }
+    if scheme == "fingerprint":
+        document = Document(f"{base}0\n", "python")
+        cursor = document.size - 1
+        start = time.perf_counter()
+        for _ in range(lookups):
+            prompt_code = document.context(cursor, config.PROMPT_TOKEN_BUDGET).strip()
+            assert cache.get((fingerprint(prompt_code), tuple(sorted(context.items())))) is not None
+        report["document_lookup_us_per_entry"] = (time.perf_counter() - start) / lookups * 1e6
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--kb", type=int, default=100, help="size of each editor buffer")
+    parser.add_argument("--scheme", choices=("full_buffer", "fingerprint"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scheme:
+        print(json.dumps(fill(args.scheme, args.entries, args.kb)))
+        return
+    report = []
+    for scheme in ("full_buffer", "fingerprint"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.cache_memory", "--scheme", scheme,
+             "--entries", str(args.entries), "--kb", str(args.kb)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        report.append(json.loads(output))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Show prompt size and estimated model latency as the edited file grows.
+
+For each file size, a Python (or JavaScript) buffer of that many lines is
+synthesized with the cursor inside the last function, and the suggestion
+prompt is built with and without the token budget. Model latency is
+estimated from the prompt length with a linear prefill model
+(--base-ms + --prefill-ms-per-token * tokens); prompt building time is
+measured.
+
+    python -m benchmarks.context_budget --sizes 100 1000 5000
+"""
+import argparse
+import json
+import time
+from unittest.mock import patch
+
+from app import config
+from app.ai_engine import suggestions
+from app.ai_engine.context import estimate_tokens
+
+
+def python_buffer(lines):
+    header = "import os\nimport json\nfrom typing import List\n\n"
+    function = "def helper_{i}(items: List[int]) -> int:\n    total = 0\n    for item in items:\n        total += item * {i}\n    return total\n\n"
+    body = "".join(function.format(i=i) for i in range(max(1, lines // 6)))
+    return header + body + "class Report:\n    def render(self, rows):\n        total = 0\n        for row in rows:\n            total += "
+
+
+def javascript_buffer(lines):
+    header = "import fs from 'fs';\nconst path = require('path');\n\n"
+    function = "function helper{i}(items) {{\n  let total = 0;\n  for (const item of items) {{\n    total += item * {i};\n  }}\n  return total;\n}}\n\n"
+    body = "".join(function.format(i=i) for i in range(max(1, lines // 8)))
+    return header + body + "class Report {\n  render(rows) {\n    let total = 0;\n    for (const row of rows) {\n      total += "
+
+
+def measure(code, language, budget, args):
+    with patch.object(config, "PROMPT_TOKEN_BUDGET", budget):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            prompt = suggestions._build_prompt(suggestions._prompt_code(code, len(code), language), language)
+        build_ms = (time.perf_counter() - start) / args.repeat * 1000
+    tokens = estimate_tokens(prompt)
+    return {
+        "prompt_tokens": tokens,
+        "build_ms": build_ms,
+        "estimated_model_ms": args.base_ms + args.prefill_ms_per_token * tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2500, 5000])
+    parser.add_argument("--language", choices=["python", "javascript"], default="python")
+    parser.add_argument("--budget", type=int, default=config.PROMPT_TOKEN_BUDGET)
+    parser.add_argument("--base-ms", type=float, default=50)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    make_buffer = python_buffer if args.language == "python" else javascript_buffer
+    report = []
+    for size in args.sizes:
+        code = make_buffer(size)
+        report.append({
+            "lines": code.count("\n") + 1,
+            "full_file": measure(code, args.language, 0, args),
+            "budgeted": measure(code, args.language, args.budget, args),
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
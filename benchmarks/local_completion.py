@@ -0,0 +1,126 @@
+"""
+Measure how much suggestion traffic the local n-gram index answers, how
+often it is right, and the latency of both paths.
+
+Source files (default: this repository's Python code) are split by file
+into an indexed share and a held-out share. Requests are suggestions at the
+end of random lines of the held-out files, sent one at a time in-process;
+the fake model takes --model-ms and answers with the real next line. For
+each --confidence threshold (and "off", the index disabled) the report has
+the share of requests answered locally, the share of those that equal the
+real next line, and p50/p99 latency of the local and model paths. With
+--learn-accepted every model answer is learned as if the user accepted it.
+
+    python -m benchmarks.local_completion --requests 1000 --confidence 0.8 0.9 0.95
+"""
+import argparse
+import asyncio
+import glob
+import json
+import random
+import time
+import zlib
+from unittest.mock import patch
+
+from app.ai_engine import suggestions
+from app.ai_engine.metrics import LOCAL_COMPLETIONS
+from benchmarks.suite import percentile, reset
+
+
+def split_files(patterns, test_share):
+    train, test = [], []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            # Stable split, independent of the order files are listed in
+            held_out = zlib.crc32(path.encode()) % 1000 < test_share * 1000
+            (test if held_out else train).append(path)
+    return train, test
+
+
+def workload(paths, count, rng):
+    """(code, next line) pairs at the end of lines followed by a code line."""
+    positions = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        for i in range(len(lines) - 1):
+            following = lines[i + 1].strip()
+            if lines[i].strip() and following and "#" not in following:
+                positions.append(("\n".join(lines[:i + 1]), following))
+    rng.shuffle(positions)
+    return positions[:count]
+
+
+async def run_setting(confidence, train, requests, args):
+    reset()
+    index = suggestions.suggestion_ngrams
+    index.clear()
+    index.enabled = confidence is not None
+    index.min_confidence = confidence or 0.0
+    index.min_count = args.min_count
+    if index.enabled:
+        index.index_files(train)
+
+    expected = None
+
+    async def oracle(**kwargs):
+        await asyncio.sleep(args.model_ms / 1000)
+        return {"response": expected}
+
+    latencies = {"local": [], "model": []}
+    correct = 0
+    with patch.object(suggestions.async_ollama_client, "generate", side_effect=oracle):
+        for code, expected in requests:
+            served = LOCAL_COMPLETIONS.value(result="served", language="python")
+            start = time.perf_counter()
+            suggestion = await suggestions.suggest_code_async(code, None, {"language": "python"})
+            elapsed = time.perf_counter() - start
+            if LOCAL_COMPLETIONS.value(result="served", language="python") > served:
+                latencies["local"].append(elapsed)
+                correct += suggestion.strip() == expected
+            else:
+                latencies["model"].append(elapsed)
+                if args.learn_accepted and index.enabled:
+                    suggestions._on_accepted((None, "python", code[-1024:], suggestion))
+
+    local = latencies["local"]
+    return {
+        "confidence": confidence if confidence is not None else "off",
+        "contexts": len(index),
+        "local_share": len(local) / len(requests),
+        "local_accuracy": correct / len(local) if local else None,
+        "local_p50_us": percentile(local, 50) * 1e6 if local else None,
+        "local_p99_us": percentile(local, 99) * 1e6 if local else None,
+        "model_p50_ms": percentile(latencies["model"], 50) * 1000 if latencies["model"] else None,
+        "model_p99_ms": percentile(latencies["model"], 99) * 1000 if latencies["model"] else None,
+        "mean_ms": sum(local + latencies["model"]) / len(requests) * 1000,
+    }
+
+
+async def run(args):
+    train, test = split_files(args.files or ["app/**/*.py", "benchmarks/*.py"], args.test_share)
+    requests = workload(test, args.requests, random.Random(args.seed))
+    settings = [None] + args.confidence
+    try:
+        return [await run_setting(confidence, train, requests, args) for confidence in settings]
+    finally:
+        suggestions.suggestion_ngrams.clear()
+        suggestions.suggestion_ngrams.enabled = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="glob patterns of Python source files")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--test-share", type=float, default=0.3, help="share of files held out for requests")
+    parser.add_argument("--confidence", type=float, nargs="+", default=[0.8, 0.9, 0.95])
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--model-ms", type=float, default=20)
+    parser.add_argument("--learn-accepted", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Compare model routing setups on a mixed suggestion/generation workload.
+
+The app runs in-process against a fake Ollama serving two models: a small
+one answering in --small-ms and a large one in --large-ms, each running
+--parallel calls at once and queueing the rest (as Ollama does per model).
+Requests from the benchmarks.suite cases arrive open loop at --rate per
+second. Three setups are run from empty caches:
+
+- single: every request uses the large model (the old hard-coded model),
+- routed: suggestions use the small model, generations the large one,
+- routed_fallback: as routed, but generations go to the small model while
+  the large one's estimated queue wait is over --fallback-ms.
+
+Per setup the report has p50/p95 latency by action (of the requests that
+were not rejected; see statuses for 429s), model calls per model
+and the router's per-model stats (latency, fallbacks, suggestion accept
+rate).
+
+    python -m benchmarks.model_routing --rate 100 --requests 600
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+
+import httpx
+
+from app.ai_engine.routing import model_router
+from app.ai_engine.utils import get_async_ollama_client
+from app.main import app
+from benchmarks.suite import percentile, reset, workload
+
+
+class TieredModel:
+    """
+    Fake Ollama with per-model latency and a per-model limit on calls running at once.
+    """
+
+    def __init__(self, latencies, parallel):
+        self.latencies = latencies
+        self.parallel = parallel
+        self.calls = collections.Counter()
+        self._slots = {}
+
+    async def generate(self, model=None, prompt="", **kwargs):
+        slots = self._slots.get(model)
+        if slots is None:
+            slots = self._slots[model] = asyncio.Semaphore(self.parallel)
+        async with slots:
+            await asyncio.sleep(self.latencies[model])
+        self.calls[model] += 1
+        return {"model": model, "response": f"```\n    return {model.replace('-', '_')}({len(prompt)})\n```", "done": True}
+
+
+async def run_setup(name, routes, fallback_wait, args):
+    reset()
+    model_router.routes = routes
+    model_router.fallback = "small"
+    model_router.fallback_wait = fallback_wait
+    model_router.parallel = args.parallel
+    model_router.clear()
+
+    model = TieredModel({"small": args.small_ms / 1000, "large": args.large_ms / 1000}, args.parallel)
+    pool = get_async_ollama_client()
+    original = pool.generate
+    pool.generate = model.generate
+    rng = random.Random(args.seed)
+    requests = workload(args.unique, args.requests, rng)
+    latencies = collections.defaultdict(list)
+    statuses = collections.Counter()
+
+    async def send(client, payload, scheduled):
+        response = await client.post("/api/ai-engine", json=payload)
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies[payload["action"]].append(time.perf_counter() - scheduled)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                     limits=limits, timeout=120) as client:
+            tasks = []
+            start = time.perf_counter()
+            at = 0.0
+            for payload in requests:
+                at += rng.expovariate(args.rate)
+                delay = start + at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(send(client, payload, start + at)))
+            await asyncio.gather(*tasks)
+    finally:
+        pool.generate = original
+
+    return {
+        "setup": name,
+        **{
+            f"{action}_{q}_ms": percentile(values, q_value) * 1000
+            for action, values in sorted(latencies.items())
+            for q, q_value in (("p50", 50), ("p95", 95))
+        },
+        "statuses": dict(statuses),
+        "model_calls": dict(model.calls),
+        "models": model_router.stats(),
+    }
+
+
+async def run(args):
+    setups = [
+        ("single", {}, 0),
+        ("routed", {("suggestion", None): "small"}, 0),
+        ("routed_fallback", {("suggestion", None): "small"}, args.fallback_ms / 1000),
+    ]
+    default = model_router.default
+    model_router.default = "large"
+    try:
+        return [await run_setup(name, routes, wait, args) for name, routes, wait in setups]
+    finally:
+        model_router.default = default
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=100)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--unique", type=int, default=400, help="distinct requests in the workload")
+    parser.add_argument("--small-ms", type=float, default=20)
+    parser.add_argument("--large-ms", type=float, default=150)
+    parser.add_argument("--parallel", type=int, default=4, help="calls each model runs at once")
+    parser.add_argument("--fallback-ms", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
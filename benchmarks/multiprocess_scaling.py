@@ -0,0 +1,115 @@
+"""
+Measure cache-hit throughput of `python -m app.server` by worker count.
+
+For each worker count the server is started against a fake Ollama, a set of
+suggestion requests is sent once to fill the shared cache, and then
+--clients client processes replay them for --seconds. Every measured request
+is a cache hit (most from the workers' local tier, the rest from the
+coordinator), so throughput should grow about linearly with workers until
+the cores run out. Run it on a machine with at least workers + clients cores.
+
+    python -m benchmarks.multiprocess_scaling --workers 1 2 4 8 --clients 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.tests.fake_ollama import FakeOllama
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def payload(i):
+    return {"action": "suggestion", "code": f"def handler_{i}(request):", "context": {"language": "python"}}
+
+
+def wait_ready(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/metrics", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+def client(url, keys, seconds, results):
+    count = 0
+    with httpx.Client(base_url=url, timeout=10) as http:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            response = http.post("/api/ai-engine", json=payload(count % keys))
+            response.raise_for_status()
+            count += 1
+    results.put(count)
+
+
+def measure(workers, fake, args):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "AI_ENGINE_OLLAMA_HOSTS": fake.url}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    try:
+        wait_ready(url)
+        with httpx.Client(base_url=url, timeout=30) as http:
+            for i in range(args.keys):
+                http.post("/api/ai-engine", json=payload(i)).raise_for_status()
+        model_calls = len(fake.requests)
+
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=client, args=(url, args.keys, args.seconds, results))
+            for _ in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        total = sum(results.get() for _ in clients)
+        for process in clients:
+            process.join()
+        return {
+            "workers": workers,
+            "requests_per_second": total / args.seconds,
+            # Anything above zero means a hit missed the shared cache
+            "model_calls_during_load": len(fake.requests) - model_calls,
+        }
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    fake = FakeOllama(response="    return handle(request)").start()
+    try:
+        report = [measure(workers, fake, args) for workers in args.workers]
+    finally:
+        fake.stop()
+    base = report[0]["requests_per_second"] / report[0]["workers"]
+    for row in report:
+        row["scaling_efficiency"] = row["requests_per_second"] / (row["workers"] * base)
+    print(json.dumps({"cpus": os.cpu_count(), "clients": args.clients, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
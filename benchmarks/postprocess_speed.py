@@ -0,0 +1,184 @@
+"""
+Compare the shared output cleaning against the original per-engine loops.
+
+Replays a corpus of raw Ollama responses (JSONL with "action", "code",
+"language" and "response"; benchmarks/data/raw_outputs.jsonl by default)
+through both implementations, checks that every result is identical
+(generated bodies apart from indentation, which the original code stripped),
+including the streaming filters fed in random chunks, and reports the time
+per response. --scale repeats the code inside the first fence of each
+generation to imitate long outputs.
+
+    python -m benchmarks.postprocess_speed --scale 50
+"""
+import argparse
+import json
+import os
+import random
+import timeit
+
+from app.ai_engine.postprocess import (
+    GenerationStreamFilter, SuggestionStreamFilter, clean_generation, clean_suggestion
+)
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "raw_outputs.jsonl")
+
+
+def legacy_generation(code, raw, language):
+    """generation._postprocess before the shared module, minus the signature."""
+    generated_code = raw.strip()
+    lines = generated_code.split("\n")
+    code_lines = []
+    in_code_block = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith("```"):
+            in_code_block = not in_code_block
+            continue
+        if not in_code_block and (line.startswith("#") or line.startswith("//") or not line):
+            continue
+        if not in_code_block and not line.startswith(" ") and not line.startswith("\t"):
+            continue
+        code_lines.append(line)
+    generated_code = "\n".join(code_lines).strip()
+
+    if not generated_code or generated_code.isspace():
+        if language == "python":
+            generated_code = "    return None  # Generated placeholder"
+        elif language == "javascript":
+            generated_code = "    return null;  // Generated placeholder\n}"
+        else:
+            generated_code = "// Generated code for unsupported language"
+    else:
+        code_stripped = code.strip()
+        if generated_code.startswith(code_stripped):
+            generated_code = generated_code[len(code_stripped):].strip()
+        if language == "javascript" and not generated_code.endswith("}"):
+            generated_code = f"{generated_code}\n}}"
+    return generated_code
+
+
+def legacy_suggestion(raw, language):
+    """suggestions._parse_suggestion before the shared module."""
+    lines = raw.strip().split("\n")
+    suggestion_lines = []
+    in_code_block = False
+    for line in lines:
+        if line.strip() == "```":
+            in_code_block = not in_code_block
+        elif in_code_block and line.strip():
+            suggestion_lines.append(line.strip())
+        elif not in_code_block and line.strip():
+            suggestion_lines.append(line.strip())
+    suggestion = suggestion_lines[0] if suggestion_lines else ""
+    if language == "python" and suggestion:
+        suggestion = "    " + suggestion
+    if not suggestion or "#" in suggestion:
+        suggestion = {
+            "python": "    pass  # suggested",
+            "javascript": "return null;  // Suggested placeholder",
+        }.get(language, "// Suggestion for unsupported language")
+    return suggestion
+
+
+def lengthen(raw, scale):
+    """Repeat the code lines of the first fenced block, keeping the prose around it."""
+    start = raw.find("```")
+    if start == -1:
+        return raw
+    start = raw.find("\n", start) + 1
+    end = raw.find("```", start)
+    if start == 0 or end == -1:
+        return raw
+    return raw[:start] + raw[start:end] * scale + raw[end:]
+
+
+def load(path, scale):
+    rows = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row["action"] == "generate" and scale > 1:
+                    row["response"] = lengthen(row["response"], scale)
+                rows.append(row)
+    return rows
+
+
+def unindented(body):
+    return "\n".join(line.strip() for line in body.split("\n"))
+
+
+def chunks(text, rng):
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        yield text[i:i + size]
+        i += size
+
+
+def check(rows, rng):
+    """Return the rows where the implementations disagree."""
+    mismatches = []
+    for row in rows:
+        code, raw, language = row["code"], row["response"], row["language"]
+        if row["action"] == "generate":
+            expected = legacy_generation(code, raw, language)
+            stream_filter = GenerationStreamFilter(code, language)
+            streamed = "".join(stream_filter.feed(c) for c in chunks(raw, rng)) + stream_filter.finish()
+            cleaned = clean_generation(code, raw, language)
+            if streamed != cleaned or unindented(cleaned) != unindented(expected):
+                mismatches.append({"row": row, "expected": expected, "got": (cleaned, streamed)})
+            continue
+        else:
+            expected = legacy_suggestion(raw, language)
+            stream_filter = SuggestionStreamFilter()
+            first = None
+            for c in chunks(raw, rng):
+                first = stream_filter.feed(c)
+                if first is not None:
+                    break
+            streamed = clean_suggestion(first if first is not None else stream_filter.finish(), language)
+            results = (clean_suggestion(raw, language), streamed)
+        if any(result != expected for result in results):
+            mismatches.append({"row": row, "expected": expected, "got": results})
+    return mismatches
+
+
+def timed(fn, rows, number):
+    return min(timeit.repeat(lambda: [fn(row) for row in rows], number=number, repeat=5)) / (number * len(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = load(args.corpus, args.scale)
+    generations = [row for row in rows if row["action"] == "generate"]
+    suggestions = [row for row in rows if row["action"] != "generate"]
+    mismatches = check(rows, random.Random(args.seed))
+
+    report = {"responses": len(rows), "mismatches": mismatches}
+    for name, subset, legacy, shared in (
+        ("generate", generations,
+         lambda r: legacy_generation(r["code"], r["response"], r["language"]),
+         lambda r: clean_generation(r["code"], r["response"], r["language"])),
+        ("suggestion", suggestions,
+         lambda r: legacy_suggestion(r["response"], r["language"]),
+         lambda r: clean_suggestion(r["response"], r["language"])),
+    ):
+        if subset:
+            before = timed(legacy, subset, args.number)
+            after = timed(shared, subset, args.number)
+            report[name] = {"legacy_us": before * 1e6, "shared_us": after * 1e6, "speedup": before / after}
+    print(json.dumps(report, indent=2))
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measure how many model calls the suggestion prefix index saves while typing.
+
+Each trace is a sequence of suggestion requests for one buffer, one per
+keystroke. Traces are read from JSONL files of /api/ai-engine payloads
+(--trace, one payload per line, grouped by "document_id" when present) or
+synthesized by typing the given source files character by character. The
+model is replaced by an oracle that answers with the text the user goes on
+to type, so the numbers reflect the best case for reuse.
+
+    python -m benchmarks.prefix_cache_hits app/ai_engine/*.py
+    python -m benchmarks.prefix_cache_hits --trace traces/session.jsonl
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from unittest.mock import patch
+
+from app.ai_engine import suggestions
+from app.ai_engine.prefix_index import PrefixIndex
+
+
+def typing_trace(path, language, max_chars):
+    with open(path) as f:
+        text = f.read()[:max_chars]
+    return [
+        {"code": text[:i], "cursor_position": i, "context": {"language": language}}
+        for i in range(1, len(text) + 1)
+    ]
+
+
+def recorded_traces(path):
+    traces = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                payload = json.loads(line)
+                payload = payload.get("payload", payload)
+                if payload.get("action", "suggestion") == "suggestion":
+                    traces[payload.get("document_id")].append(payload)
+    return list(traces.values())
+
+
+def oracle(final, cursor):
+    """The text the user goes on to type: rest of this line, or the next line."""
+    line_end = final.find("\n", cursor)
+    current = final[cursor:] if line_end == -1 else final[cursor:line_end]
+    if current.strip() or line_end == -1:
+        return current
+    following = [line for line in final[line_end + 1:].split("\n") if line.strip()]
+    return following[0] if following else ""
+
+
+async def replay(traces, index):
+    suggestions.suggestion_cache.clear()
+    model_calls = 0
+    requests = 0
+    state = {}
+
+    async def fake_generate(**kwargs):
+        nonlocal model_calls
+        model_calls += 1
+        return {"response": oracle(state["final"], state["cursor"])}
+
+    with patch.object(suggestions, "suggestion_prefix_index", index), \
+            patch.object(suggestions.async_ollama_client, "generate", side_effect=fake_generate):
+        for trace in traces:
+            state["final"] = trace[-1]["code"]
+            for payload in trace:
+                cursor = payload.get("cursor_position")
+                state["cursor"] = len(payload["code"]) if cursor is None else cursor
+                requests += 1
+                await suggestions.suggest_code_async(
+                    payload["code"], cursor, payload.get("context") or {}
+                )
+    return {"requests": requests, "model_calls": model_calls, **index.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="source files to type character by character")
+    parser.add_argument("--trace", action="append", default=[], help="JSONL file of recorded requests")
+    parser.add_argument("--language", default="python")
+    parser.add_argument("--max-chars", type=int, default=2000)
+    parser.add_argument("--output", help="write the JSON report here as well")
+    args = parser.parse_args()
+
+    traces = [typing_trace(path, args.language, args.max_chars) for path in args.files]
+    for path in args.trace:
+        traces.extend(recorded_traces(path))
+    traces = [trace for trace in traces if trace]
+    if not traces:
+        parser.error("give at least one source file or --trace")
+
+    baseline = asyncio.run(replay(traces, PrefixIndex(max_entries=0)))
+    indexed = asyncio.run(replay(traces, PrefixIndex(max_entries=1000)))
+    report = {
+        "baseline": baseline,
+        "prefix_index": indexed,
+        "model_call_reduction": 1 - indexed["model_calls"] / baseline["model_calls"] if baseline["model_calls"] else 0.0,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
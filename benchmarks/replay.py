@@ -0,0 +1,140 @@
+"""
+Replay recorded /api/ai-engine traffic (see AI_ENGINE_TRACE_PATH).
+
+Requests from one or more trace files are merged by arrival time and sent
+open loop at their original spacing divided by --speed (--speed 0 sends
+them all at once). Latency counts from each request's scheduled time. By
+default the app runs in-process against the fake model of
+benchmarks.suite (--model-latency-ms, --tokens-per-second, --tokens), so a
+change to caching, batching or scheduling can be measured on the recorded
+workload without Ollama; --url replays against a running server instead.
+
+The report puts the replayed p50/p95/p99 latency, throughput and status
+codes next to the recorded ones, with the recorded answer sources
+(cache, prefix, model, ...) and, in-process, the cache hit rate and number
+of model calls.
+
+    python -m benchmarks.replay traces/ai_engine.*.jsonl.gz --speed 2
+"""
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import httpx
+
+from app.ai_engine.tracing import read_trace
+from benchmarks.suite import FakeModel, cache_counts, percentile, reset
+
+
+def load(paths, limit):
+    records = [record for path in paths for record in read_trace(path)]
+    records.sort(key=lambda record: record["time"])
+    return records[:limit] if limit else records
+
+
+def summary(latencies_ms, elapsed):
+    return {
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "throughput_rps": len(latencies_ms) / elapsed if elapsed > 0 else None,
+    }
+
+
+async def replay(client, records, speed):
+    latencies, statuses = [], collections.Counter()
+
+    async def send(payload, scheduled):
+        if payload.get("stream"):
+            async with client.stream("POST", "/api/ai-engine", json=payload) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+        else:
+            response = await client.post("/api/ai-engine", json=payload)
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        statuses[response.status_code] += 1
+
+    tasks = []
+    first = records[0]["time"]
+    start = time.perf_counter()
+    for record in records:
+        scheduled = start + ((record["time"] - first) / speed if speed > 0 else 0)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(record["payload"], scheduled)))
+    await asyncio.gather(*tasks)
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def run(args, records):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120) as client:
+            return await replay(client, records, args.speed), {}
+
+    from app.ai_engine.utils import get_async_ollama_client
+    from app.main import app
+
+    model = FakeModel(args.model_latency_ms, args.tokens_per_second, args.tokens)
+    pool = get_async_ollama_client()
+    original = pool.generate
+    pool.generate = model.generate
+    reset()
+    hits_before, misses_before = cache_counts()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay",
+                                     limits=limits, timeout=120) as client:
+            result = await replay(client, records, args.speed)
+    finally:
+        pool.generate = original
+    hits, misses = cache_counts()
+    lookups = (hits - hits_before) + (misses - misses_before)
+    return result, {
+        "cache_hit_rate": (hits - hits_before) / lookups if lookups else 0.0,
+        "model_calls": model.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traces", nargs="+")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale; 2 replays twice as fast, 0 all at once")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N requests")
+    parser.add_argument("--url", help="replay against this server instead of in-process")
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    parser.add_argument("--tokens-per-second", type=float, default=2000)
+    parser.add_argument("--tokens", type=int, default=16)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    records = load(args.traces, args.limit)
+    if not records:
+        raise SystemExit("No requests in the trace.")
+    (latencies, statuses, elapsed), engine = asyncio.run(run(args, records))
+
+    span = records[-1]["time"] - records[0]["time"]
+    report = {
+        "requests": len(records),
+        "speed": args.speed,
+        "recorded": {
+            **summary([r["latency_ms"] for r in records], span),
+            "statuses": dict(collections.Counter(r["status"] for r in records)),
+            "outcomes": dict(collections.Counter(r["outcome"] or "none" for r in records)),
+        },
+        "replayed": {
+            **summary(latencies, elapsed),
+            "statuses": dict(statuses),
+            **engine,
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare suggestion latency and throughput with and without batching.
+
+Runs suggest_code_async against a fake model that charges a fixed latency
+per call and serves at most --model-slots calls at once (like
+OLLAMA_NUM_PARALLEL), first calling the model once per request and then
+through the BatchScheduler with the given window.
+
+    python -m benchmarks.scheduler_latency --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from app.ai_engine import suggestions
+from app.ai_engine.scheduler import BatchScheduler
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def run(scheduler, args):
+    suggestions.suggestion_cache.clear()
+    suggestions.suggestion_prefix_index.clear()
+    slots = asyncio.Semaphore(args.model_slots)
+
+    async def fake_generate(**kwargs):
+        async with slots:
+            await asyncio.sleep(args.model_latency_ms / 1000)
+        return {"response": "return a + b"}
+
+    latencies = []
+    counter = iter(range(args.requests))
+
+    async def client():
+        for i in counter:
+            start = time.perf_counter()
+            await suggestions.suggest_code_async(f"def f_{i}(a, b):", None, {"language": "python"})
+            latencies.append(time.perf_counter() - start)
+
+    with patch.object(suggestions, "suggestion_scheduler", scheduler), \
+            patch.object(suggestions.async_ollama_client, "generate", side_effect=fake_generate):
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput_rps": len(latencies) / elapsed,
+        "scheduler": scheduler.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    parser.add_argument("--model-slots", type=int, default=16)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-parallel", type=int, default=64)
+    args = parser.parse_args()
+
+    dispatch = lambda **kwargs: suggestions.async_ollama_client.generate(**kwargs)
+    report = {
+        "direct": asyncio.run(run(BatchScheduler(dispatch, window_ms=0), args)),
+        "batched": asyncio.run(run(
+            BatchScheduler(dispatch, window_ms=args.window_ms, max_batch=args.max_batch, max_parallel=args.max_parallel),
+            args
+        )),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure how long the app takes to import and to become ready for traffic.
+
+import: `import app.main` in a fresh interpreter, --imports times; the
+report has the median and fastest run in ms.
+
+Then, for preload on and off, a uvicorn server is started against a fake
+Ollama that takes --load-ms to load a model on its first call (as a cold
+Ollama does) and the report gives, from process start:
+
+- live_ms: /health/live answers,
+- ready_ms: /health/ready answers 200 (what a load balancer waits for),
+- first_request_ms: latency of the first suggestion sent once ready.
+
+With preload off the server is ready at once and the first user pays the
+model load; with it on that cost moves before readiness.
+
+    python -m benchmarks.startup --imports 10 --load-ms 3000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.tests.fake_ollama import FakeOllama
+from benchmarks.multiprocess_scaling import free_port
+
+
+def import_ms():
+    code = "import time; s = time.perf_counter(); import app.main; print(time.perf_counter() - s)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output) * 1000
+
+
+def wait_for(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer 200")
+
+
+def startup(preload, args):
+    fake = FakeOllama(response="    return handle(request)", load_latency=args.load_ms / 1000).start()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "AI_ENGINE_OLLAMA_HOSTS": fake.url, "AI_ENGINE_PRELOAD": str(int(preload))}
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for(f"{url}/health/live")
+        live = time.perf_counter() - start
+        wait_for(f"{url}/health/ready")
+        ready = time.perf_counter() - start
+        payload = {"action": "suggestion", "code": "def handler(request):", "context": {"language": "python"}}
+        sent = time.perf_counter()
+        httpx.post(f"{url}/api/ai-engine", json=payload, timeout=60).raise_for_status()
+        first = time.perf_counter() - sent
+    finally:
+        server.terminate()
+        server.wait(10)
+        fake.stop()
+    return {
+        "preload": preload,
+        "live_ms": live * 1000,
+        "ready_ms": ready * 1000,
+        "first_request_ms": first * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=10, help="fresh interpreters to time the import in")
+    parser.add_argument("--load-ms", type=float, default=3000, help="model load time of the fake Ollama")
+    args = parser.parse_args()
+
+    imports = [import_ms() for _ in range(args.imports)]
+    report = {
+        "import_median_ms": statistics.median(imports),
+        "import_min_ms": min(imports),
+        "startup": [startup(preload, args) for preload in (False, True)],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Reproducible offline benchmark of the /api/ai-engine endpoint.
+
+The app runs in-process (httpx over ASGI, no network and no Ollama) against
+a deterministic fake model that answers after --model-latency-ms plus
+--tokens / --tokens-per-second. Requests are drawn, with a fixed seed, from
+--unique variants of a set of Python and JavaScript suggestion/generation
+cases, so the cache hit rate is the same on every run.
+
+Each scenario starts with empty caches and runs either closed loop (a fixed
+number of concurrent clients, --concurrency) or open loop (Poisson arrivals
+at a fixed rate, --rates; latency counts from the scheduled arrival, so a
+slow server is not hidden by a slow client). Per scenario the report has
+p50/p95/p99 latency, throughput, cache hit rate, model calls, process
+CPU time per request (client included) and the share of generated
+functions that parse (checked in parallel, in-process; --validate-workers). It is written as JSON to --output;
+--compare prints the change against an earlier report.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --output new.json --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+import zlib
+
+import httpx
+
+from app.ai_engine import generation, suggestions
+from app.ai_engine.utils import get_async_ollama_client
+from app.ai_engine.validation import validate_many
+from app.main import app
+
+CASES = [
+    {"action": "suggestion", "code": "def add(a, b):", "context": {"language": "python"}, "cursor_position": 13},
+    {"action": "suggestion", "code": "def factorial(n):", "context": {"language": "python"}, "cursor_position": 17},
+    {"action": "suggestion", "code": "def is_even(num):", "context": {"language": "python"}, "cursor_position": 16},
+    {"action": "suggestion", "code": "def do_nothing():", "context": {"language": "python"}, "cursor_position": 16},
+    {"action": "generate", "code": "def sum_list(lst):", "context": {"language": "python"}},
+    {"action": "generate", "code": "def is_palindrome(s):", "context": {"language": "python"}},
+    {"action": "suggestion", "code": "function greet(name) {", "context": {"language": "javascript"}, "cursor_position": 22},
+    {"action": "suggestion", "code": "function isEven(num) {", "context": {"language": "javascript"}, "cursor_position": 21},
+    {"action": "generate", "code": "function sum(a, b) {", "context": {"language": "javascript"}},
+    {"action": "generate", "code": "function reverseString(str) {", "context": {"language": "javascript"}},
+    {"action": "generate", "code": "function factorial(n) {", "context": {"language": "javascript"}},
+]
+
+
+class FakeModel:
+    """
+    Stand-in for the Ollama pool: the same prompt always gets the same
+    fenced answer of `tokens` words, after latency + tokens / rate seconds
+    (streamed at that rate when asked).
+    """
+
+    def __init__(self, latency_ms, tokens_per_second, tokens):
+        self.latency = latency_ms / 1000
+        self.token_time = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        self.tokens = tokens
+        self.calls = 0
+
+    def _words(self, prompt):
+        seed = zlib.crc32(prompt.encode())
+        words = [f"v{(seed >> (i % 24)) % 97}" for i in range(self.tokens)]
+        lines = ["    return " + " + ".join(words[i:i + 8]) for i in range(0, len(words), 8)]
+        return ["```\n"] + [line + "\n" for line in lines] + ["```"]
+
+    async def generate(self, model=None, prompt="", stream=False, **kwargs):
+        self.calls += 1
+        parts = self._words(prompt)
+        if stream:
+            return self._stream(parts)
+        await asyncio.sleep(self.latency + self.tokens * self.token_time)
+        return {"model": model, "response": "".join(parts), "done": True}
+
+    async def _stream(self, parts):
+        await asyncio.sleep(self.latency)
+        for part in parts:
+            await asyncio.sleep(self.token_time * part.count(" + ") or 0)
+            yield {"response": part, "done": False}
+        yield {"response": "", "done": True}
+
+
+def variant(case, k):
+    """Case k of a family: the same code with a different function name."""
+    payload = dict(case)
+    payload["code"] = case["code"].replace("(", f"_{k}(", 1)
+    if "cursor_position" in payload:
+        payload["cursor_position"] = len(payload["code"])
+    return payload
+
+
+def workload(unique, count, rng):
+    pool = [variant(CASES[i % len(CASES)], i // len(CASES)) for i in range(unique)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def reset():
+    for cache in (suggestions.suggestion_cache, generation.generation_cache):
+        cache.clear()
+    suggestions.suggestion_prefix_index.clear()
+    generation.generation_near_duplicates.clear()
+
+
+def cache_counts():
+    hits = misses = 0
+    for cache in (suggestions.suggestion_cache, generation.generation_cache):
+        stats = cache.stats()
+        hits += stats["hits"]
+        misses += stats["misses"]
+    return hits, misses
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def send(client, payload, started, latencies, responses):
+    response = await client.post("/api/ai-engine", json=payload)
+    latencies.append(time.perf_counter() - started)
+    responses.append((payload, response))
+
+
+async def closed_loop(client, requests, concurrency, latencies, responses):
+    pending = iter(requests)
+
+    async def worker():
+        for payload in pending:
+            await send(client, payload, time.perf_counter(), latencies, responses)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+async def open_loop(client, requests, rate, rng, latencies, responses):
+    tasks = []
+    start = time.perf_counter()
+    at = 0.0
+    for payload in requests:
+        at += rng.expovariate(rate)
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(client, payload, start + at, latencies, responses)))
+    await asyncio.gather(*tasks)
+
+
+def valid_rate(responses, workers):
+    """Share of successful generations whose function parses."""
+    items = []
+    for payload, response in responses:
+        if payload["action"] == "generate" and response.status_code == 200:
+            code = payload["code"]
+            body = response.json()["data"]["generated_code"][len(code) + 1:]
+            items.append((code, body, payload["context"]["language"]))
+    if not items:
+        return None
+    errors = validate_many(items, max_workers=workers)
+    return sum(error is None for error in errors) / len(items)
+
+
+async def scenario(client, model, name, args, run):
+    reset()
+    rng = random.Random(args.seed)
+    requests = workload(args.unique, args.requests, rng)
+    latencies, responses = [], []
+    hits_before, misses_before = cache_counts()
+    calls_before = model.calls
+    cpu_before = time.process_time()
+    start = time.perf_counter()
+    await run(requests, rng, latencies, responses)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_before
+    hits, misses = cache_counts()
+    lookups = (hits - hits_before) + (misses - misses_before)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": sum(response.status_code != 200 for _, response in responses),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": len(latencies) / elapsed,
+        "cache_hit_rate": (hits - hits_before) / lookups if lookups else 0.0,
+        "model_calls": model.calls - calls_before,
+        "cpu_ms_per_request": cpu / len(latencies) * 1000,
+        "generated_valid_rate": valid_rate(responses, args.validate_workers),
+    }
+
+
+async def run_suite(args):
+    model = FakeModel(args.model_latency_ms, args.tokens_per_second, args.tokens)
+    pool = get_async_ollama_client()
+    original = pool.generate
+    pool.generate = model.generate
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                     limits=limits, timeout=60) as client:
+            results = []
+            for concurrency in args.concurrency:
+                results.append(await scenario(
+                    client, model, f"closed_c{concurrency}", args,
+                    lambda requests, rng, latencies, responses: closed_loop(client, requests, concurrency, latencies, responses)
+                ))
+            for rate in args.rates:
+                results.append(await scenario(
+                    client, model, f"open_{rate:g}rps", args,
+                    lambda requests, rng, latencies, responses: open_loop(client, requests, rate, rng, latencies, responses)
+                ))
+            return results
+    finally:
+        pool.generate = original
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Ratio new / old of the main figures, per scenario found in both reports."""
+    old = {row["scenario"]: row for row in baseline["results"]}
+    changes = {}
+    for row in report["results"]:
+        before = old.get(row["scenario"])
+        if before is None:
+            continue
+        changes[row["scenario"]] = {
+            key: row[key] / before[key] if before[key] else None
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "cpu_ms_per_request")
+        }
+    return {"baseline_commit": baseline.get("commit"), "ratio_new_to_old": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--rates", type=float, nargs="*", default=[50, 200])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--unique", type=int, default=100, help="distinct requests in the workload")
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    parser.add_argument("--tokens-per-second", type=float, default=2000)
+    parser.add_argument("--tokens", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--validate-workers", type=int, help="processes checking generated code (default: one per core)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": asyncio.run(run_suite(args)),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            print(json.dumps(compare(report, json.load(f)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare ways of checking that generated functions parse.
+
+A corpus of --functions Python and JavaScript functions (a fifth of them
+broken: unclosed brackets, strings or templates) is checked with:
+
+- one subprocess per function, as linting through flake8/eslint did
+  (`python -m py_compile` and, if node is installed, `node --check`, on a
+  temp file; --subprocess-sample functions only, it is slow),
+- app.ai_engine.validation in-process, sequentially,
+- validate_many over a process pool (--workers, default one per core).
+
+The report gives functions per second for each, and how often the
+in-process checks agree with the subprocess ones on the sampled functions.
+
+    python -m benchmarks.validation_speed --functions 20000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.ai_engine.validation import check_function, validate_many
+
+PYTHON_BODIES = [
+    "    return a + b",
+    "    total = 0\n    for item in a:\n        total += item * b\n    return total",
+    "    if not a:\n        return []\n    return [x for x in a if x != b]",
+    "    return {'a': a, 'b': [b, f'{a}-{b}']}",
+]
+JAVASCRIPT_BODIES = [
+    "return a + b;\n}",
+    "let total = 0;\nfor (const item of a) {\ntotal += item * b;\n}\nreturn total;\n}",
+    "return a.filter((x) => x !== b).map((x) => `${x}:${b}`);\n}",
+    "return String(a).replace(/[\\s}]+/g, '') / b;\n}",
+]
+BREAKAGES = [
+    lambda body: body.replace(")", "", 1),
+    lambda body: body.replace("return ", "return '", 1),
+    lambda body: body.rstrip("}") if body.endswith("}") else body + " (",
+]
+
+
+def corpus(count, rng):
+    items = []
+    for i in range(count):
+        if i % 2:
+            signature, body, language = f"function f{i}(a, b) {{", rng.choice(JAVASCRIPT_BODIES), "javascript"
+        else:
+            signature, body, language = f"def f{i}(a, b):", rng.choice(PYTHON_BODIES), "python"
+        if rng.random() < 0.2:
+            body = rng.choice(BREAKAGES)(body)
+        items.append((signature, body, language))
+    return items
+
+
+def source(signature, body, language):
+    return f"{signature}\n{body}\n"
+
+
+def check_subprocess(item, directory):
+    language = item[2]
+    path = os.path.join(directory, "generated.py" if language == "python" else "generated.js")
+    with open(path, "w") as f:
+        f.write(source(*item))
+    command = [sys.executable, "-m", "py_compile", path] if language == "python" else ["node", "--check", path]
+    return subprocess.run(command, capture_output=True).returncode == 0
+
+
+def rate(count, seconds):
+    return count / seconds if seconds > 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=20000)
+    parser.add_argument("--subprocess-sample", type=int, default=100)
+    parser.add_argument("--workers", type=int, help="pool size for validate_many (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    items = corpus(args.functions, random.Random(args.seed))
+    report = {"functions": len(items), "cpus": os.cpu_count()}
+
+    start = time.perf_counter()
+    sequential = [check_function(*item) for item in items]
+    report["in_process_per_second"] = rate(len(items), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    parallel = validate_many(items, max_workers=args.workers)
+    report["process_pool_per_second"] = rate(len(items), time.perf_counter() - start)
+    assert parallel == sequential
+
+    # Without node only the Python functions can be checked by a subprocess
+    sample = [item for item in items if item[2] == "python" or shutil.which("node")][:args.subprocess_sample]
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        external = [check_subprocess(item, directory) for item in sample]
+        report["subprocess_per_second"] = rate(len(sample), time.perf_counter() - start)
+    internal = [check_function(*item) is None for item in sample]
+    report["subprocess_sample"] = len(sample)
+    report["agreement_with_subprocess"] = sum(a == b for a, b in zip(internal, external)) / len(sample) if sample else None
+    report["invalid_share"] = sum(error is not None for error in sequential) / len(items)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Compare cache-hit suggestions over REST and over the WebSocket endpoint.
+
+A uvicorn server (one process) is started against a fake Ollama and
+--keys suggestions are requested once to fill the cache. Then the same
+--requests cache hits are sent:
+
+- rest: one POST /api/ai-engine at a time on a keep-alive connection,
+- websocket: one request at a time on a single /ws/ai-engine connection,
+- websocket_pipelined: --window requests in flight on that connection.
+
+For each the report gives round-trip p50/p99 latency, throughput and the
+server's CPU time per request (read from /proc, so Linux only).
+
+    python -m benchmarks.websocket_latency --requests 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+from websockets.sync.client import connect
+
+from app.tests.fake_ollama import FakeOllama
+from benchmarks.multiprocess_scaling import free_port, wait_ready
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        # utime and stime, after the parenthesised command name
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def code(i):
+    return f"def handler_{i}(request):"
+
+
+def rest(url, args):
+    latencies = []
+    with httpx.Client(base_url=url, timeout=30) as http:
+        for n in range(args.requests):
+            payload = {"action": "suggestion", "code": code(n % args.keys), "context": {"language": "python"}}
+            start = time.perf_counter()
+            http.post("/api/ai-engine", json=payload).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def websocket(url, args, window):
+    latencies = []
+    sent = {}
+    with connect(url.replace("http", "ws", 1) + "/ws/ai-engine") as ws:
+        for n in range(args.requests + window):
+            if n >= window:
+                reply = json.loads(ws.recv())
+                if "r" not in reply:
+                    raise RuntimeError(f"Request failed: {reply}")
+                latencies.append(time.perf_counter() - sent.pop(reply["i"]))
+            if n < args.requests:
+                sent[n] = time.perf_counter()
+                ws.send(json.dumps({"i": n, "c": code(n % args.keys), "l": "python"}, separators=(",", ":")))
+    return latencies
+
+
+def measure(name, server, run):
+    cpu_before = cpu_seconds(server.pid)
+    start = time.perf_counter()
+    latencies = run()
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds(server.pid) - cpu_before
+    return {
+        "path": name,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": len(latencies) / elapsed,
+        "server_cpu_ms_per_request": cpu / len(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--window", type=int, default=8, help="requests in flight for the pipelined run")
+    args = parser.parse_args()
+
+    fake = FakeOllama(response="    return handle(request)").start()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "AI_ENGINE_OLLAMA_HOSTS": fake.url},
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(url)
+        with httpx.Client(base_url=url, timeout=30) as http:
+            for i in range(args.keys):
+                payload = {"action": "suggestion", "code": code(i), "context": {"language": "python"}}
+                http.post("/api/ai-engine", json=payload).raise_for_status()
+        report = [
+            measure("rest", server, lambda: rest(url, args)),
+            measure("websocket", server, lambda: websocket(url, args, 1)),
+            measure(f"websocket_pipelined_{args.window}", server, lambda: websocket(url, args, args.window)),
+        ]
+    finally:
+        server.terminate()
+        server.wait(10)
+        fake.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
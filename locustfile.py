@@ -1,4 +1,4 @@
-from locust import HttpUser, task, between
+from locust import HttpUser, task, between, constant
 
 class AIEngineUser(HttpUser):
     wait_time = between(1, 3)  # seconds between tasks
@@ -35,4 +35,19 @@ class AIEngineUser(HttpUser):
             "action": "generate",
             "code": "function isEven(num) {",
             "context": {"language": "javascript"}
-        })
\ No newline at end of file
+        })
+
+class SaturationUser(HttpUser):
+    """
+    Closed-loop user with no think time; run with increasing -u to check that
+    throughput scales with concurrency while model calls are in flight.
+    """
+    wait_time = constant(0)
+
+    @task
+    def python_generate(self):
+        self.client.post("/api/ai-engine", json={
+            "action": "generate",
+            "code": "def is_even(num):",
+            "context": {"language": "python"}
+        })